@@ -21,6 +21,10 @@
 import os
 import time
 import glob
+import mmap
+import struct
+import threading
+from collections import OrderedDict
 try:
     # python 3
     import pickle as cPickle
@@ -52,6 +56,17 @@ from uyuni.common.usix import raise_with_tb
 PKG_LIST_DIR = os.path.join(CFG.PKG_DIR, 'list')
 PREFIX = "rhn"
 
+# Package mapping index files:
+# 1. magic and number of entries
+# 2. offsets of the entries, sorted by package file name
+# 3. entries: package file name and its NUL separated file paths, each
+#    prefixed by its length
+MAPPING_MAGIC = b"RHNPMAP1"
+_MAPPING_HEADER = struct.Struct("!8sL")
+_MAPPING_OFFSET = struct.Struct("!L")
+_MAPPING_KEY_LEN = struct.Struct("!H")
+_MAPPING_VALUE_LEN = struct.Struct("!L")
+
 
 class NotLocalError(Exception):
     pass
@@ -86,9 +101,7 @@ class Repository(rhnRepository.Repository):
         """
 
         log_debug(3, pkgFilename)
-        mappingName = "package_mapping:%s:" % self.channelName
-        mapping = self._cacheObj(mappingName, self.channelVersion,
-                                 self.__channelPackageMapping, ())
+        mapping = self._packageMapping()
 
         # If the file name has parameters, it's a different kind of package.
         # Determine the architecture requested so we can construct an
@@ -169,44 +182,40 @@ class Repository(rhnRepository.Repository):
         log_debug(4, "Source package not found locally: %s" % pkgFilename)
         raise NotLocalError(filePaths[0], pkgFilename)
 
-    def _cacheObj(self, fileName, version, dataProducer, params=None):
-        """ The real workhorse for all flavors of listall
-            It tries to pull data out of a file; if it doesn't work,
-            it calls the data producer with the specified params to generate
-            the data, which is also cached.
+    def _packageMapping(self):
+        """ Returns the index of the channel package file names and their
+            possible paths.
 
-            Returns a string from a cache file or, if the cache file is not
-            there, calls dataProducer to generate the object and caches the
-            results
+            Indexes stay open in a per-process LRU cache. On a miss the index
+            file in PKG_LIST_DIR is mapped or, if it's not there, generated
+            from the package list of the parent and cached.
         """
 
-        log_debug(4, fileName, version, params)
+        fileName = "package_mapping:%s:" % self.channelName
+        index = _mappingCache.get(fileName, self.channelVersion)
+        if index is not None:
+            return index
+
+        log_debug(4, fileName, self.channelVersion)
         fileDir = self._getPkgListDir()
-        filePath = "%s/%s-%s" % (fileDir, fileName, version)
+        filePath = "%s/%s-%s" % (fileDir, fileName, self.channelVersion)
         if os.access(filePath, os.R_OK):
             try:
-                # Slurp the file
-                f = open(filePath, "rb")
-                data = f.read()
-                f.close()
-                stringObject = cPickle.loads(data)
-                return stringObject
-            except (IOError, cPickle.UnpicklingError): # corrupted cache file
+                index = PackageMappingIndex(filePath)
+            except (IOError, ValueError): # corrupted or old cache file
                 pass # do nothing, we'll fetch / write it again
 
-        # The file's not there; query the DB or whatever dataproducer used.
-        if params is None:
-            params = ()
-        stringObject = dataProducer(*params)
-        # Cache the thing
-        cache(cPickle.dumps(stringObject, 1), fileDir, fileName, version)
-        # Return the string
-        return stringObject
+        if index is None:
+            cache(dumpPackageMapping(self.__channelPackageMapping()),
+                  fileDir, fileName, self.channelVersion)
+            index = PackageMappingIndex(filePath)
+        _mappingCache.add(fileName, self.channelVersion, index)
+        return index
 
     @staticmethod
     def _getPkgListDir():
         """ Creates and returns the directory for cached lists of packages.
-            Used by _cacheObj.
+            Used by _packageMapping.
 
             XXX: Problem exists here. If PKG_LIST_DIR can't be created
             due to ownership... this is bad... need to fix.
@@ -407,6 +416,133 @@ class TinyUrlRepository(KickstartRepository):
         return server.proxy.getTinyUrlChannel(self.tinyurl, self.systemId)
 
 
+class PackageMappingIndex:
+
+    """ Read-only package mapping backed by a memory-mapped index file.
+
+        Lookups bisect the sorted entries of the file, so only the requested
+        package is decoded and nothing but the mapped file is kept in memory.
+    """
+
+    def __init__(self, filePath):
+        with open(filePath, "rb") as f:
+            self.size = os.fstat(f.fileno()).st_size
+            if self.size < _MAPPING_HEADER.size:
+                raise ValueError("Truncated package mapping: %s" % filePath)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count = _MAPPING_HEADER.unpack_from(self._map, 0)
+        if magic != MAPPING_MAGIC or \
+                _MAPPING_HEADER.size + self._count * _MAPPING_OFFSET.size > self.size:
+            self._map.close()
+            raise ValueError("Invalid package mapping: %s" % filePath)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, pkgFilename):
+        return self._lookup(pkgFilename) is not None
+
+    def __getitem__(self, pkgFilename):
+        filePaths = self._lookup(pkgFilename)
+        if filePaths is None:
+            raise KeyError(pkgFilename)
+        return filePaths
+
+    def _entry(self, i):
+        """ Returns the start offset and the package file name of entry i """
+        offset, = _MAPPING_OFFSET.unpack_from(
+            self._map, _MAPPING_HEADER.size + i * _MAPPING_OFFSET.size)
+        keyLen, = _MAPPING_KEY_LEN.unpack_from(self._map, offset)
+        offset = offset + _MAPPING_KEY_LEN.size
+        return offset, self._map[offset:offset + keyLen]
+
+    def _lookup(self, pkgFilename):
+        if not isinstance(pkgFilename, str):
+            return None
+
+        key = pkgFilename.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._entry(middle)[1] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low == self._count:
+            return None
+        offset, entryKey = self._entry(low)
+        if entryKey != key:
+            return None
+        offset = offset + len(entryKey)
+        valueLen, = _MAPPING_VALUE_LEN.unpack_from(self._map, offset)
+        offset = offset + _MAPPING_VALUE_LEN.size
+        value = self._map[offset:offset + valueLen]
+        return value.decode("utf-8").split("\0")
+
+
+def dumpPackageMapping(mapping):
+    """ Serializes a {package file name: [file paths]} mapping into the
+        index format read by PackageMappingIndex
+    """
+    entries = sorted((key.encode("utf-8"), "\0".join(value).encode("utf-8"))
+                     for key, value in mapping.items())
+    offset = _MAPPING_HEADER.size + len(entries) * _MAPPING_OFFSET.size
+    offsets = []
+    records = []
+    for key, value in entries:
+        record = _MAPPING_KEY_LEN.pack(len(key)) + key + \
+            _MAPPING_VALUE_LEN.pack(len(value)) + value
+        offsets.append(_MAPPING_OFFSET.pack(offset))
+        records.append(record)
+        offset = offset + len(record)
+    return b"".join([_MAPPING_HEADER.pack(MAPPING_MAGIC, len(entries))] +
+                    offsets + records)
+
+
+class _PackageMappingCache:
+
+    """ Per-process LRU cache of the open package mapping indexes, bounded
+        by the size of the mapped files.
+    """
+
+    def __init__(self):
+        self._indexes = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _maxSize():
+        if CFG.has_key('package_mapping_cache_size'):
+            return int(CFG.PACKAGE_MAPPING_CACHE_SIZE)
+        return 64 * 1024 * 1024
+
+    def get(self, fileName, version):
+        with self._lock:
+            index = self._indexes.get((fileName, version))
+            if index is not None:
+                self._indexes.move_to_end((fileName, version))
+            return index
+
+    def add(self, fileName, version, index):
+        maxSize = self._maxSize()
+        with self._lock:
+            # Older versions of the mapping are not going to be used anymore
+            for key in list(self._indexes):
+                if key[0] == fileName:
+                    self._size = self._size - self._indexes.pop(key).size
+            self._indexes[(fileName, version)] = index
+            self._size = self._size + index.size
+            # Evicted indexes are unmapped once the requests using them
+            # are done
+            while self._size > maxSize and len(self._indexes) > 1:
+                _key, evicted = self._indexes.popitem(last=False)
+                self._size = self._size - evicted.size
+
+
+_mappingCache = _PackageMappingCache()
+
+
 def isSolarisArch(arch):
     """
     Returns true if the given arch string represents a solaris architecture.
@@ -21,6 +21,7 @@
 ## language imports
 import socket
 import sys
+import threading
 try:
     #  python 2
     from xmlrpclib import Fault
@@ -41,6 +42,9 @@ from .rhnAuthProtocol import CommunicationError, send, recv
 # 1. Send the size of the data as a long (4 bytes), in network order
 # 2. Send the data
 #
+# Several requests may be sent over the same connection, the replies come
+# back in the same order.
+#
 
 # Shamelessly stolen from xmlrpclib.xmlrpc
 
@@ -70,6 +74,96 @@ class _Method:
     __repr__ = __str__
 
 
+class _Connection:
+
+    """ Persistent connection to the authentication cache daemon
+
+        The socket stays open between requests; it is closed (and reopened
+        by the next request) only when the communication fails. Daemons
+        closing the connection after each reply are detected and then sent
+        one request per connection.
+    """
+
+    def __init__(self, server_addr):
+        self.serverAddr = server_addr
+        self.keepalive = True
+        self.sock = None
+        self.rfile = None
+        self.wfile = None
+
+    def connect(self):
+        log_debug(6, "Connecting to the auth cache", self.serverAddr)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.serverAddr)
+        except socket.error:
+            sock.close()
+            raise
+        self.sock = sock
+        self.rfile = sock.makefile("rb")
+        self.wfile = sock.makefile("wb")
+
+    def close(self):
+        for f in (self.rfile, self.wfile, self.sock):
+            if f is None:
+                continue
+            try:
+                f.close()
+            except socket.error:
+                pass
+        self.sock = self.rfile = self.wfile = None
+
+    def call(self, calls):
+        """ Sends all the (methodname, params) calls, then reads the replies.
+
+            Returns the list of results, in the order of the calls; a Fault
+            sent back by the daemon is returned in place of the result.
+        """
+        results = []
+        while len(results) < len(calls):
+            pending = calls[len(results):]
+            if not self.keepalive:
+                pending = pending[:1]
+            if self.sock is None:
+                self.connect()
+            for methodname, params in pending:
+                send(self.wfile, *params, methodname=methodname)
+            self.wfile.flush()
+
+            received = 0
+            for _call in pending:
+                try:
+                    params, _methodname = recv(self.rfile)
+                except Fault as e:
+                    results.append(e)
+                except CommunicationError:
+                    if not received:
+                        raise
+                    # The daemon closed the connection after replying
+                    log_debug(3, "The auth cache does not keep connections open")
+                    self.keepalive = False
+                    break
+                else:
+                    results.append(params[0])
+                received = received + 1
+            if not self.keepalive:
+                self.close()
+        return results
+
+
+# Connections to the auth cache daemons, one per thread and server address
+_connections = threading.local()
+
+
+def _get_connection(server_addr):
+    pool = getattr(_connections, 'pool', None)
+    if pool is None:
+        pool = _connections.pool = {}
+    if server_addr not in pool:
+        pool[server_addr] = _Connection(server_addr)
+    return pool[server_addr]
+
+
 class Shelf:
 
     """ Client authenication temp. db.
@@ -83,71 +177,66 @@ class Shelf:
         log_debug(6, server_addr)
         self.serverAddr = server_addr
 
-    def __request(self, methodname, params):
-        # pylint: disable=R0915
-        log_debug(6, methodname, params)
-        # Init the socket
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    def __call(self, calls):
+        log_debug(6, calls)
+        connection = _get_connection(self.serverAddr)
+        try:
+            return connection.call(calls)
+        except (socket.error, CommunicationError) as e:
+            # The daemon may have dropped the connection since the last
+            # request; retry once on a new one.
+            connection.close()
+            log_debug(3, "Reconnecting to the auth cache: %s" % str(e))
 
         try:
-            sock.connect(self.serverAddr)
+            return connection.call(calls)
+        except CommunicationError as e:
+            connection.close()
+            log_error("Error communicating to the auth cache: %s" % e.faultString)
+            Traceback("Shelf.__call", extra="""\
+                      Error receiving from the authentication cache daemon.
+                      Make sure the authentication cache daemon is started""")
+            # FIXME: PROBLEM: this rhnFault will never reach the client
+            raise_with_tb(
+                rhnFault(1000, _("Spacewalk Proxy error (issues communicating to auth cache). "
+                                 "Please contact your system administrator")), sys.exc_info()[2])
         except socket.error as e:
-            sock.close()
-            methodname = None
+            connection.close()
             log_error("Error connecting to the auth cache: %s" % str(e))
-            Traceback("Shelf.__request", extra="""
+            Traceback("Shelf.__call", extra="""
               Error connecting to the the authentication cache daemon.
               Make sure it is started on %s""" % str(self.serverAddr))
             # FIXME: PROBLEM: this rhnFault will never reach the client
             raise_with_tb(
                 rhnFault(1000, _("Spacewalk Proxy error (issues connecting to auth cache). "
                                  "Please contact your system administrator")), sys.exc_info()[2])
+        return None
 
-        wfile = sock.makefile("w")
+    def __request(self, methodname, params):
+        result = self.__call([(methodname, params)])[0]
+        if isinstance(result, Fault):
+            raise result
+        return result
 
-        try:
-            send(wfile, methodname, None, *params)
-        except CommunicationError:
-            wfile.close()
-            sock.close()
-            Traceback("Shelf.__request",
-                      extra="Encountered a CommunicationError")
-            raise
-        except socket.error:
-            wfile.close()
-            sock.close()
-            log_error("Error communicating to the auth cache: %s" % str(e))
-            Traceback("Shelf.__request", extra="""\
-                     Error sending to the authentication cache daemon.
-                     Make sure the authentication cache daemon is started""")
-            # FIXME: PROBLEM: this rhnFault will never reach the client
-            raise_with_tb(
-                rhnFault(1000, _("Spacewalk Proxy error (issues connecting to auth cache). "
-                                 "Please contact your system administrator")), sys.exc_info()[2])
+    def __getitem__(self, key):
+        return self.__request("__getitem__", (key,))
 
-        wfile.close()
+    def __setitem__(self, key, value):
+        return self.__request("__setitem__", (key, value))
 
-        rfile = sock.makefile("r")
-        try:
-            params, methodname = recv(rfile)
-        except CommunicationError as e:
-            log_error(e.faultString)
-            rfile.close()
-            sock.close()
-            log_error("Error communicating to the auth cache: %s" % str(e))
-            Traceback("Shelf.__request", extra="""\
-                      Error receiving from the authentication cache daemon.
-                      Make sure the authentication cache daemon is started""")
-            # FIXME: PROBLEM: this rhnFault will never reach the client
-            raise_with_tb(
-                rhnFault(1000, _("Spacewalk Proxy error (issues communicating to auth cache). "
-                                 "Please contact your system administrator")), sys.exc_info()[2])
-        except Fault as e:
-            rfile.close()
-            sock.close()
-            raise
+    def __delitem__(self, key):
+        return self.__request("__delitem__", (key,))
 
-        return params[0]
+    def get(self, key, default=None):
+        """ Looks the key up and fetches its value in a single round trip """
+        found, value = self.__call([("has_key", (key,)), ("__getitem__", (key,))])
+        if isinstance(found, Fault):
+            raise found
+        if not found:
+            return default
+        if isinstance(value, Fault):
+            raise value
+        return value
 
     def __getattr__(self, name):
         log_debug(6, name)
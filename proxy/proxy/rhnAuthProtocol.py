@@ -38,7 +38,7 @@ class CommunicationError(Exception):
 
 def readSocket(fd, n):
     """ Reads exactly n bytes from the file descriptor fd (if possible) """
-    result = ""  # The result
+    result = b""  # The result
     while n > 0:
         buff = fd.read(n)
         if not buff:
@@ -55,6 +55,7 @@ def send(fd, *params, methodname=None, fault=None):
         buff = dumps(fault)
     else:
         buff = dumps(params)
+    buff = buff.encode("utf-8")
     # Write the length first
     fd.write(struct.pack("!L", len(buff)))
     # Then send the data itself
@@ -64,7 +65,7 @@ def send(fd, *params, methodname=None, fault=None):
 
 def recv(rfile):
     # Compute the size of an unsigned int
-    n = struct.calcsize("L")
+    n = struct.calcsize("!L")
     # Read the first bytes to figure out the size
     buff = readSocket(rfile, n)
     if len(buff) != n:
@@ -161,10 +161,7 @@ class ProxyAuth:
         # Try to connect to the token-cache.
         shelf = get_auth_shelf()
         # Fetch the token
-        key = self.__cache_proxy_key()
-        if shelf.has_key(key):
-            return shelf[key]
-        return None
+        return shelf.get(self.__cache_proxy_key())
 
     def set_cached_token(self, token):
         """ Caches current token in the auth cache.
@@ -356,9 +353,7 @@ problems, isn't running, or the token is somehow corrupt.
     @staticmethod
     def get_client_token(clientid):
         shelf = get_auth_shelf()
-        if shelf.has_key(clientid):
-            return shelf[clientid]
-        return None
+        return shelf.get(clientid)
 
     @staticmethod
     def set_client_token(clientid, token):
@@ -461,6 +456,12 @@ class AuthLocalBackend:
         val = rhnCache.get(rkey, missing_is_null=0)
         return val
 
+    def get(self, key, default=None):
+        rkey = self._compute_key(key)
+        if rhnCache.has_key(rkey):
+            return rhnCache.get(rkey, missing_is_null=0)
+        return default
+
     def __setitem__(self, key, val):
         rkey = self._compute_key(key)
         return rhnCache.set(rkey, val)
@@ -475,18 +475,56 @@ class SharedHandler:
 
         # Now fill in the bytes if need be.
 
-        # read content if there is some or the size is unknown
+        # stream the content if there is some or the size is unknown
         if (size > 0 or size == -1) and (toRequest.method != 'HEAD'):
-            tfile = SmartIO(max_mem_size=CFG.MAX_MEM_FILE_SIZE)
-            buf = fromResponse.read(CFG.BUFFER_SIZE)
-            while buf:
-                try:
-                    tfile.write(buf)
-                    buf = fromResponse.read(CFG.BUFFER_SIZE)
-                except IOError:
-                    buf = 0
-            tfile.seek(0)
-            if 'wsgi.file_wrapper' in toRequest.headers_in:
-                toRequest.output = toRequest.headers_in['wsgi.file_wrapper'](tfile, CFG.BUFFER_SIZE)
-            else:
-                toRequest.output = iter(lambda: tfile.read(CFG.BUFFER_SIZE), '')
+            connection = None
+            if self.responseContext.getBodyFd() is fromResponse:
+                # The body is sent after the handler returned; hand the
+                # response and its connection over to the streaming body so
+                # clearing the response context doesn't close them.
+                connection = self.responseContext.getConnection()
+                self.responseContext.setBodyFd(None)
+                self.responseContext.setConnection(None)
+            toRequest.output = StreamingBody(fromResponse, connection,
+                                             CFG.BUFFER_SIZE)
+
+
+class StreamingBody:
+
+    """ Iterable passing the body of an upstream response through to the
+        client chunk by chunk, as it arrives, instead of spooling it first.
+        The WSGI server closes it once the body is sent or the client went
+        away, which closes the response and its connection.
+    """
+
+    def __init__(self, response, connection, bufferSize):
+        self.response = response
+        self.connection = connection
+        self.bufferSize = bufferSize
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        buf = None
+        if not self.closed:
+            try:
+                buf = self.response.read(self.bufferSize)
+            except IOError:
+                # Upstream went away; the client gets what we had
+                log_error("Error reading the response body from the parent")
+        if not buf:
+            self.close()
+            raise StopIteration
+        return buf
+
+    next = __next__  # python 2
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.response.close()
+        if self.connection is not None:
+            self.connection.close()
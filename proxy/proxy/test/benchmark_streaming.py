@@ -0,0 +1,151 @@
+#  pylint: disable=missing-module-docstring
+"""
+Measure the time to first byte and the throughput of the bodies forwarded
+by SharedHandler._forwardHTTPBody from a local stand-in for the parent, when
+spooling the whole body before sending it like before and when streaming it:
+
+    PYTHONPATH=../..:../../../python python3 benchmark_streaming.py \\
+        --size 64 --delay 0.001
+
+The parent sends the body in --chunk sized writes, sleeping --delay seconds
+between them to simulate a slow link.
+"""
+import argparse
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+from wsgiref.util import FileWrapper
+
+from rhn import connections
+from rhn.SmartIO import SmartIO
+
+from proxy import rhnShared
+from proxy.responseContext import ResponseContext
+
+
+class ParentHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # pylint: disable=invalid-name
+        chunk = b"x" * self.server.chunk
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(chunk) * self.server.chunks))
+        self.end_headers()
+        for _ in range(self.server.chunks):
+            self.wfile.write(chunk)
+            if self.server.delay:
+                time.sleep(self.server.delay)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class Parent(ThreadingHTTPServer):
+    """Stand-in parent serving a body of chunks * chunk bytes"""
+
+    daemon_threads = True
+
+    def __init__(self, chunks, chunk, delay):
+        ThreadingHTTPServer.__init__(self, ("127.0.0.1", 0), ParentHandler)
+        self.chunks = chunks
+        self.chunk = chunk
+        self.delay = delay
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def forward_spooled(handler, fromResponse, toRequest):
+    """The former _forwardHTTPBody, reading the whole body before sending it"""
+    # pylint: disable-next=protected-access
+    size = handler._determineHTTPBodySize(fromResponse.msg)
+    if (size > 0 or size == -1) and (toRequest.method != "HEAD"):
+        tfile = SmartIO(max_mem_size=rhnShared.CFG.MAX_MEM_FILE_SIZE)
+        buf = fromResponse.read(rhnShared.CFG.BUFFER_SIZE)
+        while buf:
+            try:
+                tfile.write(buf)
+                buf = fromResponse.read(rhnShared.CFG.BUFFER_SIZE)
+            except IOError:
+                buf = 0
+        tfile.seek(0)
+        toRequest.output = toRequest.headers_in["wsgi.file_wrapper"](
+            tfile, rhnShared.CFG.BUFFER_SIZE
+        )
+
+
+def forward_streaming(handler, fromResponse, toRequest):
+    # pylint: disable-next=protected-access
+    handler._forwardHTTPBody(fromResponse, toRequest)
+
+
+def run(parent, forward):
+    """Forward one body from the parent like a WSGI server sending the
+    output of the proxy, return the time to first byte, the total time and
+    the size of the body"""
+    handler = rhnShared.SharedHandler.__new__(rhnShared.SharedHandler)
+    handler.responseContext = ResponseContext()
+    request = SimpleNamespace(
+        method="GET", headers_in={"wsgi.file_wrapper": FileWrapper}, output=None
+    )
+
+    start = time.monotonic()
+    connection = connections.HTTPConnection(*parent.server_address)
+    connection.request("GET", "/rhn/manager/download/package.rpm")
+    response = connection.getresponse()
+    handler.responseContext.setBodyFd(response)
+    handler.responseContext.setConnection(connection)
+    forward(handler, response, request)
+
+    first_byte = None
+    size = 0
+    for buf in request.output:
+        if first_byte is None:
+            first_byte = time.monotonic() - start
+        size += len(buf)
+    if hasattr(request.output, "close"):
+        request.output.close()
+    # the handler clears the response context once it returned
+    handler.responseContext.clear()
+    return first_byte, time.monotonic() - start, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=64, help="MiB per body")
+    parser.add_argument("--chunk", type=int, default=65536, help="bytes per write")
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--buffer-size", type=int, default=16384)
+    parser.add_argument("--max-mem-file-size", type=int, default=16384000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    parent = Parent(args.size * 1024 * 1024 // args.chunk, args.chunk, args.delay)
+    config = Mock(
+        BUFFER_SIZE=args.buffer_size, MAX_MEM_FILE_SIZE=args.max_mem_file_size
+    )
+    try:
+        with patch.object(rhnShared, "CFG", config):
+            for name, forward in (
+                ("spooled", forward_spooled),
+                ("streaming", forward_streaming),
+            ):
+                for _ in range(args.repeat):
+                    first_byte, elapsed, size = run(parent, forward)
+                    print(
+                        f"{name:9s}: {size} bytes, first byte after"
+                        f" {first_byte * 1000:9.3f}ms, all in {elapsed:7.3f}s,"
+                        f" {size / 1024 / 1024 / elapsed:8.1f} MiB/s"
+                    )
+    finally:
+        parent.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+#  pylint: disable=missing-module-docstring
+import os
+import shutil
+import tempfile
+
+import spacewalk
+
+
+# pylint: disable-next=unused-argument
+def pytest_sessionstart(session):
+    # Skip if we already have done it
+    if "RHN_CONFIG_PATH" in os.environ:
+        return
+
+    tmp_path = tempfile.mkdtemp()
+    # rhnConfig requires the /etc/rhn/rhn.conf even if empty at import time
+    # pylint: disable-next=unspecified-encoding
+    with open(os.path.join(tmp_path, "rhn.conf"), "w"):
+        pass
+
+    # the broker modules read the proxy configuration at import time
+    defaults_path = os.path.join(tmp_path, "defaults")
+    os.mkdir(defaults_path)
+    shutil.copy(
+        os.path.join(os.path.dirname(spacewalk.__file__), "rhn-conf", "rhn.conf"),
+        defaults_path,
+    )
+    for conf_file in ["rhn_proxy.conf", "rhn_proxy_broker.conf"]:
+        shutil.copy(
+            os.path.join(os.path.dirname(__file__), "..", "rhn-conf", conf_file),
+            defaults_path,
+        )
+    os.environ["RHN_CONFIG_PATH"] = tmp_path
+    os.environ["RHN_CONFIG_DEFAULTS_PATH"] = defaults_path
+
+    # pylint: disable-next=import-outside-toplevel
+    from spacewalk.common.rhnConfig import initCFG
+
+    initCFG("proxy.broker")
+
+
+# pylint: disable-next=unused-argument
+def pytest_sessionfinish(session, exitstatus):
+    if "RHN_CONFIG_PATH" in os.environ:
+        shutil.rmtree(os.environ["RHN_CONFIG_PATH"])
@@ -0,0 +1,135 @@
+#  pylint: disable=missing-module-docstring,invalid-name
+from unittest.mock import patch
+
+import pytest
+
+from proxy.broker import rhnRepository
+
+
+MAPPING = {
+    "bash-5.2-1.x86_64.rpm": [
+        "rhn/packages/bash/5.2-1/x86_64/abc/bash-5.2-1.x86_64.rpm"
+    ],
+    "aaa_base-1.0-1.noarch.rpm": [
+        "rhn/packages/aaa_base/1.0-1/noarch/def/aaa_base-1.0-1.noarch.rpm",
+        "rhn/packages/aaa_base-1.0-1.noarch.rpm",
+    ],
+    "zypper-1.14-1.x86_64.rpm": ["rhn/packages/zypper-1.14-1.x86_64.rpm"],
+    "libzypp-17.0-1.x86_64.rpm": ["rhn/packages/libzypp-17.0-1.x86_64.rpm"],
+}
+
+
+def _index(tmp_path, mapping, name="mapping"):
+    path = tmp_path / name
+    path.write_bytes(rhnRepository.dumpPackageMapping(mapping))
+    return rhnRepository.PackageMappingIndex(str(path))
+
+
+def test_mapping_index_round_trip(tmp_path):
+    index = _index(tmp_path, MAPPING)
+
+    assert len(index) == len(MAPPING)
+    for pkgFilename, filePaths in MAPPING.items():
+        assert pkgFilename in index
+        assert index[pkgFilename] == filePaths
+
+
+def test_mapping_index_first_and_last_key(tmp_path):
+    index = _index(tmp_path, MAPPING)
+
+    assert index["aaa_base-1.0-1.noarch.rpm"] == MAPPING["aaa_base-1.0-1.noarch.rpm"]
+    assert index["zypper-1.14-1.x86_64.rpm"] == MAPPING["zypper-1.14-1.x86_64.rpm"]
+
+
+@pytest.mark.parametrize(
+    "pkgFilename",
+    [
+        "aaa-1.0-1.noarch.rpm",
+        "bash-5.2-2.x86_64.rpm",
+        "zzz-1.0-1.noarch.rpm",
+        "bash-5.2-1.x86_64.rp",
+        "",
+        None,
+    ],
+)
+def test_mapping_index_miss(tmp_path, pkgFilename):
+    index = _index(tmp_path, MAPPING)
+
+    assert pkgFilename not in index
+    with pytest.raises(KeyError):
+        # pylint: disable-next=pointless-statement
+        index[pkgFilename]
+
+
+def test_mapping_index_keeps_no_lookups(tmp_path):
+    index = _index(tmp_path, MAPPING)
+
+    for i in range(100):
+        assert "pkg%d-1.0-1.noarch.rpm" % i not in index
+    assert index["bash-5.2-1.x86_64.rpm"] == MAPPING["bash-5.2-1.x86_64.rpm"]
+
+    # only the mapped file counts towards the cache size
+    assert set(vars(index)) == {"size", "_map", "_count"}
+
+
+def test_mapping_index_empty(tmp_path):
+    index = _index(tmp_path, {})
+
+    assert len(index) == 0
+    assert "bash-5.2-1.x86_64.rpm" not in index
+
+
+def test_mapping_index_invalid(tmp_path):
+    path = tmp_path / "mapping"
+    path.write_bytes(b"RHNPMAP1")
+    with pytest.raises(ValueError):
+        rhnRepository.PackageMappingIndex(str(path))
+
+    path.write_bytes(b"NOTAMAP1" + rhnRepository.dumpPackageMapping(MAPPING)[8:])
+    with pytest.raises(ValueError):
+        rhnRepository.PackageMappingIndex(str(path))
+
+
+def test_mapping_cache_evicts_at_size_cap(tmp_path):
+    indexes = [
+        _index(tmp_path, {"pkg%d-1.0-1.noarch.rpm" % i: ["rhn/%d" % i]}, str(i))
+        for i in range(4)
+    ]
+    size = indexes[0].size
+    cache = rhnRepository._PackageMappingCache()  # pylint: disable=protected-access
+
+    with patch.object(cache, "_maxSize", return_value=3 * size):
+        for i, index in enumerate(indexes[:3]):
+            cache.add("channel%d" % i, 1, index)
+        # the least recently used index is evicted first
+        assert cache.get("channel0", 1) is indexes[0]
+        cache.add("channel3", 1, indexes[3])
+
+    assert cache.get("channel1", 1) is None
+    assert cache.get("channel0", 1) is indexes[0]
+    assert cache.get("channel2", 1) is indexes[2]
+    assert cache.get("channel3", 1) is indexes[3]
+
+
+def test_mapping_cache_replaces_old_versions(tmp_path):
+    old = _index(tmp_path, MAPPING, "old")
+    new = _index(tmp_path, MAPPING, "new")
+    cache = rhnRepository._PackageMappingCache()  # pylint: disable=protected-access
+
+    with patch.object(cache, "_maxSize", return_value=10 * old.size):
+        cache.add("channel", 1, old)
+        cache.add("channel", 2, new)
+
+    assert cache.get("channel", 1) is None
+    assert cache.get("channel", 2) is new
+
+
+def test_mapping_cache_keeps_an_index_larger_than_the_cap(tmp_path):
+    index = _index(tmp_path, MAPPING)
+    cache = rhnRepository._PackageMappingCache()  # pylint: disable=protected-access
+
+    with patch.object(cache, "_maxSize", return_value=1):
+        cache.add("channel", 1, index)
+
+    # the index being used stays open
+    assert cache.get("channel", 1) is index
@@ -226,6 +226,10 @@ class HTTPSConnection(HTTPConnection):
             try:
                 sock.connect((self.host, self.port))
                 sock.settimeout(self.timeout)
+                # The headers and the body of a request are sent separately,
+                # don't wait for the server to acknowledge the headers
+                # (httplib does the same for plain HTTP connections)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             except socket.error:
                 sock.close()
                 sock = None
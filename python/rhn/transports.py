@@ -11,7 +11,10 @@
 
 
 # Transport objects
+import errno
 import os
+import select
+import socket
 import sys
 import time
 from rhn import connections
@@ -20,9 +23,11 @@ from rhn.SmartIO import SmartIO
 from rhn.UserDictCase import UserDictCase
 
 try:  # python2
+    import httplib
     import xmlrpclib
     from types import IntType, StringType, ListType
 except ImportError:  # python3
+    import http.client as httplib
     import xmlrpc.client as xmlrpclib
 
     IntType = int
@@ -34,6 +39,9 @@ __version__ = "$Revision$"
 # XXX
 COMPRESS_LEVEL = 6
 
+# Default size of the reads from the network
+BUFFER_SIZE = 16384
+
 
 # Exceptions
 class NotProcessed(Exception):
@@ -68,17 +76,21 @@ class Transport(xmlrpclib.Transport):
         # pylint: disable-next=invalid-name
         self.progressCallback = progressCallback
         # pylint: disable-next=invalid-name
-        self.bufferSize = 16384
+        self.bufferSize = BUFFER_SIZE
         self.headers_in = None
         self.response_status = None
         self.response_reason = None
         self._redirected = None
         self._use_datetime = use_datetime
         self.timeout = timeout
+        # Idle connections kept open for the next requests, by host
+        self.keep_alive = 1
+        self._connections = {}
+        self._request_host = None
 
     # set the progress callback
     # pylint: disable-next=invalid-name
-    def set_progress_callback(self, progressCallback, bufferSize=16384):
+    def set_progress_callback(self, progressCallback, bufferSize=BUFFER_SIZE):
         self.progressCallback = progressCallback
         self.bufferSize = bufferSize
 
@@ -93,8 +105,8 @@ class Transport(xmlrpclib.Transport):
     # pylint: disable-next=invalid-name
     def set_buffer_size(self, bufferSize):
         if bufferSize is None:
-            # No buffer size specified; go with 16k
-            bufferSize = 16384
+            # No buffer size specified; go with the default
+            bufferSize = BUFFER_SIZE
 
         self.bufferSize = bufferSize
 
@@ -150,6 +162,38 @@ class Transport(xmlrpclib.Transport):
     def clear_headers(self):
         self._headers.clear()
 
+    # enable or disable reusing the connections with HTTP/1.1 keep-alive
+    def set_keep_alive(self, keep_alive):
+        self.keep_alive = keep_alive
+        if not keep_alive:
+            self.close()
+
+    def close(self):
+        for connection in self._connections.values():
+            connection.close()
+        self._connections.clear()
+
+    def _get_connection(self, host):
+        """Returns the idle connection to host if the server did not close it
+        in the meantime, or a new connection"""
+        connection = self._connections.pop(host, None)
+        if connection is not None:
+            if not _connection_dropped(connection):
+                return connection
+            connection.close()
+        return self.get_connection(host)
+
+    def _release_connection(self, connection):
+        """Keeps the connection open for the next request to the same host
+        once the response has been read, closes it otherwise"""
+        if self.keep_alive and connection.sock is not None:
+            old = self._connections.pop(self._request_host, None)
+            if old is not None and old is not connection:
+                old.close()
+            self._connections[self._request_host] = connection
+        else:
+            connection.close()
+
     def get_connection(self, host):
         if self.verbose:
             # pylint: disable-next=consider-using-f-string
@@ -160,11 +204,32 @@ class Transport(xmlrpclib.Transport):
             return connections.HTTPConnection(host)
 
     def request(self, host, handler, request_body, verbose=0):
+        # The server may close an idle connection just as we are sending a
+        # new request on it; retry once with a new connection, as xmlrpclib
+        # does
+        for attempt in (0, 1):
+            reused = (
+                self.keep_alive and self.get_host_info(host)[0] in self._connections
+            )
+            try:
+                return self._single_request(host, handler, request_body, verbose)
+            except httplib.BadStatusLine:
+                if attempt or not reused:
+                    raise
+            except socket.error as e:
+                if (
+                    attempt
+                    or not reused
+                    or e.errno
+                    not in (errno.ECONNRESET, errno.ECONNABORTED, errno.EPIPE)
+                ):
+                    raise
+        return None
+
+    def _single_request(self, host, handler, request_body, verbose=0):
         # issue XML-RPC request
         # XXX: automatically compute how to send depending on how much data
         #      you want to send
-
-        # XXX Deal with HTTP/1.1 if necessary
         self.verbose = verbose
 
         # implement BASIC HTTP AUTHENTICATION
@@ -172,8 +237,9 @@ class Transport(xmlrpclib.Transport):
         host, extra_headers, x509 = self.get_host_info(host)
         if not extra_headers:
             extra_headers = []
-        # Establish the connection
-        connection = self.get_connection(host)
+        # Establish the connection, or reuse the one of the previous request
+        connection = self._get_connection(host)
+        self._request_host = host
         # Setting the user agent. Only interesting for SSL tunnels, in any
         # other case the general headers are good enough.
         connection.set_user_agent(self.user_agent)
@@ -197,7 +263,12 @@ class Transport(xmlrpclib.Transport):
         for h in ["Content-Length", "Host"]:
             req.clear_header(h)
 
-        headers, fd = req.send_http(host, handler)
+        try:
+            headers, fd = req.send_http(host, handler)
+        # pylint: disable-next=bare-except
+        except:
+            connection.close()
+            raise
 
         if self.verbose:
             print("Incoming headers:")
@@ -208,6 +279,7 @@ class Transport(xmlrpclib.Transport):
         if fd.status in (301, 302):
             self._redirected = headers["Location"]
             self.response_status = fd.status
+            connection.close()
             return None
 
         # Save the headers
@@ -245,11 +317,11 @@ class Transport(xmlrpclib.Transport):
             f.close = connection.close
             return f
 
-        # We can safely close the connection now; if we had an
-        # application/octet/stream (for which Input.read passes the original
-        # socket object), Input.decode would return an InputStream,
-        # so we wouldn't reach this point
-        connection.close()
+        # The response has been read, so the connection can be closed or
+        # reused; if we had an application/octet/stream (for which Input.read
+        # passes the original socket object), Input.decode would return an
+        # InputStream, so we wouldn't reach this point
+        self._release_connection(connection)
 
         return self.parse_response(fd)
 
@@ -264,7 +336,7 @@ class Transport(xmlrpclib.Transport):
         p, u = self.getparser()
 
         while 1:
-            response = f.read(1024)
+            response = f.read(self.bufferSize)
             if not response:
                 break
             if self.refreshCallback:
@@ -474,7 +546,7 @@ class Input:
         # pylint: disable-next=invalid-name
         progressCallback=None,
         # pylint: disable-next=invalid-name
-        bufferSize=1024,
+        bufferSize=BUFFER_SIZE,
         max_mem_size=16384,
     ):
         self.transfer = None
@@ -549,7 +621,9 @@ class Input:
             )
         else:
             # Oh well, no clue; read until EOF (hopefully)
-            self.io = _smart_total_read(fd)
+            self.io = _smart_total_read(
+                fd, bufferSize=self.bufferSize, max_mem_size=self.max_mem_size
+            )
 
         if not self.transfer or self.transfer == "binary":
             return
@@ -622,8 +696,19 @@ class Input:
 # Utility functions
 
 
+def _connection_dropped(connection):
+    """Returns true if the server closed the idle connection; an idle
+    connection has nothing to read unless it was closed"""
+    if connection.sock is None:
+        return True
+    try:
+        return bool(select.select([connection.sock], [], [], 0)[0])
+    except (ValueError, select.error, socket.error):
+        return True
+
+
 # pylint: disable-next=invalid-name
-def _smart_total_read(fd, bufferSize=1024, max_mem_size=16384):
+def _smart_total_read(fd, bufferSize=BUFFER_SIZE, max_mem_size=16384):
     """
     Tries to read data from the supplied stream, and puts the results into a
     StmartIO object. The data will be in memory or in a temporary file,
@@ -642,7 +727,9 @@ def _smart_total_read(fd, bufferSize=1024, max_mem_size=16384):
 
 
 # pylint: disable-next=invalid-name
-def _smart_read(fd, amt, bufferSize=1024, progressCallback=None, max_mem_size=16384):
+def _smart_read(
+    fd, amt, bufferSize=BUFFER_SIZE, progressCallback=None, max_mem_size=16384
+):
     # Reads amt bytes from fd, or until the end of file, whichever
     # occurs first
     # The function will read in memory if the amout to be read is smaller than
@@ -879,7 +966,9 @@ class BaseOutput:
         if self._connection is None:
             # pylint: disable-next=broad-exception-raised
             raise Exception("No connection object found")
-        self._connection.connect()
+        if self._connection.sock is None:
+            # Not connected yet, or closed after the previous response
+            self._connection.connect()
         # wrap self data into binary object, otherwise HTTPConnection.request
         # will encode it as ISO-8859-1 https://docs.python.org/3/library/http.client.html#httpconnection-objects
         self._connection.request(
@@ -978,7 +1067,7 @@ class File:
         # pylint: disable-next=invalid-name
         progressCallback=None,
         # pylint: disable-next=invalid-name
-        bufferSize=16384,
+        bufferSize=BUFFER_SIZE,
     ):
         self.length = length
         self.file_obj = file_obj
@@ -28,6 +28,7 @@ except ImportError:
     import pickle as cPickle
 import fcntl
 import sys
+import time
 from stat import ST_MTIME
 from errno import EEXIST
 
@@ -41,6 +42,10 @@ from uyuni.common.fileutils import makedirs
 # to reserve our own shared memory space.
 CACHEDIR = "/var/cache/rhn"
 
+# Known total sizes of the EvictingCache directories, shared by all the
+# instances in this process so that the directory is scanned only once
+_evicting_cache_sizes = {}
+
 
 def cleanupPath(path):
     """take ~taw/../some/path/$MOUNT_POINT/blah and make it sensible."""
@@ -458,3 +463,106 @@ class NullCache:
         self, name, modified=None, user="root", group="root", mode=int("0755", 8)
     ):
         return self.cache.set_file(name, modified, user, group, mode)
+
+
+class EvictingCache:
+    """
+    A cache keeping the size of the entries stored below prefix under
+    max_size bytes, evicting the least recently used entries first.
+
+    The modification time of the cache files is the entry timestamp, so the
+    last use of an entry is tracked with the file access time instead.
+    A max_size of 0 disables the eviction.
+    """
+
+    # Fraction of max_size an evicting cache gets trimmed down to
+    low_water_mark = 0.9
+
+    def __init__(self, cache, prefix, max_size):
+        self.cache = cache
+        self.prefix = prefix
+        self.max_size = max_size
+
+    def get(self, name, modified=None):
+        value = self.cache.get(name, modified)
+        self._touch(name)
+        return value
+
+    def set(
+        self, name, value, modified=None, user="root", group="root", mode=int("0755", 8)
+    ):
+        self.cache.set(name, value, modified, user, group, mode)
+        self._account(name)
+
+    def has_key(self, name, modified=None):
+        return self.cache.has_key(name, modified)
+
+    def delete(self, name):
+        self.cache.delete(name)
+
+    def get_file(self, name, modified=None):
+        fd = self.cache.get_file(name, modified)
+        self._touch(name)
+        return fd
+
+    def set_file(
+        self, name, modified=None, user="root", group="root", mode=int("0755", 8)
+    ):
+        # The size of the entry is unknown until the file is closed, make
+        # the next set() rescan the directory
+        _evicting_cache_sizes.pop(_fname(self.prefix), None)
+        return self.cache.set_file(name, modified, user, group, mode)
+
+    @staticmethod
+    def _touch(name):
+        """Bump the access time of an entry, keeping its timestamp."""
+        fname = _fname(name)
+        try:
+            os.utime(fname, (time.time(), os.stat(fname)[ST_MTIME]))
+        except OSError:
+            # Not ours or evicted in the meantime, the entry just ages
+            pass
+
+    def _account(self, name):
+        if self.max_size <= 0:
+            return
+
+        dirname = _fname(self.prefix)
+        size = _evicting_cache_sizes.get(dirname)
+        if size is not None:
+            try:
+                size += os.path.getsize(_fname(name))
+            except OSError:
+                pass
+            _evicting_cache_sizes[dirname] = size
+        if size is None or size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        """Scan the cache directory and drop the least recently used entries."""
+        dirname = _fname(self.prefix)
+        entries = []
+        size = 0
+        for dirpath, _dirnames, filenames in os.walk(dirname):
+            for filename in filenames:
+                fname = os.path.join(dirpath, filename)
+                try:
+                    statinfo = os.stat(fname)
+                except OSError:
+                    continue
+                entries.append((statinfo.st_atime, statinfo.st_size, fname))
+                size += statinfo.st_size
+
+        if size > self.max_size:
+            target = self.max_size * self.low_water_mark
+            entries.sort()
+            for _atime, entry_size, fname in entries:
+                if size <= target:
+                    break
+                try:
+                    os.unlink(fname)
+                except OSError:
+                    continue
+                size -= entry_size
+
+        _evicting_cache_sizes[dirname] = size
@@ -19,6 +19,7 @@ import sys
 import glob
 import stat
 import re
+import time
 
 from contextlib import contextmanager
 
@@ -145,6 +146,7 @@ class RHNOptions:
                 # and retain the new timestamp
                 self.updateLastModified(timeDiff)
                 self.__configs.clear()  # cache cleared
+                invalidate_cfg_snapshots()
 
         # parse the defaults.
         self._parseDefaults(allCompsYN=0)
@@ -213,6 +215,7 @@ class RHNOptions:
     def set(self, key, value):
         self.__check()
         self.__configs[self.__component][key] = value
+        invalidate_cfg_snapshots()
 
     __setitem__ = set
 
@@ -643,6 +646,82 @@ def cfg_component(component, root=None, filename=None):
         initCFG(previous)
 
 
+class ConfigSnapshot:
+    """Read-only copy of the configuration of a component.
+
+    Returned by cfg_snapshot(); options are read like on CFG (e.g.
+    snapshot.MOUNT_POINT or snapshot.get("mount_point")) without switching
+    the component or checking the configuration file.
+    """
+
+    def __init__(self, component, items):
+        self.__dict__["_component"] = component
+        self.__dict__["_options"] = dict((k.lower(), v) for k, v in items)
+        self.__dict__["created"] = time.time()
+
+    def __getattr__(self, key):
+        if key.startswith("_"):
+            raise AttributeError(key)
+        try:
+            return self._options[key.lower()]
+        except KeyError:
+            # pylint: disable-next=raise-missing-from
+            raise AttributeError(key)
+
+    __getitem__ = __getattr__
+
+    def __setattr__(self, key, value):
+        raise AttributeError("Configuration snapshots are read-only")
+
+    def get(self, key, default=None):
+        return self._options.get(key.lower(), default)
+
+    def has_key(self, key):
+        return key.lower() in self._options
+
+    def keys(self):
+        return list(self._options.keys())
+
+    def items(self):
+        return list(self._options.items())
+
+    def getComponent(self):
+        return self._component
+
+
+# Snapshots returned by cfg_snapshot(), keyed on component
+_snapshots = {}
+
+# Seconds after which cfg_snapshot() reads the configuration again
+SNAPSHOT_MAX_AGE = 60
+
+
+def cfg_snapshot(component, max_age=SNAPSHOT_MAX_AGE):
+    """Return a ConfigSnapshot of the configuration of component.
+
+    The snapshot is shared and reused for max_age seconds, or until
+    invalidate_cfg_snapshots() is called (CFG.set() and a changed
+    configuration file do it too). Unlike cfg_component(), taking a recent
+    snapshot doesn't stat the configuration file, so hot loops can use it
+    for every item:
+
+    for package in packages:
+        mount_point = cfg_snapshot("server.susemanager").MOUNT_POINT
+    """
+    snapshot = _snapshots.get(component)
+    if snapshot is None or time.time() - snapshot.created > max_age:
+        with cfg_component(component) as cfg:
+            snapshot = ConfigSnapshot(component, cfg.items())
+        _snapshots[component] = snapshot
+    return snapshot
+
+
+def invalidate_cfg_snapshots():
+    """Drop the snapshots, the next cfg_snapshot() calls read the
+    configuration again."""
+    _snapshots.clear()
+
+
 # ------------------------------------------------------------------------------
 # Usage:  rhnConfig.py [ { get | list } component [ key ] ]
 #    No args assumes test mode.
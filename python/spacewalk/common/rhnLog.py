@@ -149,6 +149,12 @@ def log_debug(level, *args):
         LOG.logMessage(*args)
 
 
+def log_debug_enabled(level):
+    """Tell if log_debug() logs messages of this level, so that callers can
+    skip building expensive messages."""
+    return bool(LOG and LOG.level >= level)
+
+
 # Dump some information to stderr.
 
 
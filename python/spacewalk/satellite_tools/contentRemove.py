@@ -496,9 +496,9 @@ def list_packages(channelLabels, sources=0, force=0):
             minus_op,
             templ % ("not", bind_params),
         )
-    h = rhnSQL.prepare(query)
+    h = rhnSQL.prepare(query, streaming=True)
     h.execute(**params)
-    return [x["id"] for x in h.fetchall_dict() or []]
+    return [row[0] for row in h.fetchiter()]
 
 
 def _templ_rpms():
@@ -721,6 +721,8 @@ class QueryIterator:
     single result set.
     Params is a list of dictionaries that would fill the named bound variables
     from the statement.
+    The rows are fetched in batches, so with a streaming statement a result set
+    is never loaded into memory at once.
     """
 
     def __init__(self, statement, params):
@@ -728,12 +730,12 @@ class QueryIterator:
         self._params = params
         # Position in the params list
         self._params_pos = -1
-        self._result_set_exhausted = 1
+        self._rows = None
 
     def fetchone_dict(self):
         log_debug(4)
         while 1:
-            if self._result_set_exhausted:
+            if self._rows is None:
                 # Nothing to do here, move to the next set of params
                 pos = self._params_pos
                 pos = pos + 1
@@ -744,16 +746,16 @@ class QueryIterator:
                 # Execute the satement
                 log_debug(5, "Using param", pos, self._params[pos])
                 self._statement.execute(**self._params[pos])
-                self._result_set_exhausted = 0
+                self._rows = self._statement.fetchiter_dict()
                 # Go back into the loop
                 continue
 
             # Result set not exhausted yet
-            row = self._statement.fetchone_dict()
+            row = next(self._rows, None)
             if row:
                 return row
 
-            self._result_set_exhausted = 1
+            self._rows = None
 
 
 class CachedQueryIterator:
@@ -943,7 +945,7 @@ class ChannelsDumper(exportLib.ChannelsDumper):
             # Nothing to do
             return
 
-        h = rhnSQL.prepare(self._query_list_channels)
+        h = rhnSQL.prepare(self._query_list_channels, streaming=True)
         return QueryIterator(statement=h, params=self._channels)
 
 
@@ -1121,7 +1123,7 @@ class ErrataDumper(exportLib.ErrataDumper):
     )
 
     def __init__(self, writer, params):
-        statement = rhnSQL.prepare(self.iterator_query)
+        statement = rhnSQL.prepare(self.iterator_query, streaming=True)
         iterator = QueryIterator(statement, params)
         exportLib.ErrataDumper.__init__(self, writer, iterator)
 
@@ -14,11 +14,16 @@
 # in this software or its documentation.
 #
 
+import fcntl
+import json
+import multiprocessing
 import os
+import shutil
 import sys
 import re
+import tempfile
 import time
-from threading import Thread, Lock
+from threading import Thread, Lock, Condition, get_ident
 
 try:
     #  python 2
@@ -34,10 +39,232 @@ except ImportError:
     from urllib.parse import quote
 import pycurl
 from urlgrabber.grabber import URLGrabberOptions, PyCurlFileObject, URLGrabError
-from uyuni.common.checksum import getFileChecksum
+from uyuni.common.checksum import getFileChecksum, getHashlibInstance
 from spacewalk.common.rhnConfig import cfg_component
 from spacewalk.satellite_tools.syncLib import log, log2
 
+# Limits the downloads running at the same time in all the processes forked
+# after set_download_slots(), see reposync.sync_channels()
+download_slots = None
+
+
+def set_download_slots(slots):
+    """Share a limit of slots concurrent downloads with the processes forked
+    from now on, None for no limit"""
+    # pylint: disable-next=global-statement
+    global download_slots
+    download_slots = multiprocessing.BoundedSemaphore(slots) if slots else None
+
+
+# ioctl sharing the data of a file with another one on copy-on-write file
+# systems like btrfs or xfs, see ioctl_ficlone(2)
+FICLONE = 0x40049409
+
+
+def link_or_copy(src, dst):
+    """Hardlink src to dst, reflink or copy it if it cannot be hardlinked.
+    dst is replaced atomically."""
+    # pylint: disable-next=consider-using-f-string
+    tmp_dst = "%s.%d.%d.tmp" % (dst, os.getpid(), get_ident())
+    try:
+        try:
+            os.link(src, tmp_dst)
+        except OSError:
+            with open(src, "rb") as fsrc, open(tmp_dst, "wb") as fdst:
+                try:
+                    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                except OSError:
+                    shutil.copyfileobj(fsrc, fdst)
+        os.replace(tmp_dst, dst)
+    finally:
+        if os.path.lexists(tmp_dst):
+            os.unlink(tmp_dst)
+
+
+class ChecksumCache:
+    """Checksums of files, valid as long as the inode, size and modification
+    time of the files do not change. Saved to filename, if any, to be used by
+    the next sync runs."""
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.lock = Lock()
+        self.changed = False
+        self.checksums = self._read() if filename else {}
+
+    @staticmethod
+    def _key(st):
+        return [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns]
+
+    def _read(self):
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _valid(self, path, entry):
+        try:
+            return entry[:4] == self._key(os.stat(path))
+        except OSError:
+            return False
+
+    def get(self, path, checksum_type):
+        """Returns the known checksum of path or None"""
+        with self.lock:
+            entry = self.checksums.get(os.path.abspath(path))
+        if entry and entry[4] == checksum_type and self._valid(path, entry):
+            return entry[5]
+        return None
+
+    def set(self, path, checksum_type, checksum, st=None):
+        if st is None:
+            st = os.stat(path)
+        with self.lock:
+            self.checksums[os.path.abspath(path)] = self._key(st) + [
+                checksum_type,
+                checksum,
+            ]
+            self.changed = True
+
+    def checksum(self, path, checksum_type):
+        """Returns the checksum of path, only computed when not known"""
+        checksum = self.get(path, checksum_type)
+        if checksum is None:
+            st = os.stat(path)
+            checksum = getFileChecksum(checksum_type, filename=path)
+            self.set(path, checksum_type, checksum, st)
+        return checksum
+
+    def save(self):
+        if not self.filename or not self.changed:
+            return
+        # keep the checksums saved meanwhile by other processes
+        checksums = self._read()
+        with self.lock:
+            checksums.update(self.checksums)
+            self.changed = False
+        checksums = {
+            path: entry for path, entry in checksums.items() if self._valid(path, entry)
+        }
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(self.filename))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(checksums, f)
+            os.rename(tmp_file, self.filename)
+        except OSError:
+            os.unlink(tmp_file)
+            raise
+
+
+class DownloadCache:
+    """Content-addressed store of the downloaded files, shared by all the
+    channels and sync runs: a file already downloaded once is linked to its
+    new target file instead of being downloaded again."""
+
+    def __init__(self, directory, max_size=0):
+        self.directory = directory
+        self.max_size = max_size
+        self.checksums = ChecksumCache(os.path.join(directory, "checksums.json"))
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def path(self, checksum_type, checksum):
+        return os.path.join(self.directory, checksum_type, checksum[:2], checksum)
+
+    def fetch(self, checksum_type, checksum, target_file):
+        """Link the cached file with checksum to target_file, returns False
+        if it is not in the cache"""
+        path = self.path(checksum_type, checksum)
+        try:
+            if self.checksums.checksum(path, checksum_type) == checksum:
+                link_or_copy(path, target_file)
+                self.checksums.set(target_file, checksum_type, checksum)
+                # the least recently used files are pruned first
+                st = os.stat(path)
+                os.utime(path, ns=(int(time.time() * 1e9), st.st_mtime_ns))
+                with self.lock:
+                    self.hits += 1
+                    self.bytes_saved += st.st_size
+                return True
+            # pylint: disable-next=consider-using-f-string
+            log(1, "Removing invalid file from download cache: %s" % path)
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # pylint: disable-next=consider-using-f-string
+            log(1, "Download cache not used for %s: %s" % (target_file, e))
+        with self.lock:
+            self.misses += 1
+        return False
+
+    def store(self, checksum_type, checksum, target_file):
+        """Add the downloaded target_file with checksum to the cache"""
+        path = self.path(checksum_type, checksum)
+        try:
+            self.checksums.set(target_file, checksum_type, checksum)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                link_or_copy(target_file, path)
+                self.checksums.set(path, checksum_type, checksum)
+        except OSError as e:
+            # pylint: disable-next=consider-using-f-string
+            log(1, "Cannot add %s to the download cache: %s" % (target_file, e))
+
+    def prune(self):
+        """Remove the least recently used files until the files not linked
+        anywhere else fit in max_size"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                if path == self.checksums.filename:
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                # files also linked to the package store use no space of their own
+                if st.st_nlink > 1:
+                    continue
+                entries.append((st.st_atime, st.st_size, path))
+                total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+
+    def finish(self):
+        """Log the cache statistics, save the checksums and prune the cache"""
+        if self.hits or self.misses:
+            log(
+                0,
+                # pylint: disable-next=consider-using-f-string
+                "    Download cache: %d of %d files found (%d%%), %.1f MB not downloaded."
+                % (
+                    self.hits,
+                    self.hits + self.misses,
+                    100 * self.hits // (self.hits + self.misses),
+                    self.bytes_saved / (1024 * 1024),
+                ),
+            )
+        try:
+            self.checksums.save()
+            if self.max_size > 0:
+                self.prune()
+        except OSError as e:
+            # pylint: disable-next=consider-using-f-string
+            log(1, "Cannot update the download cache: %s" % e)
+
 
 # pylint: disable-next=missing-class-docstring
 class ProgressBarLogger:
@@ -136,9 +363,16 @@ def get_proxies(proxy, user, password):
 
 # pylint: disable-next=missing-class-docstring
 class PyCurlFileObjectThread(PyCurlFileObject):
-    def __init__(self, url, filename, opts, curl_cache, parent):
+    def __init__(self, url, filename, opts, curl_cache, parent, checksum_type=None):
         self.curl_cache = curl_cache
         self.parent = parent
+        # the downloaded data is hashed as it arrives, see downloaded_checksum()
+        self.hasher = None
+        self.hashed_size = 0
+        if checksum_type:
+            self.hasher = getHashlibInstance(
+                "sha1" if checksum_type == "sha" else checksum_type, False
+            )
         # Next 3 lines will not be required on having urlgrabber with proper fix
         # https://github.com/rpm-software-management/urlgrabber/pull/35
         (url, parts) = opts.urlparser.parse(url, opts)
@@ -155,19 +389,43 @@ class PyCurlFileObjectThread(PyCurlFileObject):
         return self.fo
 
     def _do_perform(self):
-        # WORKAROUND - BZ #1439758 - ensure first item in queue is performed alone to properly setup NSS
-        if not self.parent.first_in_queue_done:
+        # WORKAROUND - BZ #1439758 - ensure first item of each SSL set is performed alone to properly setup NSS
+        ssl_set = (self.opts.ssl_ca_cert, self.opts.ssl_cert, self.opts.ssl_key)
+        first = ssl_set not in self.parent.first_in_queue_done
+        if first:
+            # the first items of all the SSL sets share one lock, NSS must
+            # not be set up by two of them at the same time
             self.parent.first_in_queue_lock.acquire()
             # If some other thread was faster, no need to block anymore
-            if self.parent.first_in_queue_done:
+            if ssl_set in self.parent.first_in_queue_done:
                 self.parent.first_in_queue_lock.release()
+                first = False
         try:
             super()._do_perform()
         finally:
-            if not self.parent.first_in_queue_done:
-                self.parent.first_in_queue_done = True
+            if first:
+                self.parent.first_in_queue_done.add(ssl_set)
                 self.parent.first_in_queue_lock.release()
 
+    def _retrieve(self, buf):
+        ret = super()._retrieve(buf)
+        if self.hasher is not None and ret == len(buf):
+            self.hasher.update(buf)
+            self.hashed_size += ret
+        return ret
+
+    def downloaded_checksum(self):
+        """Returns the checksum of the downloaded file, None if it could not
+        be computed while downloading (partial or resumed downloads)"""
+        if self.hasher is None or self._range or self.append:
+            return None
+        try:
+            if os.path.getsize(self.filename) != self.hashed_size:
+                return None
+        except (OSError, TypeError):
+            return None
+        return self.hasher.hexdigest()
+
 
 class FailedDownloadError(Exception):
     pass
@@ -184,13 +442,15 @@ class DownloadThread(Thread):
         self.mirror = 0
         self.failed_pkgs = set()
 
-    @staticmethod
     def __is_file_done(
-        local_path=None, file_obj=None, checksum_type=None, checksum=None
+        self, local_path=None, file_obj=None, checksum_type=None, checksum=None
     ):
         if checksum_type and checksum:
             if local_path and os.path.isfile(local_path):
-                return getFileChecksum(checksum_type, filename=local_path) == checksum
+                return (
+                    self.parent.checksums.checksum(local_path, checksum_type)
+                    == checksum
+                )
             elif file_obj:
                 return getFileChecksum(checksum_type, file_obj=file_obj) == checksum
         if local_path and os.path.isfile(local_path):
@@ -199,6 +459,15 @@ class DownloadThread(Thread):
             return True
         return False
 
+    def __is_download_done(self, fo, checksum_type, checksum):
+        if fo is not None and checksum_type and checksum:
+            downloaded_checksum = fo.downloaded_checksum()
+            if downloaded_checksum is not None:
+                return downloaded_checksum == checksum
+        return self.__is_file_done(
+            file_obj=fo, checksum_type=checksum_type, checksum=checksum
+        )
+
     def __can_retry(self, retry, mirrors, opts, url, e):
         retrycode = getattr(e, "errno", None)
         code = getattr(e, "code", None)
@@ -254,6 +523,15 @@ class DownloadThread(Thread):
                 checksum=params["checksum"],
             ):
                 return True
+            if (
+                self.parent.cache is not None
+                and params["checksum_type"]
+                and params["checksum"]
+                and self.parent.cache.fetch(
+                    params["checksum_type"], params["checksum"], params["target_file"]
+                )
+            ):
+                return True
 
         # 14 => HTTPError (https://github.com/rpm-software-management/urlgrabber/blob/1e6d2debe79efdd1ba2f39913dc808723e51a7f7/urlgrabber/grabber.py#L757)
         retrycodes = URLGrabberOptions().retrycodes
@@ -276,6 +554,7 @@ class DownloadThread(Thread):
         )
 
         mirrors = len(params["urls"])
+        downloaded = False
         for retry in range(max(self.parent.retries, mirrors)):
             fo = None
             url = urlparse.urljoin(params["urls"][self.mirror], params["relative_path"])
@@ -297,19 +576,23 @@ class DownloadThread(Thread):
             try:
                 try:
                     fo = PyCurlFileObjectThread(
-                        url, params["target_file"], opts, self.curl, self.parent
+                        url,
+                        params["target_file"],
+                        opts,
+                        self.curl,
+                        self.parent,
+                        checksum_type=params["checksum_type"],
                     )
                     # Check target file
-                    if not self.__is_file_done(
-                        file_obj=fo,
-                        checksum_type=params["checksum_type"],
-                        checksum=params["checksum"],
+                    if not self.__is_download_done(
+                        fo, params["checksum_type"], params["checksum"]
                     ):
                         raise FailedDownloadError(
                             # pylint: disable-next=consider-using-f-string
                             "Target file isn't valid. Checksum should be %s (%s)."
                             % (params["checksum"], params["checksum_type"])
                         )
+                    downloaded = True
                     break
                 except (FailedDownloadError, URLGrabError):
                     e = sys.exc_info()[1]
@@ -336,16 +619,31 @@ class DownloadThread(Thread):
                 elif os.path.isfile(params["target_file"]):
                     os.unlink(params["target_file"])
 
+        if (
+            downloaded
+            and self.parent.cache is not None
+            and params.get("checksum_type")
+            and params.get("checksum")
+        ):
+            self.parent.cache.store(
+                params["checksum_type"], params["checksum"], params["target_file"]
+            )
         return True
 
     def run(self):
         while not self.queue.empty() and self.parent.can_continue():
+            if not self.parent.wait_for_staging_space():
+                break
             try:
                 params = self.queue.get(block=False)
             except Empty:
                 break
             self.mirror = 0
-            success = self.__fetch_url(params)
+            if download_slots is None:
+                success = self.__fetch_url(params)
+            else:
+                with download_slots:
+                    success = self.__fetch_url(params)
             if self.parent.log_obj:
                 # log_obj must be thread-safe
                 self.parent.log_obj.log(
@@ -355,13 +653,16 @@ class DownloadThread(Thread):
             if not success:
                 package = os.path.basename(params["target_file"])
                 self.failed_pkgs.add(package)
+            self.parent.file_done(success, params)
         self.curl.close()
 
 
 # pylint: disable-next=missing-class-docstring
 class ThreadedDownloader:
     def __init__(self, retries=3, log_obj=None, force=False):
-        self.queues = {}
+        # one queue and one pool of threads for the downloads of all SSL sets
+        self.queue = Queue()
+        self.ssl_sets = set()
         # pylint: disable-next=invalid-name
         with cfg_component("server.satellite") as CFG:
             try:
@@ -391,24 +692,96 @@ class ThreadedDownloader:
                     "Minimal transfer rate in bytes pre second expected, found: '%s'"
                     % CFG.REPOSYNC_MINRATE
                 )
+            cache_dir = CFG.REPOSYNC_DOWNLOAD_CACHE
+            cache_max_size = 0
+            if cache_dir:
+                try:
+                    cache_max_size = int(CFG.REPOSYNC_DOWNLOAD_CACHE_MAX_SIZE or 0)
+                except ValueError:
+                    # pylint: disable-next=raise-missing-from
+                    raise ValueError(
+                        # pylint: disable-next=consider-using-f-string
+                        "Maximal download cache size in MB expected, found: '%s'"
+                        % CFG.REPOSYNC_DOWNLOAD_CACHE_MAX_SIZE
+                    )
 
         if self.threads < 1:
             # pylint: disable-next=consider-using-f-string
             raise ValueError("Invalid number of threads: %d" % self.threads)
 
+        # packages downloaded for any channel are linked from the cache
+        self.cache = None
+        if cache_dir:
+            self.cache = DownloadCache(cache_dir, cache_max_size * 1024 * 1024)
+            self.checksums = self.cache.checksums
+        else:
+            self.checksums = ChecksumCache()
         self.retries = retries
         self.log_obj = log_obj
         self.force = force
         self.lock = Lock()
         self.exception = None
-        # WORKAROUND - BZ #1439758 - ensure first item in queue is performed alone to properly setup NSS
-        self.first_in_queue_done = False
+        # WORKAROUND - BZ #1439758 - ensure first item of each SSL set is performed alone to properly setup NSS
+        self.first_in_queue_done = set()
         self.first_in_queue_lock = Lock()
         self.failed_pkgs = set()
+        # pipelining support, see set_done_callback() and set_staging_limit()
+        self.done_callback = None
+        self.staging_limit = 0
+        self.staged_files = {}
+        self.staging_cond = Condition()
+        self._runner = None
 
     def set_log_obj(self, log_obj):
         self.log_obj = log_obj
 
+    def set_done_callback(self, callback):
+        """Call callback(success, params) as soon as each file is processed.
+        The callback is called from the download threads and must be thread-safe."""
+        self.done_callback = callback
+
+    def set_staging_limit(self, limit):
+        """Limit the size in bytes of downloaded files not yet released with
+        release_staged(). Downloads pause while the limit is exceeded. 0 means
+        no limit."""
+        self.staging_limit = limit
+
+    def staging_full(self):
+        with self.staging_cond:
+            return self._staging_full()
+
+    def _staging_full(self):
+        # a single file bigger than the limit is always allowed through
+        return (
+            self.staging_limit > 0
+            and bool(self.staged_files)
+            and sum(self.staged_files.values()) >= self.staging_limit
+        )
+
+    def wait_for_staging_space(self):
+        with self.staging_cond:
+            while self._staging_full():
+                if not self.can_continue():
+                    return False
+                self.staging_cond.wait(timeout=1)
+        return self.can_continue()
+
+    def file_done(self, success, params):
+        if success and self.staging_limit > 0:
+            target_file = params["target_file"]
+            size = os.path.getsize(target_file) if os.path.isfile(target_file) else 0
+            with self.staging_cond:
+                self.staged_files[target_file] = size
+        if self.done_callback:
+            self.done_callback(success, params)
+
+    def release_staged(self, target_files):
+        """Mark downloaded files as consumed, freeing staging space"""
+        with self.staging_cond:
+            for target_file in target_files:
+                self.staged_files.pop(target_file, None)
+            self.staging_cond.notify_all()
+
     def set_force(self, force):
         self.force = force
 
@@ -434,51 +807,72 @@ class ThreadedDownloader:
             params["ssl_client_key"],
         )
         if self._validate(ssl_set):
-            if ssl_set not in self.queues:
-                self.queues[ssl_set] = Queue()
-            queue = self.queues[ssl_set]
+            self.ssl_sets.add(ssl_set)
             params["timeout"] = self.timeout
             params["minrate"] = self.minrate
-            queue.put(params)
+            self.queue.put(params)
 
     def run(self):
-        size = 0
-        for queue in list(self.queues.values()):
-            size += queue.qsize()
+        size = self.queue.qsize()
         if size <= 0:
             return
-        # pylint: disable-next=consider-using-f-string
-        log(1, "Downloading total %d files from %d queues." % (size, len(self.queues)))
-
-        for index, queue in enumerate(self.queues.values()):
+        log(
+            1,
             # pylint: disable-next=consider-using-f-string
-            log(2, "Downloading %d files from queue #%d." % (queue.qsize(), index))
-            self.first_in_queue_done = False
-            started_threads = []
-            for _ in range(self.threads):
-                thread = DownloadThread(self, queue)
-                # pylint: disable-next=deprecated-method
-                thread.setDaemon(True)
-                thread.start()
-                started_threads.append(thread)
-
-            # wait to finish
-            try:
-                while any(t.is_alive() for t in started_threads):
-                    time.sleep(1)
-            except KeyboardInterrupt:
-                e = sys.exc_info()[1]
-                self.fail_download(e)
-                while any(t.is_alive() for t in started_threads):
-                    time.sleep(1)
-                break
-            # accumulate all failed packages
-            self.failed_pkgs = {pkg for t in started_threads for pkg in t.failed_pkgs}
+            "Downloading total %d files with %d SSL sets." % (size, len(self.ssl_sets)),
+        )
+
+        # the threads take the downloads of all SSL sets from the same queue,
+        # in the order they were added
+        started_threads = []
+        for _ in range(min(self.threads, size)):
+            thread = DownloadThread(self, self.queue)
+            thread.daemon = True
+            thread.start()
+            started_threads.append(thread)
+
+        # wait to finish
+        try:
+            for thread in started_threads:
+                thread.join()
+        except KeyboardInterrupt:
+            e = sys.exc_info()[1]
+            self.fail_download(e)
+            for thread in started_threads:
+                thread.join()
+        # accumulate all failed packages
+        self.failed_pkgs = {pkg for t in started_threads for pkg in t.failed_pkgs}
+
+        if self.cache is not None:
+            self.cache.finish()
 
         # raise first detected exception if any
         if self.exception:
             raise self.exception  # pylint: disable=E0702
 
+    def start(self):
+        """Run the downloads in a background thread. Use join() to wait for
+        them and to get the first detected exception raised."""
+        self._runner = Thread(target=self._run_background)
+        self._runner.daemon = True
+        self._runner.start()
+
+    def _run_background(self):
+        try:
+            self.run()
+        except BaseException as e:  # pylint: disable=W0703
+            self.fail_download(e)
+
+    def is_alive(self):
+        return self._runner is not None and self._runner.is_alive()
+
+    def join(self):
+        if self._runner is not None:
+            self._runner.join()
+            self._runner = None
+        if self.exception:
+            raise self.exception  # pylint: disable=E0702
+
     def can_continue(self):
         self.lock.acquire()
         status = self.exception is None
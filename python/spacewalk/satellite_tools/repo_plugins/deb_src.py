@@ -104,6 +104,77 @@ class DebPackage:
         )
 
 
+# checksum fields of a Packages index stanza, best first
+CHECKSUM_FIELDS = (("SHA256", "sha256"), ("SHA1", "sha1"), ("MD5sum", "md5"))
+PACKAGE_FIELDS = frozenset(
+    ["Package", "Architecture", "Version", "Filename"]
+    + [field for field, _ in CHECKSUM_FIELDS]
+)
+
+
+def _package_from_fields(fields):
+    package = DebPackage()
+    package.name = fields.get("Package")
+    if "Architecture" in fields:
+        package.arch = fields["Architecture"] + "-deb"
+    package.epoch = ""
+    if "Version" in fields:
+        version = fields["Version"]
+        if ":" in version:
+            package.epoch, version = version.split(":", 1)
+        if "-" in version:
+            package.version, package.release = version.rsplit("-", 1)
+        else:
+            package.version = version
+            package.release = "X"
+    package.relativepath = fields.get("Filename")
+    # Pick best available checksum
+    for field, checksum_type in CHECKSUM_FIELDS:
+        if field in fields:
+            package.checksum_type = checksum_type
+            package.checksum = fields[field]
+            break
+    return package
+
+
+def _read_lines(stream, size=256 * 1024):
+    """Split the text read from stream in chunks of size into lines, faster
+    than iterating the lines of the stream"""
+    rest = ""
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            break
+        lines = (rest + chunk).split("\n")
+        rest = lines.pop()
+        yield from lines
+    if rest:
+        yield rest
+
+
+def parse_packages(stream):
+    """Parse a Packages index read from stream, yielding the complete
+    packages one stanza at a time"""
+    fields = {}
+    for line in _read_lines(stream):
+        if line[:1] in (" ", "\t"):
+            # continuation of a multiline field, like Description
+            continue
+        name, sep, value = line.partition(":")
+        if sep:
+            if name in PACKAGE_FIELDS:
+                fields[name] = value.strip()
+        elif not line.strip() and fields:
+            package = _package_from_fields(fields)
+            fields = {}
+            if package.is_populated():
+                yield package
+    if fields:
+        package = _package_from_fields(fields)
+        if package.is_populated():
+            yield package
+
+
 # pylint: disable-next=missing-class-docstring
 class DebRepo:
     # url example - http://ftp.debian.org/debian/dists/jessie/main/binary-amd64/
@@ -289,9 +360,12 @@ class DebRepo:
         return ""
 
     def get_package_list(self):
+        return list(self.iter_packages())
+
+    def iter_packages(self):
+        """Yield the packages of the repository, parsed from the compressed
+        Packages index while it is decompressed"""
         decompressed = None
-        packages_raw = []
-        to_return = []
 
         for extension in FORMAT_PRIORITY:
             scheme, netloc, path, query, fragid = urlparse.urlsplit(self.url)
@@ -316,60 +390,14 @@ class DebRepo:
                 decompressed = fileutils.decompress_open(filename)
                 break
 
-        if decompressed:
-            for pkg in decompressed.read().split("\n\n"):
-                packages_raw.append(pkg)
-            decompressed.close()
-        else:
+        if not decompressed:
             print("ERROR: Download of package list failed.")
+            return
 
-        # Parse and format package metadata
-        for chunk in packages_raw:
-            package = DebPackage()
-            package.epoch = ""
-            lines = chunk.split("\n")
-            checksums = {}
-            for line in lines:
-                pair = tuple(p.strip() for p in line.split(" ", 1))
-                if pair[0] == "Package:":
-                    package.name = pair[1]
-                elif pair[0] == "Architecture:":
-                    package.arch = pair[1] + "-deb"
-                elif pair[0] == "Version:":
-                    package["epoch"] = ""
-                    version = pair[1]
-                    if version.find(":") != -1:
-                        package["epoch"], version = version.split(":")
-                    if version.find("-") != -1:
-                        tmp = version.split("-")
-                        package["version"] = "-".join(tmp[:-1])
-                        package["release"] = tmp[-1]
-                    else:
-                        package["version"] = version
-                        package["release"] = "X"
-                elif pair[0] == "Filename:":
-                    package.relativepath = pair[1]
-                elif pair[0] == "SHA256:":
-                    checksums["sha256"] = pair[1]
-                elif pair[0] == "SHA1:":
-                    checksums["sha1"] = pair[1]
-                elif pair[0] == "MD5sum:":
-                    checksums["md5"] = pair[1]
-
-            # Pick best available checksum
-            if "sha256" in checksums:
-                package.checksum_type = "sha256"
-                package.checksum = checksums["sha256"]
-            elif "sha1" in checksums:
-                package.checksum_type = "sha1"
-                package.checksum = checksums["sha1"]
-            elif "md5" in checksums:
-                package.checksum_type = "md5"
-                package.checksum = checksums["md5"]
-
-            if package.is_populated():
-                to_return.append(package)
-        return to_return
+        try:
+            yield from parse_packages(decompressed)
+        finally:
+            decompressed.close()
 
 
 # pylint: disable-next=missing-class-docstring
@@ -473,11 +501,12 @@ class ContentSource:
         """list packages"""
 
         log.debug("ContentSource.list_packages(filters=%s, latest=%s)", filters, latest)
-        pkglist = self.repo.get_package_list()
-        self.num_packages = len(pkglist)
+        self.num_packages = 0
         if latest:
+            # only the latest version of each package is kept while parsing
             latest_pkgs = {}
-            for pkg in pkglist:
+            for pkg in self.repo.iter_packages():
+                self.num_packages += 1
                 # pylint: disable-next=consider-using-f-string
                 ident = "{}.{}".format(pkg.name, pkg.arch)
                 # pylint: disable-next=consider-iterating-dictionary
@@ -486,6 +515,9 @@ class ContentSource:
                 ) > looseversion.LooseVersion(latest_pkgs[ident].evr()):
                     latest_pkgs[ident] = pkg
             pkglist = list(latest_pkgs.values())
+        else:
+            pkglist = self.repo.get_package_list()
+            self.num_packages = len(pkglist)
         pkglist.sort(key=cmp_to_key(self._sort_packages))
 
         if not filters:
@@ -51,7 +51,6 @@ import traceback
 # pylint: disable-next=unused-import
 import types
 import urlgrabber
-import looseversion
 import json
 
 try:
@@ -72,7 +71,7 @@ from spacewalk.satellite_tools.download import get_proxies
 from spacewalk.satellite_tools.syncLib import log
 
 # pylint: disable-next=unused-import
-from spacewalk.common.rhnConfig import cfg_component
+from spacewalk.common.rhnConfig import cfg_component, cfg_snapshot
 from spacewalk.common.suseLib import get_proxy, URL as suseLibURL
 from rhn.stringutils import sstr
 from urlgrabber.grabber import URLGrabError
@@ -1183,30 +1182,30 @@ password={passwd}
         is matching the requirement. All the new solvables that are added will be again processed in order to get
         a new level of dependencies.
 
-        The exploration of dependencies is done when all the solvables are been processed and no new solvables are added
+        Every solvable is processed once and the providers of every requirement are only looked up once,
+        the exploration of dependencies is done when no new solvables are found.
 
         :returns: list
         """
         if not self.repo.is_configured:
             self.setup_repo(self.repo)
-        known_solvables = set()
-
-        new_deps = True
-        next_solvables = solvables
+        known_solvables = set(solvables)
+        next_solvables = list(known_solvables)
+        providers = {}
 
         # Collect solvables dependencies in depth
-        while new_deps:
-            new_deps = False
-            for sol in next_solvables:
-                # Do not explore dependencies from solvables that are already proceesed
-                if sol not in known_solvables:
-                    # This solvable has not been proceesed yet. We need to calculate its dependencies
-                    known_solvables.add(sol)
-                    new_deps = True
-                    # Adding solvables that provide the dependencies
-                    # pylint: disable-next=invalid-name
-                    for _req in sol.lookup_deparray(keyname=solv.SOLVABLE_REQUIRES):
-                        next_solvables.extend(self.solv_pool.whatprovides(_req))
+        while next_solvables:
+            sol = next_solvables.pop()
+            # Adding solvables that provide the dependencies
+            # pylint: disable-next=invalid-name
+            for _req in sol.lookup_deparray(keyname=solv.SOLVABLE_REQUIRES):
+                if _req.id in providers:
+                    continue
+                providers[_req.id] = self.solv_pool.whatprovides(_req)
+                for provider in providers[_req.id]:
+                    if provider not in known_solvables:
+                        known_solvables.add(provider)
+                        next_solvables.append(provider)
         return list(known_solvables)
 
     def _apply_filters(self, pkglist, filters):
@@ -1494,15 +1493,10 @@ password={passwd}
 
         if latest:
             latest_pkgs = {}
-            # pylint: disable-next=unused-variable
-            new_pkgs = []
             for pkg in pkglist:
-                # pylint: disable-next=consider-using-f-string
-                ident = "{}.{}".format(pkg.name, pkg.arch)
-                # pylint: disable-next=consider-iterating-dictionary
-                if ident not in latest_pkgs.keys() or looseversion.LooseVersion(
-                    str(pkg.evr)
-                ) > looseversion.LooseVersion(str(latest_pkgs[ident].evr)):
+                ident = (pkg.name, pkg.arch)
+                # evrcmp compares the versions like rpm does
+                if ident not in latest_pkgs or pkg.evrcmp(latest_pkgs[ident]) > 0:
                     latest_pkgs[ident] = pkg
             pkglist = list(latest_pkgs.values())
 
@@ -1654,9 +1648,9 @@ password={passwd}
         params["proxies"] = get_proxies(
             self.proxy_url, self.proxy_user, self.proxy_pass
         )
-        # pylint: disable-next=redefined-outer-name,invalid-name
-        with cfg_component("server.satellite") as CFG:
-            params["urlgrabber_logspec"] = CFG.get("urlgrabber_logspec")
+        params["urlgrabber_logspec"] = cfg_snapshot("server.satellite").get(
+            "urlgrabber_logspec"
+        )
 
     def get_file(self, path, local_base=None):
         try:
@@ -34,6 +34,9 @@ from dateutil.tz import tzutc
 import gettext
 import errno
 import multiprocessing
+import multiprocessing.connection
+import queue
+import threading
 
 from rhn.connections import idn_puny_to_unicode
 from rhn.stringutils import ustr
@@ -50,7 +53,7 @@ from spacewalk.common import rhnLog, rhnMail, suseLib
 from spacewalk.common.rhnTB import fetchTraceback
 from spacewalk.common import repo
 from spacewalk.common.fileutils import chown_chmod_path, create_path
-from spacewalk.common.rhnConfig import cfg_component
+from spacewalk.common.rhnConfig import cfg_component, cfg_snapshot
 
 # pylint: disable-next=ungrouped-imports
 from uyuni.common.rhnLib import isSUSE, utc
@@ -66,6 +69,7 @@ from spacewalk.satellite_tools.download import (
     ThreadedDownloader,
     ProgressBarLogger,
     TextLogger,
+    set_download_slots,
 )
 from spacewalk.satellite_tools.repo_plugins import CACHE_DIR
 from spacewalk.satellite_tools.repo_plugins import yum_src
@@ -75,7 +79,9 @@ from spacewalk.satellite_tools.syncLib import (
     log,
     log2,
     log2disk,
+    initEMAIL_LOG,
     dumpEMAIL_LOG,
+    appendEMAIL_LOG,
     log2background,
 )
 from spacewalk.satellite_tools.appstreams import ModuleMdImporter, ModuleMdIndexingError
@@ -93,6 +99,18 @@ relative_modules_dir = "rhn/modules"
 relative_mediaproducts_dir = "suse/media.1"
 checksum_cache_filename = "reposync/checksum_cache"
 default_import_batch_size = 20
+# Limits the package import processes running at the same time in all the
+# channels synced by sync_channels()
+max_import_workers = None
+import_slots = None
+# number of packages sent to the DB per query when classifying repo content
+classify_batch_size = 1000
+
+# package states computed by RepoSync.classify_packages
+PKG_IN_CHANNEL = "in-channel"
+PKG_UNLINKED = "unlinked"
+PKG_CHECKSUM_CONFLICT = "checksum-conflict"
+PKG_NEW = "new"
 
 errata_typemap = {
     "security": "Security Advisory",
@@ -414,9 +432,12 @@ def write_ssl_set_cache(ca_cert, client_cert, client_key):
             )
             if not os.path.exists(cert_file):
                 create_dir_tree(ssldir)
-                f = open(cert_file, "wb")
-                f.write(pem)
-                f.close()
+                # channels synced concurrently may use the same certificate,
+                # never let them read a partially written file
+                fd, tmp_file = tempfile.mkstemp(dir=ssldir)
+                with os.fdopen(fd, "wb") as f:
+                    f.write(pem)
+                os.rename(tmp_file, cert_file)
             filenames[cert] = cert_file
 
     return filenames[ca_cert], filenames[client_cert], filenames[client_key]
@@ -427,6 +448,99 @@ def clear_ssl_cache():
     shutil.rmtree(ssldir, True)
 
 
+def _sync_channel_process(sync_channel, label, urls, conn):
+    # forget the database connection of the parent process, RepoSync opens
+    # its own one
+    rhnSQL.closeDB(committing=False, closing=False)
+    # only send back what this channel logs, the parent process already has
+    # the email log written before the fork
+    if dumpEMAIL_LOG() is not None:
+        initEMAIL_LOG(reinit=1)
+    ret_code = 1
+    try:
+        ret_code = sync_channel(label, urls)
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            ret_code = e.code or 0
+    finally:
+        conn.send((ret_code, dumpEMAIL_LOG()))
+        conn.close()
+
+
+def sync_channels(
+    channels,
+    parents,
+    sync_channel,
+    parallel,
+    download_threads=None,
+    import_workers=None,
+):
+    """Sync up to parallel channels at the same time, each in its own process.
+
+    channels maps the labels of the channels to sync to their repository urls,
+    in the order to start them. A channel is only started after its parent in
+    the parents dict, when the parent is synced as well.
+    sync_channel(label, urls) syncs one channel and returns its exit code.
+    download_threads and import_workers limit the package downloads and import
+    processes running at the same time in all the channels.
+
+    Returns the exit codes of the channels in the order they completed.
+    """
+    # pylint: disable-next=global-statement
+    global import_slots, max_import_workers
+    set_download_slots(download_threads)
+    if import_workers:
+        max_import_workers = import_workers
+        import_slots = multiprocessing.BoundedSemaphore(import_workers)
+
+    pending = list(channels)
+    running = {}
+    ret_codes = {}
+    while pending or running:
+        for label in list(pending):
+            if len(running) >= parallel:
+                break
+            parent = parents.get(label)
+            if parent in channels and parent not in ret_codes:
+                continue
+            pending.remove(label)
+            conn, child_conn = multiprocessing.Pipe(False)
+            # sync_channel does not need to be picklable
+            process = multiprocessing.get_context("fork").Process(
+                target=_sync_channel_process,
+                args=(sync_channel, label, channels[label], child_conn),
+                name=label,
+            )
+            process.start()
+            child_conn.close()
+            running[conn] = (label, process)
+            # pylint: disable-next=consider-using-f-string
+            log(0, "Sync of channel %s started." % label)
+
+        for conn in multiprocessing.connection.wait(list(running)):
+            label, process = running.pop(conn)
+            try:
+                ret_code, email_log = conn.recv()
+                appendEMAIL_LOG(email_log)
+            except EOFError:
+                ret_code = None
+            conn.close()
+            process.join()
+            if ret_code is None:
+                ret_code = abs(process.exitcode) or 1
+            ret_codes[label] = ret_code
+            log(
+                0,
+                # pylint: disable-next=consider-using-f-string
+                "Sync of channel %s completed with exit code %d, %d channel(s) left."
+                % (label, ret_code, len(pending) + len(running)),
+            )
+
+    set_download_slots(None)
+    import_slots = max_import_workers = None
+    return ret_codes
+
+
 def verify_certificates_dates(certs):
     """
     One certificate must be valid. Bundles may contain expired certs.
@@ -1368,9 +1482,8 @@ class RepoSync(object):
             log(0, "    Packages passed filter rules: %5d" % num_passed)
         channel_id = int(self.channel["id"])
 
-        # pylint: disable-next=invalid-name
-        with cfg_component("server.susemanager") as CFG:
-            mount_point = CFG.MOUNT_POINT
+        mount_point = cfg_snapshot("server.susemanager").MOUNT_POINT
+        candidates = []
         for pack in packages:
             if pack.arch not in self.arches:
                 # skip packages with incompatible architecture
@@ -1389,18 +1502,10 @@ class RepoSync(object):
                 pack.arch,
             )
             self.available_packages[ident] = 1
+            candidates.append(pack)
 
-            packs = rhnPackage.get_info_for_package(
-                [pack.name, pack.version, pack.release, pack.epoch, pack.arch],
-                channel_id,
-                self.org_id,
-            )
-            db_pack = None
-            for p in packs:
-                if p["checksum"] == pack.checksum:
-                    db_pack = p
-                    break
-
+        classified = self.classify_packages(candidates, channel_id)
+        for pack, (status, db_pack) in zip(candidates, classified):
             to_download = True
             to_link = True
             # Package exists in DB
@@ -1415,7 +1520,7 @@ class RepoSync(object):
                 if self.metadata_only or self.match_package_checksum(pack, db_pack):
                     # package is already on disk or not required
                     to_download = False
-                    if db_pack["channel_id"] == channel_id:
+                    if status == PKG_IN_CHANNEL:
                         # package is already in the channel
                         to_link = False
 
@@ -1425,7 +1530,7 @@ class RepoSync(object):
 
                     self.all_packages.add((pack.checksum_type, pack.checksum))
 
-                elif db_pack["channel_id"] == channel_id:
+                elif status == PKG_IN_CHANNEL:
                     # different package with SAME NVREA
                     # disassociate from channel if it doesn't match package which will be downloaded
                     to_disassociate[(db_pack["checksum_type"], db_pack["checksum"])] = (
@@ -1454,10 +1559,20 @@ class RepoSync(object):
             # pylint: disable-next=consider-using-f-string
             log(0, "    Packages to sync:             %5d" % num_to_process)
 
+        # queue the downloads in "twisted" order, so that the import batches,
+        # which are filled in download completion order, get packages from all
+        # over the list and parallel imports do not compete for the same rows
+        download_order = [
+            index
+            for twisted_batch in self.twisted_batch_indexes(
+                len(to_process), self.import_batch_size
+            )
+            for index in twisted_batch
+        ]
         downloader = ThreadedDownloader()
-        to_download_count = 0
-        for what in to_process:
-            pack, to_download, to_link = what
+        download_index = {}
+        for index in download_order:
+            pack, to_download, to_link = to_process[index]
             if to_download:
                 target_file = os.path.join(
                     plug.repo.pkgdir,
@@ -1476,53 +1591,102 @@ class RepoSync(object):
                     checksum_value=checksum,
                 )
                 downloader.add(params)
-                to_download_count += 1
+                download_index[target_file] = index
+        to_download_count = len(download_index)
         if num_to_process != 0:
             # pylint: disable-next=consider-using-f-string
             log(0, "    New packages to download:     %5d" % to_download_count)
-            log2(0, 0, "  Downloading packages:")
+            log2(0, 0, "  Downloading and importing packages:")
         logger = TextLogger(None, to_download_count)
         downloader.set_log_obj(logger)
-        downloader.run()
-
-        log(0, "Filtering packages that failed to download")
-        to_process = [
-            i
-            for i in to_process
-            if os.path.basename(i[0].path) not in downloader.failed_pkgs
-        ]
-
-        log2background(0, "Importing packages started.")
-        log(0, "")
-        log(0, "  Importing packages to DB:")
-
-        twisted_batch_indexes = self.twisted_batch_indexes(
-            len(to_process), self.import_batch_size
+        downloaded = queue.Queue()
+        downloader.set_done_callback(
+            lambda success, params: downloaded.put((success, params["target_file"]))
         )
-        to_process_batches = [
-            [to_process[twisted_index] for twisted_index in twisted_batch]
-            for twisted_batch in twisted_batch_indexes
-        ]
+        # pylint: disable-next=invalid-name
+        with cfg_component("server.satellite") as CFG:
+            downloader.set_staging_limit(
+                int(CFG.REPOSYNC_STAGING_MAX_SIZE or 0) * 1024 * 1024
+            )
 
+        log2background(0, "Importing packages started.")
+        # Downloaded packages are imported while the remaining ones are still
+        # being downloaded: every import_batch_size completed downloads are
+        # handed over to the pool of import processes.
         affected_channels = []
-        with multiprocessing.Pool(
-            processes=min(os.cpu_count() * 2, 32), maxtasksperchild=1
-        ) as pool:
-            results = [
-                pool.apply_async(
-                    self.import_package_batch,
-                    args=[
-                        to_process_batch,
-                        to_disassociate,
-                        is_non_local_repo,
-                        i,
-                        len(to_process_batches),
-                    ],
+        failed_downloads = set()
+        batches = []
+        results = []
+        progress = {"imported": 0, "batches": 0}
+        progress_lock = threading.Lock()
+
+        def batch_done(batch_target_files):
+            downloader.release_staged(batch_target_files)
+            with progress_lock:
+                progress["imported"] += len(batch_target_files)
+                progress["batches"] += 1
+                log(
+                    0,
+                    # pylint: disable-next=consider-using-f-string
+                    "    Import progress: %d/%d packages in %d batches, %d downloads failed"
+                    % (
+                        progress["imported"],
+                        to_download_count,
+                        progress["batches"],
+                        len(failed_downloads),
+                    ),
                 )
-                for i, to_process_batch in enumerate(to_process_batches)
-            ]
 
-            for i, result in enumerate(results):
+        pool_size = min(os.cpu_count() * 2, 32, max_import_workers or 32)
+        with multiprocessing.Pool(processes=pool_size, maxtasksperchild=1) as pool:
+
+            def submit_batch(batch_indexes):
+                batch_target_files = [to_process[i][0].path for i in batch_indexes]
+                batches.append(batch_indexes)
+                results.append(
+                    pool.apply_async(
+                        self.import_package_batch,
+                        args=[
+                            [to_process[i] for i in batch_indexes],
+                            to_disassociate,
+                            is_non_local_repo,
+                            len(batches) - 1,
+                        ],
+                        callback=lambda _result: batch_done(batch_target_files),
+                        error_callback=lambda _exc: batch_done(batch_target_files),
+                    )
+                )
+
+            pending = []
+            downloader.start()
+            try:
+                while True:
+                    try:
+                        success, target_file = downloaded.get(timeout=1)
+                    except queue.Empty:
+                        if not downloader.is_alive() and downloaded.empty():
+                            break
+                        # do not let a partial batch wait for downloads which
+                        # are paused until staged packages get imported
+                        if pending and downloader.staging_full():
+                            submit_batch(pending)
+                            pending = []
+                        continue
+                    if success:
+                        pending.append(download_index[target_file])
+                    else:
+                        failed_downloads.add(os.path.basename(target_file))
+                    if len(pending) >= self.import_batch_size:
+                        submit_batch(pending)
+                        pending = []
+            except KeyboardInterrupt as e:
+                downloader.fail_download(e)
+                raise
+            if pending:
+                submit_batch(pending)
+            downloader.join()
+
+            for batch_indexes, result in zip(batches, results):
                 (
                     affected_channels_batch,
                     failed_packages_batch,
@@ -1533,7 +1697,12 @@ class RepoSync(object):
                 failed_packages += failed_packages_batch
                 self.all_packages.update(all_packages)
                 for j, processed in enumerate(processed_batch):
-                    to_process[twisted_batch_indexes[i][j]] = processed
+                    to_process[batch_indexes[j]] = processed
+
+        log(0, "Filtering packages that failed to download")
+        to_process = [
+            i for i in to_process if os.path.basename(i[0].path) not in failed_downloads
+        ]
 
         if affected_channels:
             errataCache.schedule_errata_cache_update(affected_channels)
@@ -1575,6 +1744,57 @@ class RepoSync(object):
             self.regenerate_bootstrap_repo = True
         return failed_packages
 
+    def classify_packages(self, packages, channel_id):
+        """Classify repository packages against the DB content in bulk
+
+        Returns a list of (status, db_pack) tuples, one per package, where
+        status is one of PKG_IN_CHANNEL (same checksum, already linked to the
+        channel), PKG_UNLINKED (same checksum, present in the DB but not in the
+        channel), PKG_CHECKSUM_CONFLICT (same NEVRA but different checksum in
+        the DB) or PKG_NEW. db_pack is the matching DB row or None.
+        """
+        result = []
+        counts = dict.fromkeys(
+            (PKG_IN_CHANNEL, PKG_UNLINKED, PKG_CHECKSUM_CONFLICT, PKG_NEW), 0
+        )
+        for batch in self.chunks(packages, classify_batch_size):
+            infos = rhnPackage.get_info_for_packages(
+                [
+                    [pack.name, pack.version, pack.release, pack.epoch, pack.arch]
+                    for pack in batch
+                ],
+                channel_id,
+                self.org_id,
+            )
+            for pack, packs in zip(batch, infos):
+                db_pack = None
+                for p in packs:
+                    if p["checksum"] == pack.checksum:
+                        db_pack = p
+                        break
+
+                if db_pack is None:
+                    status = PKG_CHECKSUM_CONFLICT if packs else PKG_NEW
+                elif db_pack["channel_id"] == channel_id:
+                    status = PKG_IN_CHANNEL
+                else:
+                    status = PKG_UNLINKED
+                counts[status] += 1
+                result.append((status, db_pack))
+
+        log2disk(
+            0,
+            # pylint: disable-next=consider-using-f-string
+            "Package classification: %d in channel, %d unlinked, %d checksum conflicts, %d new"
+            % (
+                counts[PKG_IN_CHANNEL],
+                counts[PKG_UNLINKED],
+                counts[PKG_CHECKSUM_CONFLICT],
+                counts[PKG_NEW],
+            ),
+        )
+        return result
+
     def twisted_batch_indexes(self, total_size, batch_size):
         """Assume a list of total_size elements, and consider the following two possible divisions of its elements: per "batch" or per "chunk".
         Batches are contiguous sub-lists of the original list with batch_size elements each (and there's batch_count=total_size/batch_size of them).
@@ -1631,7 +1851,19 @@ class RepoSync(object):
         return batch_count * element_index + batch_index
 
     def import_package_batch(
-        self, to_process, to_disassociate, is_non_local_repo, batch_index, batch_count
+        self, to_process, to_disassociate, is_non_local_repo, batch_index
+    ):
+        if import_slots is None:
+            return self._import_package_batch(
+                to_process, to_disassociate, is_non_local_repo, batch_index
+            )
+        with import_slots:
+            return self._import_package_batch(
+                to_process, to_disassociate, is_non_local_repo, batch_index
+            )
+
+    def _import_package_batch(
+        self, to_process, to_disassociate, is_non_local_repo, batch_index
     ):
         # Prepare SQL statements
         rhnSQL.closeDB(committing=False, closing=False)
@@ -1644,9 +1876,7 @@ class RepoSync(object):
         mpm_src_batch = importLib.Collection()
         affected_channels = []
         upload_caller = "server.app.uploadPackage"
-        # pylint: disable-next=invalid-name
-        with cfg_component("server.susemanager") as CFG:
-            mount_point = CFG.MOUNT_POINT
+        mount_point = cfg_snapshot("server.susemanager").MOUNT_POINT
 
         to_download_count = sum(p[1] for p in to_process)
         import_count = 0
@@ -1811,9 +2041,7 @@ class RepoSync(object):
         log(
             0,
             # pylint: disable-next=consider-using-f-string
-            "  Package batch #{} of {} completed...".format(
-                batch_index + 1, batch_count
-            ),
+            "  Package batch #{} completed...".format(batch_index + 1),
         )
         return affected_channels, failed_packages, all_packages, to_process
 
@@ -1851,9 +2079,7 @@ class RepoSync(object):
 
         channel_id = int(self.channel["id"])
 
-        # pylint: disable-next=invalid-name
-        with cfg_component("server.susemanager") as CFG:
-            mount_point = CFG.MOUNT_POINT
+        mount_point = cfg_snapshot("server.susemanager").MOUNT_POINT
 
         for pack in packages:
             packs = rhnPackage.get_info_for_package(
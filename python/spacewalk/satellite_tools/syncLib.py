@@ -32,7 +32,7 @@ from uyuni.common.usix import raise_with_tb
 from uyuni.common import rhnLib
 from spacewalk.common.rhnLog import log_time, log_clean
 from spacewalk.common.fileutils import chown_chmod_path, create_path
-from spacewalk.common.rhnConfig import cfg_component
+from spacewalk.common.rhnConfig import cfg_snapshot
 
 from . import messages
 
@@ -51,6 +51,12 @@ def dumpEMAIL_LOG():
     return None
 
 
+def appendEMAIL_LOG(text):
+    """Append the email log of another process"""
+    if EMAIL_LOG is not None and text:
+        EMAIL_LOG.write(text)
+
+
 class RhnSyncException(Exception):
     """General exception handler for all sync activity."""
 
@@ -132,11 +138,10 @@ def log2stream(level, msg, cleanYN, notimeYN, stream):
     """
     if not isinstance(msg, type([])):
         msg = [msg]
-    with cfg_component(component=None) as CFG:
-        if CFG.DEBUG >= level:
-            for m in msg:
-                stream.write(_prepLogMsg(m, cleanYN, notimeYN, shortYN=1) + "\n")
-            stream.flush()
+    if cfg_snapshot(None).DEBUG >= level:
+        for m in msg:
+            stream.write(_prepLogMsg(m, cleanYN, notimeYN, shortYN=1) + "\n")
+        stream.flush()
 
 
 def log2email(level, msg, cleanYN=0, notimeYN=0):
@@ -202,9 +207,10 @@ class FileManip:
         self.relative_path = relative_path
         self.timestamp = rhnLib.timestamp(timestamp)
         self.file_size = file_size
-        with cfg_component(component=None) as CFG:
-            self.full_path = os.path.join(CFG.MOUNT_POINT, self.relative_path)
-            self.buffer_size = CFG.BUFFER_SIZE
+        # pylint: disable-next=invalid-name
+        CFG = cfg_snapshot(None)
+        self.full_path = os.path.join(CFG.MOUNT_POINT, self.relative_path)
+        self.buffer_size = CFG.BUFFER_SIZE
 
     def write_file(self, stream_in):
         """Writes the contents of stream_in to the filesystem
@@ -239,13 +245,14 @@ class FileManip:
         fout = open(self.full_path, "wb")
         # setting file permissions; NOTE: rhnpush uses apache to write to disk,
         # hence the 6 setting.
-        with cfg_component(component=None) as CFG:
-            chown_chmod_path(
-                self.full_path,
-                user=CFG.httpd_user,
-                group=CFG.httpd_group,
-                chmod=int("0644", 8),
-            )
+        # pylint: disable-next=invalid-name
+        CFG = cfg_snapshot(None)
+        chown_chmod_path(
+            self.full_path,
+            user=CFG.httpd_user,
+            group=CFG.httpd_group,
+            chmod=int("0644", 8),
+        )
         size = 0
         try:
             while 1:
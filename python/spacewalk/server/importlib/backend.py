@@ -26,7 +26,7 @@ import sys
 
 from uyuni.common.usix import raise_with_tb
 from uyuni.common import rhn_rpm
-from spacewalk.common.rhnConfig import cfg_component
+from spacewalk.common.rhnConfig import cfg_component, cfg_snapshot
 from spacewalk.common.rhnException import rhnFault
 from spacewalk.common.rhnLog import log_debug
 from spacewalk.satellite_tools import syncLib
@@ -170,9 +170,8 @@ class Backend:
 
     # pylint: disable-next=invalid-name
     def processChangeLog(self, changelogHash):
-        with cfg_component(None) as cfg:
-            if cfg.get("package_import_skip_changelog"):
-                return None
+        if cfg_snapshot(None).get("package_import_skip_changelog"):
+            return None
 
         if not changelogHash:
             return
@@ -784,18 +783,58 @@ class Backend:
 
     # pylint: disable-next=invalid-name
     def lookupEVRs(self, evrHash, ptype):
-        sql = "select LOOKUP_EVR(:epoch, :version, :release, :ptype) id from dual"
-        h = self.dbmodule.prepare(sql)
-        for evr in sorted(evrHash.keys(), key=lambda k: (str(k[0] or 0), k[1], k[2])):
-            epoch, version, release = evr
+        if not evrHash:
+            return
+
+        sql = """
+            WITH wanted (ordering, epoch, version, release, type) AS (
+              VALUES %s
+            ),
+            missing AS (
+              SELECT nextval('rhn_pkg_evr_seq') AS id, wanted.*
+                FROM wanted
+                LEFT JOIN rhnPackageEVR
+                  ON rhnPackageEVR.epoch IS NOT DISTINCT FROM wanted.epoch
+                    AND rhnPackageEVR.version = wanted.version
+                    AND rhnPackageEVR.release = wanted.release
+                    AND rhnPackageEVR.type = wanted.type
+                WHERE rhnPackageEVR.id IS NULL
+            )
+            INSERT INTO rhnPackageEVR(id, epoch, version, release, evr)
+              SELECT id, epoch, version, release, evr_t(epoch, version, release, type)
+                FROM missing
+                ORDER BY ordering
+              ON CONFLICT DO NOTHING
+        """
+        sorted_evrs = sorted(evrHash.keys(), key=lambda k: (str(k[0] or 0), k[1], k[2]))
+        values = []
+        for i, (epoch, version, release) in enumerate(sorted_evrs):
             if epoch == "" or epoch is None:
                 epoch = None
             else:
                 epoch = str(epoch)
-            h.execute(epoch=epoch, version=version, release=release, ptype=ptype)
-            row = h.fetchone_dict()
-            if row:
-                evrHash[evr] = row["id"]
+            values.append((i, epoch, version, release, ptype))
+        template = "(%s, %s::varchar, %s::varchar, %s::varchar, %s::varchar)"
+        h = self.dbmodule.prepare(sql)
+        h.execute_values(sql, values, template=template, fetch=False)
+
+        sql = """
+            WITH wanted (ordering, epoch, version, release, type) AS (
+              VALUES %s
+            )
+            SELECT wanted.ordering, rhnPackageEVR.id
+              FROM wanted
+              JOIN rhnPackageEVR
+                ON rhnPackageEVR.epoch IS NOT DISTINCT FROM wanted.epoch
+                  AND rhnPackageEVR.version = wanted.version
+                  AND rhnPackageEVR.release = wanted.release
+                  AND rhnPackageEVR.type = wanted.type
+        """
+        h = self.dbmodule.prepare(sql)
+        evrs = h.execute_values(sql, values, template=template)
+
+        for evr in evrs:
+            evrHash[sorted_evrs[evr[0]]] = evr[1]
 
     # pylint: disable-next=invalid-name
     def lookupChecksums(self, checksumHash):
@@ -856,43 +895,97 @@ class Backend:
     def lookupChecksumTypes(self, checksumTypeHash):
         if not checksumTypeHash:
             return
-        sql = "select id from rhnChecksumType where label = :label"
+
+        sql = """
+            WITH wanted (label) AS (
+              VALUES %s
+            )
+            SELECT rhnChecksumType.label, rhnChecksumType.id
+              FROM wanted
+              JOIN rhnChecksumType ON rhnChecksumType.label = wanted.label
+        """
+        values = [(l,) for l in checksumTypeHash.keys()]
         h = self.dbmodule.prepare(sql)
-        for l in list(checksumTypeHash.keys()):
-            h.execute(label=l)
-            row = h.fetchone_dict()
-            if row:
-                checksumTypeHash[l] = row["id"]
+        checksum_types = h.execute_values(sql, values)
+
+        for checksum_type in checksum_types:
+            checksumTypeHash[checksum_type[0]] = checksum_type[1]
 
     # pylint: disable-next=invalid-name
     def lookupPackageNEVRAs(self, nevraHash):
-        sql = "select LOOKUP_PACKAGE_NEVRA(:name, :evr, :arch) id from dual"
+        if not nevraHash:
+            return
+
+        sql = """
+            WITH wanted (ordering, name_id, evr_id, package_arch_id) AS (
+              VALUES %s
+            ),
+            missing AS (
+              SELECT nextval('rhn_pkgnevra_id_seq') AS id, wanted.*
+                FROM wanted
+                LEFT JOIN rhnPackageNEVRA
+                  ON rhnPackageNEVRA.name_id = wanted.name_id
+                    AND rhnPackageNEVRA.evr_id = wanted.evr_id
+                    AND rhnPackageNEVRA.package_arch_id IS NOT DISTINCT FROM wanted.package_arch_id
+                WHERE rhnPackageNEVRA.id IS NULL
+            )
+            INSERT INTO rhnPackageNEVRA(id, name_id, evr_id, package_arch_id)
+              SELECT id, name_id, evr_id, package_arch_id
+                FROM missing
+                ORDER BY ordering
+              ON CONFLICT DO NOTHING
+        """
+        nevras = list(nevraHash.keys())
+        values = [
+            (i, name, evr, None if arch == "" else arch)
+            for i, (name, evr, arch) in enumerate(nevras)
+        ]
+        template = "(%s, %s::numeric, %s::numeric, %s::numeric)"
         h = self.dbmodule.prepare(sql)
-        for nevra in nevraHash:
-            name, evr, arch = nevra
-            if arch is None:
-                arch = ""
-            h.execute(name=name, evr=evr, arch=arch)
-            row = h.fetchone_dict()
-            if row:
-                nevraHash[nevra] = row["id"]
+        h.execute_values(sql, values, template=template, fetch=False)
+
+        sql = """
+            WITH wanted (ordering, name_id, evr_id, package_arch_id) AS (
+              VALUES %s
+            )
+            SELECT wanted.ordering, rhnPackageNEVRA.id
+              FROM wanted
+              JOIN rhnPackageNEVRA
+                ON rhnPackageNEVRA.name_id = wanted.name_id
+                  AND rhnPackageNEVRA.evr_id = wanted.evr_id
+                  AND rhnPackageNEVRA.package_arch_id IS NOT DISTINCT FROM wanted.package_arch_id
+        """
+        h = self.dbmodule.prepare(sql)
+        rows = h.execute_values(sql, values, template=template)
+
+        for row in rows:
+            nevraHash[nevras[row[0]]] = row[1]
 
     # pylint: disable-next=invalid-name
     def lookupPackagesByNEVRA(self, nevraHash):
+        if not nevraHash:
+            return
+
         sql = """
-              select id from rhnPackage
-              where name_id = :name and
-                    evr_id = :evr and
-                    package_arch_id = :arch
-              """
+            WITH wanted (ordering, name_id, evr_id, package_arch_id) AS (
+              VALUES %s
+            )
+            SELECT DISTINCT ON (wanted.ordering) wanted.ordering, rhnPackage.id
+              FROM wanted
+              JOIN rhnPackage
+                ON rhnPackage.name_id = wanted.name_id
+                  AND rhnPackage.evr_id = wanted.evr_id
+                  AND rhnPackage.package_arch_id = wanted.package_arch_id
+             ORDER BY wanted.ordering, rhnPackage.id
+        """
+        nevras = list(nevraHash.keys())
+        values = [(i, name, evr, arch) for i, (name, evr, arch) in enumerate(nevras)]
+        template = "(%s, %s::numeric, %s::numeric, %s::numeric)"
         h = self.dbmodule.prepare(sql)
+        rows = h.execute_values(sql, values, template=template)
 
-        for nevra in nevraHash:
-            name, evr, arch = nevra
-            h.execute(name=name, evr=evr, arch=arch)
-            row = h.fetchone_dict()
-            if row:
-                nevraHash[nevra] = row["id"]
+        for row in rows:
+            nevraHash[nevras[row[0]]] = row[1]
 
     # pylint: disable-next=invalid-name
     def lookupPackageKeyId(self, header):
@@ -1120,9 +1213,8 @@ class Backend:
             "susePackageEula": "package_id",
             "rhnPackageExtraTag": "package_id",
         }
-        with cfg_component(None) as cfg:
-            if cfg.get("package_import_skip_changelog"):
-                del childTables["rhnPackageChangeLogRec"]
+        if cfg_snapshot(None).get("package_import_skip_changelog"):
+            del childTables["rhnPackageChangeLogRec"]
 
         for package in packages:
             if not isinstance(package, Package):
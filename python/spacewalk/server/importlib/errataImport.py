@@ -267,6 +267,7 @@ class ErrataImport(GenericPackageImport):
     def _fix_erratum_packages_lookup(self, erratum):
         # To make the packages unique
         packageHash = {}
+        self._lookupPackageNEVRAs(erratum["packages"])
         for package in erratum["packages"]:
             if package.ignored:
                 # Skip it
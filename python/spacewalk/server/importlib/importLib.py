@@ -865,6 +865,7 @@ class GenericPackageImport(Import):
         self.package_arches = {}
         self.channels = {}
         self.channel_package_arch_compat = {}
+        self.nevras = {}
 
     def _processPackage(self, package):
         Import._processPackage(self, package)
@@ -886,6 +887,21 @@ class GenericPackageImport(Import):
             if not checksumTuple in self.checksums:
                 self.checksums[checksumTuple] = None
 
+    def _lookupPackageNEVRAs(self, packages):
+        # Resolve the NEVRA ids of all the packages with a single backend call,
+        # so _postprocessPackageNEVRA does not need one lookup per package
+        nevras = {}
+        for package in packages:
+            arch = self.package_arches.get(package.arch)
+            if package.ignored or not arch:
+                continue
+            nevra = (self.names[package.name], self.evrs[package.evr], arch)
+            if nevra not in self.nevras:
+                nevras[nevra] = None
+        if nevras:
+            self.backend.lookupPackageNEVRAs(nevras)
+            self.nevras.update(nevras)
+
     def _postprocessPackageNEVRA(self, package):
         arch = self.package_arches[package.arch]
         if not arch:
@@ -899,12 +915,11 @@ class GenericPackageImport(Import):
         #        package['evr_id'] = self.evrs[package.evr]
 
         nevra = (self.names[package.name], self.evrs[package.evr], arch)
-        nevra_dict = {nevra: None}
-
-        self.backend.lookupPackageNEVRAs(nevra_dict)
+        if self.nevras.get(nevra) is None:
+            self._lookupPackageNEVRAs([package])
 
         package["name_id"], package["evr_id"], package["package_arch_id"] = nevra
-        package["nevra_id"] = nevra_dict[nevra]
+        package["nevra_id"] = self.nevras.get(nevra)
         package["checksum_id"] = self.checksums[
             (package["checksum_type"], package["checksum"])
         ]
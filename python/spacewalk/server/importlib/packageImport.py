@@ -93,6 +93,7 @@ class ChannelPackageSubscription(GenericPackageImport):
         self.backend.lookupChecksums(self.checksums)
 
         # Fix the package information up, and uniquify the packages too
+        self._lookupPackageNEVRAs(self.batch)
         uniqdict = {}
         for package in self.batch:
             if package.ignored:
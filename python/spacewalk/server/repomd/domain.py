@@ -66,6 +66,7 @@ class Package:
         self.copyright = None
         self.filename = None
         self.source_rpm = None
+        self.last_modified = None
 
         self.files = []
 
@@ -77,6 +78,8 @@ class Package:
         self.enhances = []
         self.suggests = []
         self.recommends = []
+        self.breaks = []
+        self.predepends = []
 
         self.changelog = []
 
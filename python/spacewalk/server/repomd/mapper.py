@@ -33,6 +33,9 @@ from . import domain
 
 CACHE_PREFIX = "/var/cache/rhn/"
 
+# Number of packages loaded at once by the bulk package mappers
+BULK_PAGE_SIZE = 1000
+
 
 class ChannelMapper:
     """Data Mapper for Channels to the RHN db."""
@@ -172,6 +175,11 @@ class ChannelMapper:
         return channel
 
     def _package_generator(self, package_ids):
+        if hasattr(self.pkg_mapper, "get_packages"):
+            for pkg in self.pkg_mapper.get_packages([row[0] for row in package_ids]):
+                yield pkg
+            return
+
         for package_id in package_ids:
             pkg = self.pkg_mapper.get_package(package_id[0])
             yield pkg
@@ -190,6 +198,7 @@ class CachedPackageMapper:
 
     def __init__(self, mapper):
         cache = rhnCache.Cache()
+        cache = rhnCache.EvictingCache(cache, "repomd-packages", get_cache_max_size())
 
         # For more speed, we won't compress.
         # cache = rhnCache.CompressedCache(cache)
@@ -213,14 +222,69 @@ class CachedPackageMapper:
         last_modified = last_modified.replace("-", "")
 
         cache_key = "repomd-packages/" + package_id
+        package = None
         if self.cache.has_key(cache_key, last_modified):
+            # None if the entry got evicted in the meantime
             package = self.cache.get(cache_key)
-        else:
+        if package is None:
             package = self.mapper.get_package(package_id)
             self.cache.set(cache_key, package, last_modified)
 
+        package.last_modified = last_modified
         return package
 
+    def get_packages(self, package_ids):
+        """
+        Yield the packages with ids package_ids, in that order.
+
+        Packages whose cache entry is not new enough are loaded in bulk
+        from the provided mapper, one page of BULK_PAGE_SIZE ids at a time.
+        """
+        package_ids = list(package_ids)
+        for i in range(0, len(package_ids), BULK_PAGE_SIZE):
+            page = package_ids[i : i + BULK_PAGE_SIZE]
+            last_modified = self.mapper.last_modified_many(page)
+
+            timestamps = {}
+            packages = {}
+            missing = []
+            for package_id in page:
+                if package_id not in last_modified:
+                    # removed in the meantime
+                    continue
+                cache_key = "repomd-packages/" + str(package_id)
+                timestamp = self._cache_timestamp(last_modified[package_id])
+                timestamps[package_id] = timestamp
+                package = None
+                if self.cache.has_key(cache_key, timestamp):
+                    package = self.cache.get(cache_key)
+                if package is None:
+                    missing.append(package_id)
+                else:
+                    packages[package_id] = package
+
+            for package in self.mapper.get_packages(missing):
+                self.cache.set(
+                    "repomd-packages/" + str(package.id),
+                    package,
+                    timestamps[package.id],
+                )
+                packages[package.id] = package
+
+            for package_id in page:
+                if package_id in packages:
+                    package = packages[package_id]
+                    package.last_modified = timestamps[package_id]
+                    yield package
+
+    @staticmethod
+    def _cache_timestamp(last_modified):
+        last_modified = str(last_modified)
+        last_modified = last_modified.replace(" ", "")
+        last_modified = last_modified.replace(":", "")
+        last_modified = last_modified.replace("-", "")
+        return last_modified
+
 
 class SqlPackageMapper:
     """Data Mapper for Packages to the RHN db."""
@@ -460,7 +524,10 @@ class SqlPackageMapper:
         """Load the packages basic details (summary, description, etc)."""
         self.details_sql.execute(package_id=package.id)
         pkg = self.details_sql.fetchone()
+        self._set_package_details(package, pkg)
 
+    def _set_package_details(self, package, pkg):
+        """Set the packages basic details from a details_sql row."""
         package.name = pkg[0]
         package.version = pkg[1]
         package.release = pkg[2]
@@ -493,55 +560,59 @@ class SqlPackageMapper:
         deps = self.prco_sql.fetchall() or []
 
         for item in deps:
-            version = item[3] or ""
-            relation = ""
-            release = None
-            epoch = 0
-            if version:
-                sense = item[1] or 0
-                relation = SqlPackageMapper.__get_relation(sense)
-
-                vertup = version.split("-")
-                if len(vertup) > 1:
-                    version = vertup[0]
-                    release = vertup[1]
-
-                vertup = version.split(":")
-                if len(vertup) > 1:
-                    epoch = vertup[0]
-                    version = vertup[1]
-
-            dep = {
-                "name": string_to_unicode(item[2]),
-                "flag": relation,
-                "version": version,
-                "release": release,
-                "epoch": epoch,
-            }
-
-            if item[0] == "provides":
-                package.provides.append(dep)
-            elif item[0] == "requires":
-                package.requires.append(dep)
-            elif item[0] == "conflicts":
-                package.conflicts.append(dep)
-            elif item[0] == "obsoletes":
-                package.obsoletes.append(dep)
-            elif item[0] == "recommends":
-                package.recommends.append(dep)
-            elif item[0] == "supplements":
-                package.supplements.append(dep)
-            elif item[0] == "enhances":
-                package.enhances.append(dep)
-            elif item[0] == "suggests":
-                package.suggests.append(dep)
-            elif item[0] == "breaks":
-                package.breaks.append(dep)
-            elif item[0] == "predepends":
-                package.predepends.append(dep)
-            else:
-                # pylint: disable-next=consider-using-f-string
-                assert False, "Unknown PRCO type: %s" % item[0]
+            self._add_package_dep(package, item)
+
+    def _add_package_dep(self, package, item):
+        """Add a (type, sense, name, version) prco_sql row to the package."""
+        version = item[3] or ""
+        relation = ""
+        release = None
+        epoch = 0
+        if version:
+            sense = item[1] or 0
+            relation = SqlPackageMapper.__get_relation(sense)
+
+            vertup = version.split("-")
+            if len(vertup) > 1:
+                version = vertup[0]
+                release = vertup[1]
+
+            vertup = version.split(":")
+            if len(vertup) > 1:
+                epoch = vertup[0]
+                version = vertup[1]
+
+        dep = {
+            "name": string_to_unicode(item[2]),
+            "flag": relation,
+            "version": version,
+            "release": release,
+            "epoch": epoch,
+        }
+
+        if item[0] == "provides":
+            package.provides.append(dep)
+        elif item[0] == "requires":
+            package.requires.append(dep)
+        elif item[0] == "conflicts":
+            package.conflicts.append(dep)
+        elif item[0] == "obsoletes":
+            package.obsoletes.append(dep)
+        elif item[0] == "recommends":
+            package.recommends.append(dep)
+        elif item[0] == "supplements":
+            package.supplements.append(dep)
+        elif item[0] == "enhances":
+            package.enhances.append(dep)
+        elif item[0] == "suggests":
+            package.suggests.append(dep)
+        elif item[0] == "breaks":
+            package.breaks.append(dep)
+        elif item[0] == "predepends":
+            package.predepends.append(dep)
+        else:
+            # pylint: disable-next=consider-using-f-string
+            assert False, "Unknown PRCO type: %s" % item[0]
 
     #    @staticmethod
     def __get_relation(sense):
@@ -584,14 +655,197 @@ class SqlPackageMapper:
         log_data = self.other_sql.fetchall() or []
 
         for data in log_data:
-            date = oratimestamp_to_sinceepoch(data[2])
+            self._add_package_changelog(package, data)
+
+    def _add_package_changelog(self, package, data):
+        """Add a (name, text, time) other_sql row to the package."""
+        date = oratimestamp_to_sinceepoch(data[2])
+
+        chglog = {
+            "author": string_to_unicode(data[0]),
+            "date": date,
+            "text": string_to_unicode(data[1]),
+        }
+        package.changelog.append(chglog)
+
+
+class SqlBulkPackageMapper(SqlPackageMapper):
+    """
+    Data Mapper for Packages to the RHN db, loading many packages at once.
+
+    get_packages() loads the packages in pages of BULK_PAGE_SIZE ids, running
+    one query per table and page instead of several queries per package.
+    """
+
+    PRCO_TABLES = (
+        ("provides", "rhnPackageProvides"),
+        ("requires", "rhnPackageRequires"),
+        ("recommends", "rhnPackageRecommends"),
+        ("supplements", "rhnPackageSupplements"),
+        ("enhances", "rhnPackageEnhances"),
+        ("suggests", "rhnPackageSuggests"),
+        ("conflicts", "rhnPackageConflicts"),
+        ("obsoletes", "rhnPackageObsoletes"),
+        ("breaks", "rhnPackageBreaks"),
+        ("predepends", "rhnPackagePredepends"),
+    )
+
+    bulk_last_modified_query = """
+        with wanted (package_id) as (
+            values %s
+        )
+        select
+            wanted.package_id,
+            TO_CHAR(p.last_modified at time zone 'UTC', 'YYYYMMDDHH24MISS') as last_modified
+        from
+            wanted
+            join rhnPackage p on p.id = wanted.package_id
+    """
+
+    bulk_details_query = """
+        with wanted (package_id) as (
+            values %s
+        )
+        select
+            wanted.package_id,
+            pn.name,
+            pevr.version,
+            pevr.release,
+            pevr.epoch,
+            pa.label arch,
+            c.checksum checksum,
+            p.summary,
+            p.description,
+            p.vendor,
+            p.build_time,
+            p.package_size,
+            p.payload_size,
+            p.installed_size,
+            p.header_start,
+            p.header_end,
+            pg.name package_group,
+            p.build_host,
+            p.copyright,
+            p.path,
+            sr.name source_rpm,
+            p.last_modified,
+            c.checksum_type
+        from
+            wanted
+            join rhnPackage p on p.id = wanted.package_id
+            join rhnPackageName pn on p.name_id = pn.id
+            join rhnPackageEVR pevr on p.evr_id = pevr.id
+            join rhnPackageArch pa on p.package_arch_id = pa.id
+            join rhnPackageGroup pg on p.package_group = pg.id
+            join rhnSourceRPM sr on p.source_rpm_id = sr.id
+            join rhnChecksumView c on p.checksum_id = c.id
+    """
+
+    bulk_filelist_query = """
+        with wanted (package_id) as (
+            values %s
+        )
+        select
+            wanted.package_id,
+            pc.name
+        from
+            wanted
+            join rhnPackageFile pf on pf.package_id = wanted.package_id
+            join rhnPackageCapability pc on pf.capability_id = pc.id
+    """
+
+    bulk_other_query = """
+        with wanted (package_id) as (
+            values %s
+        )
+        select
+            wanted.package_id,
+            cl.name,
+            cl.text,
+            cl.time
+        from
+            wanted
+            join rhnPackageChangelog cl on cl.package_id = wanted.package_id
+    """
+
+    def __init__(self):
+        SqlPackageMapper.__init__(self)
+        # pylint: disable-next=consider-using-f-string
+        self.bulk_prco_query = """
+        with wanted (package_id) as (
+            values %%s
+        )
+        %s
+        """ % "\n        union all\n".join(
+            # pylint: disable-next=consider-using-f-string
+            """
+        select
+           wanted.package_id,
+           '%s',
+           dep.sense,
+           pc.name,
+           pc.version
+        from
+           wanted
+           join %s dep on dep.package_id = wanted.package_id
+           join rhnPackageCapability pc on dep.capability_id = pc.id"""
+            % (prco_type, table)
+            for prco_type, table in self.PRCO_TABLES
+        )
 
-            chglog = {
-                "author": string_to_unicode(data[0]),
-                "date": date,
-                "text": string_to_unicode(data[1]),
-            }
-            package.changelog.append(chglog)
+    @staticmethod
+    def _pages(package_ids, page_size):
+        package_ids = list(package_ids)
+        for i in range(0, len(package_ids), page_size):
+            yield package_ids[i : i + page_size]
+
+    @staticmethod
+    def _bulk_fetch(query, package_ids):
+        h = rhnSQL.prepare(query)
+        return (
+            h.execute_values(
+                query,
+                [(package_id,) for package_id in package_ids],
+                page_size=len(package_ids),
+            )
+            or []
+        )
+
+    def last_modified_many(self, package_ids):
+        """Get the last_modified dates of many packages, keyed by package id."""
+        ret = {}
+        for page in self._pages(package_ids, BULK_PAGE_SIZE):
+            for row in self._bulk_fetch(self.bulk_last_modified_query, page):
+                ret[row[0]] = row[1]
+        return ret
+
+    def get_packages(self, package_ids):
+        """Yield the packages with ids package_ids, in that order."""
+        if not package_ids:
+            return
+        for page in self._pages(package_ids, BULK_PAGE_SIZE):
+            packages = {}
+            for row in self._bulk_fetch(self.bulk_details_query, page):
+                package = domain.Package(row[0])
+                self._set_package_details(package, row[1:])
+                packages[row[0]] = package
+
+            for row in self._bulk_fetch(self.bulk_prco_query, page):
+                if row[0] in packages:
+                    self._add_package_dep(packages[row[0]], row[1:])
+
+            for row in self._bulk_fetch(self.bulk_filelist_query, page):
+                if row[0] in packages:
+                    packages[row[0]].files.append(string_to_unicode(row[1]))
+
+            for row in self._bulk_fetch(self.bulk_other_query, page):
+                if row[0] in packages:
+                    self._add_package_changelog(packages[row[0]], row[1:])
+
+            for package_id in page:
+                # packages removed in the meantime are skipped
+                if package_id in packages:
+                    yield packages[package_id]
 
 
 class CachedErratumMapper:
@@ -601,6 +855,7 @@ class CachedErratumMapper:
         self.package_mapper = package_mapper
 
         cache = rhnCache.Cache()
+        cache = rhnCache.EvictingCache(cache, "repomd-errata", get_cache_max_size())
         cache = rhnCache.ObjectCache(cache)
         self.cache = rhnCache.NullCache(cache)
         self.mapper = mapper
@@ -620,8 +875,11 @@ class CachedErratumMapper:
         last_modified = re.sub("-", "", last_modified)
 
         cache_key = "repomd-errata/" + erratum_id
+        erratum = None
         if self.cache.has_key(cache_key, last_modified):
+            # None if the entry got evicted in the meantime
             erratum = self.cache.get(cache_key)
+        if erratum is not None:
             for package_id in erratum.package_ids:
                 package = self.package_mapper.get_package(package_id)
                 erratum.packages.append(package)
@@ -791,6 +1049,11 @@ class SqlRepoMDMapper:
         return domain.RepoMD(repomd_id, filename)
 
 
+def get_cache_max_size():
+    """Size limit in bytes of each of the repomd on-disc caches."""
+    return int(CFG.REPOMD_CACHE_MAX_SIZE or 0) * 1024 * 1024
+
+
 def get_channel_mapper():
     """Factory Method-ish function to load a Channel Mapper."""
     package_mapper = get_package_mapper()
@@ -803,7 +1066,7 @@ def get_channel_mapper():
 
 def get_package_mapper():
     """Factory Method-ish function to load a Package Mapper."""
-    package_mapper = SqlPackageMapper()
+    package_mapper = SqlBulkPackageMapper()
     package_mapper = CachedPackageMapper(package_mapper)
 
     return package_mapper
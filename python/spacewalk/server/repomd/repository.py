@@ -18,23 +18,14 @@
 #
 
 import time
-
-try:
-    #  python 2
-    import StringIO
-except ImportError:
-    #  python3
-    import io as StringIO
 import shutil
 import os.path
+import subprocess
+import zlib
 
-from gzip import GzipFile
-from gzip import write32u
-
-from uyuni.common.usix import LongType
 from uyuni.common import checksum
 from spacewalk.common import rhnCache
-from spacewalk.common.rhnLog import log_debug
+from spacewalk.common.rhnLog import log_debug, log_error
 from spacewalk.common.rhnConfig import CFG
 
 from . import mapper
@@ -83,6 +74,12 @@ class Repository(object):
         cache = rhnCache.Cache()
         self.cache = rhnCache.NullCache(cache)
 
+        cache = rhnCache.Cache()
+        cache = rhnCache.EvictingCache(
+            cache, "repomd-fragments", mapper.get_cache_max_size()
+        )
+        self.fragment_cache = rhnCache.NullCache(cache)
+
     def get_primary_xml_file(self):
         """Return a file-like object of the primarl.xml for this channel."""
         ret = self.get_primary_cache()
@@ -211,12 +208,32 @@ class Repository(object):
 
         for package in self.channel.packages:
             for view in views:
-                view.write_package(package)
+                self.write_package(view, package)
 
         for view in views:
             view.write_end()
             view.fileobj.close()
 
+    def write_package(self, view, package):
+        """
+        Write the package to the view, reusing the rendered fragment from
+        the cache if the package didn't change since it was rendered.
+
+        Fragments only depend on the package, so they are shared between
+        all the channels containing it.
+        """
+        if package.last_modified is None:
+            view.write_package(package)
+            return
+
+        # pylint: disable-next=consider-using-f-string
+        cache_entry = "repomd-fragments/%s/%s" % (view.fragment_type, package.id)
+        fragment = self.fragment_cache.get(cache_entry, package.last_modified)
+        if fragment is None:
+            fragment = view.get_package_fragment(package)
+            self.fragment_cache.set(cache_entry, fragment, package.last_modified)
+        view.fileobj.write(fragment)
+
     def __get_channel(self):
         """Late binding for the channel."""
         if self._channel is None:
@@ -229,32 +246,43 @@ class Repository(object):
 
 class CompressedRepository:
 
-    """Decorator for Repositories adding gzip compression of the output."""
+    """
+    Decorator for Repositories adding compression of the output.
 
-    def __init__(self, repository):
+    compression is either "gz" or "zst".
+    """
+
+    def __init__(self, repository, compression="gz"):
         self.repository = repository
 
-        self.primary_prefix = self.repository.primary_prefix + ".gz"
-        self.other_prefix = self.repository.other_prefix + ".gz"
-        self.filelists_prefix = self.repository.filelists_prefix + ".gz"
-        self.updateinfo_prefix = self.repository.updateinfo_prefix + ".gz"
+        self.compression = compression
+        self.compression_suffix = "." + compression
+
+        self.primary_prefix = self.repository.primary_prefix + self.compression_suffix
+        self.other_prefix = self.repository.other_prefix + self.compression_suffix
+        self.filelists_prefix = (
+            self.repository.filelists_prefix + self.compression_suffix
+        )
+        self.updateinfo_prefix = (
+            self.repository.updateinfo_prefix + self.compression_suffix
+        )
 
     def get_primary_xml_file(self):
         xml_file = self.repository.get_primary_xml_file()
         return self.__get_compressed_file(xml_file)
 
     def get_other_xml_file(self):
-        """Return gzipped other.xml file"""
+        """Return compressed other.xml file"""
         xml_file = self.repository.get_other_xml_file()
         return self.__get_compressed_file(xml_file)
 
     def get_filelists_xml_file(self):
-        """Return gzipped filelists.xml file"""
+        """Return compressed filelists.xml file"""
         xml_file = self.repository.get_filelists_xml_file()
         return self.__get_compressed_file(xml_file)
 
     def get_updateinfo_xml_file(self):
-        """Return gzipped updateinfo.xml file"""
+        """Return compressed updateinfo.xml file"""
         xml_file = self.repository.get_updateinfo_xml_file()
         return self.__get_compressed_file(xml_file)
 
@@ -262,16 +290,13 @@ class CompressedRepository:
         return getattr(self.repository, x)
 
     def __get_compressed_file(self, uncompressed_file):
-        string_file = StringIO.StringIO()
-        gzip_file = NoTimeStampGzipFile(mode="wb", fileobj=string_file)
-
-        shutil.copyfileobj(uncompressed_file, gzip_file)
-
-        gzip_file.close()
-
-        string_file.seek(0, 0)
-
-        return string_file
+        """
+        Return a file-like object compressing uncompressed_file while it is
+        read, so that the metadata is never held in memory as a whole.
+        """
+        if self.compression == "zst":
+            return ZstdCompressingFile(uncompressed_file)
+        return GzipCompressingFile(uncompressed_file)
 
 
 class CachedRepository:
@@ -318,10 +343,9 @@ class CachedRepository:
             ret = fallback_method()
             cache_file = self.cache.set_file(cache_entry, self.last_modified)
 
-            shutil.copyfileobj(ret, cache_file)
+            shutil.copyfileobj(ret, cache_file, CHUNK_SIZE)
 
-            # pylint: disable-next=pointless-statement
-            ret.close
+            ret.close()
             cache_file.close()
             ret = self.cache.get_file(cache_entry, self.last_modified)
         return ret
@@ -344,6 +368,9 @@ class MetadataRepository:
         self.compressed_repository = compressed_repository
 
         self.repomd_prefix = "repomd.xml"
+        if self.compressed_repository.compression_suffix != ".gz":
+            # repomd.xml refers to the files with a different compression
+            self.repomd_prefix += self.compressed_repository.compression_suffix
 
     def get_repomd_file(self):
         """Return uncompressed repomd.xml file"""
@@ -422,6 +449,7 @@ class MetadataRepository:
                 modules,
                 ret,
                 self.__get_checksumtype(),
+                self.compressed_repository.compression_suffix,
             )
 
             repomd_view.write_repomd()
@@ -462,11 +490,33 @@ class MetadataRepository:
         return getattr(self.compressed_repository, x)
 
 
+def get_compression():
+    """
+    Return the compression configured for the repository metadata, gz by
+    default. zst is only used if the zstd command is available.
+    """
+    compression = "gz"
+    try:
+        compression = CFG.REPOMD_COMPRESSION or "gz"
+    except AttributeError:
+        pass
+
+    if compression == "zst" and not shutil.which("zstd"):
+        log_error("zstd is not available, compressing repository metadata with gzip")
+        compression = "gz"
+    elif compression not in ("gz", "zst"):
+        # pylint: disable-next=consider-using-f-string
+        log_error("Unknown repomd_compression %s, using gzip" % compression)
+        compression = "gz"
+
+    return compression
+
+
 def get_repository(channel):
     """Factory Method-ish function to create a repository from a channel."""
     repository = Repository(channel)
 
-    compressed_repository = CompressedRepository(repository)
+    compressed_repository = CompressedRepository(repository, get_compression())
     compressed_repository = CachedRepository(compressed_repository)
 
     meta_repository = MetadataRepository(repository, compressed_repository)
@@ -474,12 +524,71 @@ def get_repository(channel):
     return meta_repository
 
 
-class NoTimeStampGzipFile(GzipFile):
-    def _write_gzip_header(self):
-        self.fileobj.write("\037\213")
-        self.fileobj.write("\010")
-        # no flags
-        self.fileobj.write("\x00")
-        write32u(self.fileobj, LongType(0))
-        self.fileobj.write("\002")
-        self.fileobj.write("\377")
+class GzipCompressingFile:
+
+    """
+    Read-only file-like object returning the gzip compressed content of
+    fileobj, compressing it chunk by chunk as it is read.
+
+    The gzip header carries no timestamp or file name, so the same content
+    always gives the same checksum.
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        # wbits 31: gzip container, zlib writes a zero mtime in the header
+        self.compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+        self.buffer = b""
+        self.eof = False
+
+    def read(self, size=-1):
+        while not self.eof and (size < 0 or len(self.buffer) < size):
+            chunk = self.fileobj.read(CHUNK_SIZE)
+            if chunk:
+                self.buffer += self.compressor.compress(chunk)
+            else:
+                self.buffer += self.compressor.flush()
+                self.eof = True
+
+        if size < 0:
+            size = len(self.buffer)
+        data = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return data
+
+    def close(self):
+        self.fileobj.close()
+
+
+class ZstdCompressingFile:
+
+    """
+    Read-only file-like object returning the zstd compressed content of
+    fileobj, piping it through the zstd command as it is read.
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        # pylint: disable-next=consider-using-with
+        self.process = subprocess.Popen(
+            ["zstd", "-q", "-c"],
+            stdin=fileobj,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def read(self, size=-1):
+        data = self.process.stdout.read(size)
+        if not data and self.process.wait() != 0:
+            # Don't let a truncated file end up in the cache
+            raise IOError(
+                # pylint: disable-next=consider-using-f-string
+                "zstd failed with exit code %s"
+                % self.process.returncode
+            )
+        return data
+
+    def close(self):
+        self.process.stdout.close()
+        self.process.wait()
+        self.fileobj.close()
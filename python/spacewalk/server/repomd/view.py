@@ -30,6 +30,7 @@ class RepoView:
         modules,
         fileobj,
         checksum_type,
+        compression_suffix=".gz",
     ):
         self.primary = primary
         self.filelists = filelists
@@ -39,6 +40,7 @@ class RepoView:
         self.modules = modules
 
         self.fileobj = fileobj
+        self.compression_suffix = compression_suffix
         if checksum_type == "sha1":
             self.checksum_type = "sha"
         else:
@@ -48,8 +50,11 @@ class RepoView:
         output = []
         # pylint: disable-next=consider-using-f-string
         output.append('  <data type="%s">' % (data_type))
-        # pylint: disable-next=consider-using-f-string
-        output.append('    <location href="repodata/%s.xml.gz"/>' % (data_type))
+        output.append(
+            # pylint: disable-next=consider-using-f-string
+            '    <location href="repodata/%s.xml%s"/>'
+            % (data_type, self.compression_suffix)
+        )
         output.append(
             # pylint: disable-next=consider-using-f-string
             '    <checksum type="%s">%s</checksum>'
@@ -113,6 +118,9 @@ class RepoView:
 
 # pylint: disable-next=missing-class-docstring
 class PrimaryView(object):
+    # name of the per-package fragments in the repomd fragment cache
+    fragment_type = "primary"
+
     def __init__(self, channel, fileobj):
         self.channel = channel
         self.fileobj = fileobj
@@ -272,8 +280,11 @@ class PrimaryView(object):
 
         self.fileobj.write(output)
 
+    def get_package_fragment(self, package):
+        return "\n".join(self._get_package(package))
+
     def write_package(self, package):
-        self.fileobj.write("\n".join(self._get_package(package)))
+        self.fileobj.write(self.get_package_fragment(package))
 
     def write_end(self):
         self.fileobj.write("</metadata>")
@@ -281,6 +292,9 @@ class PrimaryView(object):
 
 # pylint: disable-next=missing-class-docstring
 class FilelistsView(object):
+    # name of the per-package fragments in the repomd fragment cache
+    fragment_type = "filelists"
+
     def __init__(self, channel, fileobj):
         self.channel = channel
         self.fileobj = fileobj
@@ -315,8 +329,11 @@ class FilelistsView(object):
 
         self.fileobj.write(output)
 
+    def get_package_fragment(self, package):
+        return "\n".join(self._get_package(package))
+
     def write_package(self, package):
-        self.fileobj.write("\n".join(self._get_package(package)))
+        self.fileobj.write(self.get_package_fragment(package))
 
     def write_end(self):
         self.fileobj.write("</filelists>")
@@ -324,6 +341,9 @@ class FilelistsView(object):
 
 # pylint: disable-next=missing-class-docstring
 class OtherView(object):
+    # name of the per-package fragments in the repomd fragment cache
+    fragment_type = "other"
+
     def __init__(self, channel, fileobj):
         self.channel = channel
         self.fileobj = fileobj
@@ -363,8 +383,11 @@ class OtherView(object):
 
         self.fileobj.write(output)
 
+    def get_package_fragment(self, package):
+        return "\n".join(self._get_package(package))
+
     def write_package(self, package):
-        self.fileobj.write("\n".join(self._get_package(package)))
+        self.fileobj.write(self.get_package_fragment(package))
 
     def write_end(self):
         self.fileobj.write("</otherdata>")
@@ -288,6 +288,86 @@ def get_info_for_package(pkg, channel_id, org_id):
     return ret
 
 
+def get_info_for_packages(pkgs, channel_id, org_id, page_size=1000):
+    """Set-based variant of get_info_for_package
+
+    pkgs is a list of [name, version, release, epoch, arch] entries. The
+    lookup is sent to the database in pages of page_size packages instead of
+    one statement per package. Returns a list with one entry per element of
+    pkgs, in the same order, each one being the (possibly empty) list of rows
+    get_info_for_package would return for it.
+    """
+    log_debug(3, len(pkgs), channel_id, org_id)
+    ret = [[] for _pkg in pkgs]
+    if not pkgs:
+        return ret
+
+    values = []
+    for i, pkg in enumerate(pkgs):
+        name, version, release, epoch, arch = list(map(_none2emptyString, pkg))
+        # yum repo has epoch="0" not only when epoch is "0" but also if it's NULL
+        if epoch in ("0", ""):
+            epoch = None
+        values.append((i, name, version, release, epoch, arch))
+
+    if org_id:
+        # pylint: disable-next=consider-using-f-string
+        orgStatement = "p.org_id = %d" % int(org_id)
+    else:
+        orgStatement = "p.org_id is null"
+
+    # pylint: disable-next=consider-using-f-string
+    statement = """
+    WITH wanted (ordering, name, version, release, epoch, arch) AS (
+      VALUES %%s
+    )
+    SELECT wanted.ordering, p.path, cp.channel_id,
+           cv.checksum_type, cv.checksum, p.org_id, pe.epoch
+      FROM wanted
+      JOIN rhnPackageName pn
+        ON pn.name = wanted.name
+      JOIN rhnPackage p
+        ON p.name_id = pn.id
+      JOIN rhnPackageEVR pe
+        ON p.evr_id = pe.id
+       AND pe.version = wanted.version
+       AND pe.release = wanted.release
+       AND (pe.epoch = wanted.epoch
+            OR (wanted.epoch IS NULL AND (pe.epoch IS NULL OR pe.epoch = '0')))
+      JOIN rhnPackageArch pa
+        ON p.package_arch_id = pa.id
+       AND pa.label = wanted.arch
+      LEFT JOIN rhnChannelPackage cp
+        ON p.id = cp.package_id
+       AND cp.channel_id = %d
+      JOIN rhnChecksumView cv
+        ON p.checksum_id = cv.id
+     WHERE %s
+     ORDER BY wanted.ordering,
+              cp.channel_id nulls last,
+              p.id desc
+    """ % (
+        int(channel_id),
+        orgStatement,
+    )
+
+    h = rhnSQL.prepare(statement)
+    rows = h.execute_values(statement, values, page_size=page_size)
+    for row in rows or []:
+        ordering, path, row_channel_id, checksum_type, checksum, row_org_id, epoch = row
+        ret[ordering].append(
+            {
+                "path": path,
+                "channel_id": row_channel_id,
+                "checksum_type": checksum_type,
+                "checksum": checksum,
+                "org_id": "" if row_org_id is None else str(row_org_id),
+                "epoch": epoch,
+            }
+        )
+    return ret
+
+
 def _none2emptyString(foo):
     if foo is None:
         return ""
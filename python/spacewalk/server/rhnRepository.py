@@ -207,17 +207,20 @@ class Repository(rhnRepository.Repository):
 
         output = None
         content_type = "application/x-gzip"
+        suffix = repo.compression_suffix
+        if suffix == ".zst":
+            content_type = "application/zstd"
 
         if file_name == "repomd.xml":
             content_type = "text/xml"
             output = repo.get_repomd_file()
-        elif file_name == "primary.xml.gz":
+        elif file_name == "primary.xml" + suffix:
             output = repo.get_primary_xml_file()
-        elif file_name == "other.xml.gz":
+        elif file_name == "other.xml" + suffix:
             output = repo.get_other_xml_file()
-        elif file_name == "filelists.xml.gz":
+        elif file_name == "filelists.xml" + suffix:
             output = repo.get_filelists_xml_file()
-        elif file_name == "updateinfo.xml.gz":
+        elif file_name == "updateinfo.xml" + suffix:
             output = repo.get_updateinfo_xml_file()
         elif file_name == "comps.xml":
             content_type = "text/xml"
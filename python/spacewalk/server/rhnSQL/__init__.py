@@ -30,6 +30,7 @@ from . import sql_row
 from . import sql_sequence
 from . import dbi
 from . import sql_types
+from . import sql_stats
 
 types = sql_types
 
@@ -137,6 +138,9 @@ def initDB(
                 sslmode = None
                 sslrootcert = None
 
+        if CFG.has_key("db_stats_file") and CFG.DB_STATS_FILE:
+            sql_stats.enable(CFG.DB_STATS_FILE, int(CFG.get("db_stats_n_plus_one", 50)))
+
     if backend not in SUPPORTED_BACKENDS:
         raise rhnException("Unsupported database backend", backend)
 
@@ -241,11 +245,16 @@ def cursor():
     return db.cursor()
 
 
-def prepare(sql, blob_map=None):
+def prepare(sql, blob_map=None, streaming=False, itersize=None):
+    """Prepare an SQL statement.
+
+    With streaming=True the result set is kept on the database server and
+    fetched itersize rows at a time, see Cursor.fetchiter().
+    """
     db = __test_DB()
     if isinstance(sql, Statement):
         sql = sql.statement
-    return db.prepare(sql, blob_map=blob_map)
+    return db.prepare(sql, blob_map=blob_map, streaming=streaming, itersize=itersize)
 
 
 def execute(sql, *args, **kwargs):
@@ -267,11 +276,21 @@ def fetchone_dict(sql, *args, **kwargs):
 
 def commit():
     db = __test_DB()
+    if sql_stats.collector is not None:
+        sql_stats.collector.end_batch()
     return db.commit()
 
 
+def statement_cache_stats():
+    """Return the counters of the statement cache of the connection."""
+    db = __test_DB()
+    return db.statement_cache_stats()
+
+
 def rollback(name=None):
     db = __test_DB()
+    if sql_stats.collector is not None and not name:
+        sql_stats.collector.end_batch()
     return db.rollback(name)
 
 
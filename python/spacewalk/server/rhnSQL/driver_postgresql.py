@@ -23,6 +23,11 @@ import sys
 # pylint: disable-next=unused-import
 import string
 import re
+import time
+import datetime
+import decimal
+import itertools
+from collections import OrderedDict
 import psycopg2
 import psycopg2.extras
 
@@ -44,7 +49,10 @@ from spacewalk.server import rhnSQL
 from uyuni.common.usix import BufferType, raise_with_tb
 
 # pylint: disable-next=wrong-import-position,ungrouped-imports
-from spacewalk.common.rhnLog import log_debug, log_error
+from spacewalk.common.rhnLog import log_debug, log_debug_enabled, log_error
+
+# pylint: disable-next=wrong-import-position
+from spacewalk.common.rhnConfig import CFG
 
 # pylint: disable-next=wrong-import-position
 from spacewalk.common.rhnException import rhnException
@@ -52,6 +60,9 @@ from spacewalk.common.rhnException import rhnException
 # pylint: disable-next=wrong-import-position
 from .const import POSTGRESQL
 
+# Names of the server side cursors used by streaming cursors
+_cursor_names = itertools.count(1)
+
 
 def convert_named_query_params(query):
     """
@@ -72,6 +83,230 @@ def convert_named_query_params(query):
     return new_query
 
 
+def convert_positional_query_params(query):
+    """
+    Convert a query with named parameters into one using the $1, $2, ...
+    positional parameters of PREPARE.
+
+    RETURNS: the new query and the list of the parameter names, in order
+    """
+    names = []
+
+    def _replace(match):
+        if match.group(2) not in names:
+            names.append(match.group(2))
+        # pylint: disable-next=consider-using-f-string
+        return "%s$%d" % (match.group(1), names.index(match.group(2)) + 1)
+
+    return re.sub(r"(\W):(\w+)", _replace, query), names
+
+
+def _get_int_option(name, default):
+    if CFG is None or not CFG.is_initialized() or not CFG.has_key(name):
+        return default
+    try:
+        return int(CFG.get(name))
+    except (TypeError, ValueError):
+        return default
+
+
+# Statements that can be prepared on the database server
+_PREPARABLE_RE = re.compile(r"^\s*(select|insert|update|delete|with)\b", re.I)
+
+# Types of the parameters of a prepared statement that give the same results
+# as the typed literals psycopg2 sends for values other than strings and None,
+# which are untyped and take the type of their context like the parameters.
+_PARAMETER_TYPES = (
+    (bool, ("boolean",)),
+    (
+        int,
+        ("smallint", "integer", "bigint", "numeric", "real", "double precision"),
+    ),
+    ((float, decimal.Decimal), ("numeric", "real", "double precision")),
+    (
+        datetime.datetime,
+        ("timestamp without time zone", "timestamp with time zone"),
+    ),
+    (
+        datetime.date,
+        ("date", "timestamp without time zone", "timestamp with time zone"),
+    ),
+)
+
+_PARAMETER_TYPES_QUERY = """
+    SELECT parameter_type::text
+      FROM pg_prepared_statements,
+           unnest(parameter_types) WITH ORDINALITY AS p(parameter_type, i)
+     WHERE name = %(name)s
+     ORDER BY i
+"""
+
+
+# pylint: disable-next=too-few-public-methods
+class _Statement:
+
+    """A statement of the StatementCache."""
+
+    def __init__(self, sql):
+        start = time.time()
+        self.sql = convert_named_query_params(sql)
+        self.convert_time = time.time() - start
+        self.original_sql = sql
+        self.uses = 0
+        self.preparable = bool(_PREPARABLE_RE.match(sql))
+        # Name, parameter types and EXECUTE statement once prepared on the
+        # server
+        self.name = None
+        self.parameter_types = {}
+        self.execute_sql = None
+
+    def accepts(self, params):
+        """
+        Tell whether the prepared statement gives the same results as the
+        statement for params. PREPARE fixes the types of the parameters,
+        those without a column or a cast to get it from become text.
+        """
+        for name, parameter_type in self.parameter_types.items():
+            if name not in params:
+                continue
+            value = params[name]
+            if value is None or isinstance(value, str):
+                continue
+            for value_types, parameter_types in _PARAMETER_TYPES:
+                if isinstance(value, value_types):
+                    if parameter_type not in parameter_types:
+                        return False
+                    break
+            else:
+                return False
+        return True
+
+
+class StatementCache:
+
+    """
+    Per-connection cache of the statements converted for psycopg2, holding
+    at most size statements (the least recently used ones are dropped).
+
+    With a prepare_threshold, statements executed that many times are
+    prepared on the database server and then run with EXECUTE.
+    """
+
+    def __init__(self, size=1000, prepare_threshold=0):
+        self.size = size
+        self.prepare_threshold = prepare_threshold
+        self._statements = OrderedDict()
+        self._names = itertools.count(1)
+        # Prepared statements dropped from the cache, to deallocate
+        self._deallocate = []
+        self.hits = 0
+        self.misses = 0
+        self.prepared = 0
+        self.prepared_executions = 0
+        # Time not spent converting statements, in seconds
+        self.time_saved = 0.0
+
+    def get(self, sql):
+        statement = self._statements.get(sql)
+        if statement is not None:
+            self.hits += 1
+            self.time_saved += statement.convert_time
+            self._statements.move_to_end(sql)
+            return statement
+
+        self.misses += 1
+        statement = _Statement(sql)
+        self._statements[sql] = statement
+        while len(self._statements) > self.size:
+            _sql, old = self._statements.popitem(last=False)
+            if old.name:
+                self._deallocate.append(old.name)
+        return statement
+
+    def executable(self, statement, cursor, params):
+        """
+        Return the SQL to run for statement with params, preparing it with
+        cursor on the database server once it's used often enough.
+        """
+        statement.uses += 1
+        if (
+            statement.name is None
+            and statement.preparable
+            and self.prepare_threshold > 0
+            and statement.uses >= self.prepare_threshold
+        ):
+            self._prepare(statement, cursor)
+        if statement.name is None or not statement.accepts(params):
+            return statement.sql
+        self.prepared_executions += 1
+        return statement.execute_sql
+
+    def _prepare(self, statement, cursor):
+        # A failing PREPARE (e.g. a name already prepared on the connection)
+        # must not abort the current transaction
+        try:
+            cursor.execute("SAVEPOINT rhnsql_prepare")
+        except psycopg2.Error:
+            # The transaction is failed already, the statement will tell
+            return
+        try:
+            while self._deallocate:
+                # pylint: disable-next=consider-using-f-string
+                cursor.execute("DEALLOCATE %s" % self._deallocate.pop())
+        except psycopg2.Error:
+            cursor.execute("ROLLBACK TO SAVEPOINT rhnsql_prepare")
+        try:
+            # pylint: disable-next=consider-using-f-string
+            name = "rhnsql_stmt_%d" % next(self._names)
+            query, params = convert_positional_query_params(statement.original_sql)
+            # pylint: disable-next=consider-using-f-string
+            cursor.execute("PREPARE %s AS %s" % (name, query))
+        except psycopg2.Error:
+            e = sys.exc_info()[1]
+            cursor.execute("ROLLBACK TO SAVEPOINT rhnsql_prepare")
+            log_debug(4, "Cannot prepare statement", statement.original_sql, e)
+            statement.preparable = False
+            return
+        try:
+            cursor.execute(_PARAMETER_TYPES_QUERY, {"name": name})
+            parameter_types = [row[0] for row in cursor.fetchall()]
+        except psycopg2.Error:
+            e = sys.exc_info()[1]
+            cursor.execute("ROLLBACK TO SAVEPOINT rhnsql_prepare")
+            log_debug(4, "Cannot get the parameter types", statement.original_sql, e)
+            # PREPARE is not undone by the rollback
+            self._deallocate.append(name)
+            statement.preparable = False
+            return
+        cursor.execute("RELEASE SAVEPOINT rhnsql_prepare")
+
+        statement.name = name
+        statement.parameter_types = dict(zip(params, parameter_types))
+        if params:
+            # pylint: disable-next=consider-using-f-string
+            statement.execute_sql = "EXECUTE %s (%s)" % (
+                name,
+                ", ".join(["%%(%s)s" % param for param in params]),
+            )
+        else:
+            # pylint: disable-next=consider-using-f-string
+            statement.execute_sql = "EXECUTE %s" % name
+        self.prepared += 1
+
+    def stats(self):
+        """Counters of the cache usage."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._statements),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": lookups and float(self.hits) / lookups,
+            "time_saved": self.time_saved,
+            "prepared": self.prepared,
+            "prepared_executions": self.prepared_executions,
+        }
+
+
 class Function(sql_base.Procedure):
 
     """
@@ -195,6 +430,7 @@ class Database(sql_base.Database):
             self.port = -1
 
         self.dbh = None
+        self.statement_cache = None
 
         sql_base.Database.__init__(self)
 
@@ -241,6 +477,12 @@ class Database(sql_base.Database):
                 decimal2intfloat,
             )
             psycopg2.extensions.register_type(DEC2INTFLOAT)
+
+            # Statements prepared on the server do not outlive the session
+            self.statement_cache = StatementCache(
+                size=_get_int_option("db_sql_cache_size", 1000),
+                prepare_threshold=_get_int_option("db_prepare_threshold", 0),
+            )
         except psycopg2.Error:
             e = sys.exc_info()[1]
             if reconnect > 0:
@@ -291,8 +533,16 @@ class Database(sql_base.Database):
             )
             self.connect()  # only allow one try
 
-    def prepare(self, sql, force=0, blob_map=None):
-        return Cursor(dbh=self.dbh, sql=sql, force=force, blob_map=blob_map)
+    def prepare(self, sql, force=0, blob_map=None, streaming=False, itersize=None):
+        return Cursor(
+            dbh=self.dbh,
+            sql=sql,
+            force=force,
+            blob_map=blob_map,
+            streaming=streaming,
+            itersize=itersize,
+            statement_cache=self.statement_cache,
+        )
 
     def execute(self, sql, *args, **kwargs):
         cursor = self.prepare(sql)
@@ -333,12 +583,35 @@ class Database(sql_base.Database):
     def _read_lob(self, lob):
         return bytes(lob)
 
+    def statement_cache_stats(self):
+        if self.statement_cache is None:
+            return None
+        return self.statement_cache.stats()
+
 
 class Cursor(sql_base.Cursor):
 
-    """PostgreSQL specific wrapper over sql_base.Cursor."""
+    """PostgreSQL specific wrapper over sql_base.Cursor.
+
+    Streaming cursors execute their query on a server side (named) cursor,
+    the rows are then fetched itersize at a time by fetchiter() and the
+    other fetch methods. The server side cursor only lives until the end of
+    the transaction, so the rows have to be fetched before committing.
+    """
 
-    def __init__(self, dbh=None, sql=None, force=None, blob_map=None):
+    def __init__(
+        self,
+        dbh=None,
+        sql=None,
+        force=None,
+        blob_map=None,
+        streaming=False,
+        itersize=None,
+        statement_cache=None,
+    ):
+        self.streaming = streaming
+        if itersize:
+            self.itersize = itersize
         sql_base.Cursor.__init__(self, dbh, sql, force)
         self.blob_map = blob_map
 
@@ -347,18 +620,59 @@ class Cursor(sql_base.Cursor):
         temp_sql = ""
         if self.sql is not None:
             temp_sql = self.sql
-        self.sql = convert_named_query_params(temp_sql)
+        self.statement_cache = statement_cache
+        self.statement = None
+        if statement_cache is not None:
+            self.statement = statement_cache.get(temp_sql)
+            self.sql = self.statement.sql
+        else:
+            self.sql = convert_named_query_params(temp_sql)
+
+    def _prepare(self, force=None):
+        if self.streaming:
+            # Server side cursors can only be executed once, they are
+            # created by each execute()
+            return None
+        return sql_base.Cursor._prepare(self, force=force)
 
     def _prepare_sql(self):
         cursor = self.dbh.cursor()
         return cursor
 
-    def _execute_wrapper(self, function, *p, **kw):
+    def _prepare_streaming(self):
+        self.close()
         # pylint: disable-next=consider-using-f-string
-        params = ",".join(["%s: %s" % (key, value) for key, value in list(kw.items())])
-        log_debug(5, 'Executing SQL: "%s" with bind params: {%s}' % (self.sql, params))
+        cursor = self.dbh.cursor(name="rhnsql_cursor_%d" % next(_cursor_names))
+        cursor.itersize = self.itersize
+        return cursor
+
+    @property
+    def description(self):
+        # Server side cursors only describe the result set once the first
+        # rows are fetched
+        if self.streaming and self._real_cursor is not None:
+            return self._real_cursor.description
+        return self._description
+
+    @description.setter
+    def description(self, value):
+        self._description = value
+
+    def _execute_wrapper(self, function, *p, **kw):
+        if log_debug_enabled(5):
+            params = ",".join(
+                # pylint: disable-next=consider-using-f-string
+                ["%s: %s" % (key, value) for key, value in list(kw.items())]
+            )
+            log_debug(
+                5,
+                # pylint: disable-next=consider-using-f-string
+                'Executing SQL: "%s" with bind params: {%s}' % (self.sql, params),
+            )
         if self.sql is None:
             raise rhnException("Cannot execute empty cursor")
+        if self.streaming and function != self._execute:
+            raise rhnException("Streaming cursors can only execute queries")
         if self.blob_map:
             for blob_var in list(self.blob_map.keys()):
                 if isinstance(kw[blob_var], str):
@@ -395,8 +709,15 @@ class Cursor(sql_base.Cursor):
         PostgreSQL specific execution of the query.
         """
         params = UserDictCase(kwargs)
+        sql = self.sql
+        if self.streaming:
+            self._real_cursor = self._prepare_streaming()
+        elif self.statement is not None and self.statement.sql == sql:
+            sql = self.statement_cache.executable(
+                self.statement, self._real_cursor, params
+            )
         try:
-            self._real_cursor.execute(self.sql, params)
+            self._real_cursor.execute(sql, params)
         except psycopg2.OperationalError:
             e = sys.exc_info()[1]
             # pylint: disable-next=raise-missing-from,consider-using-f-string
@@ -457,4 +778,7 @@ class Cursor(sql_base.Cursor):
         c.execute(**kwargs)
 
     def close(self):
-        pass
+        if self.streaming and self._real_cursor is not None:
+            if not self._real_cursor.closed and not self.dbh.closed:
+                self._real_cursor.close()
+            self._real_cursor = None
@@ -26,6 +26,7 @@
 
 import sys
 from . import sql_types
+from . import sql_stats
 from uyuni.common import usix
 
 
@@ -96,6 +97,9 @@ class Cursor:
     #   hash with the sql statement as a key and the cursor as a value
     _cursor_cache = {}
 
+    # Number of rows fetched at a time by fetchiter()
+    itersize = 2000
+
     def __init__(self, dbh=None, sql=None, force=None):
         self.sql = sql
         self.dbh = dbh
@@ -149,7 +153,7 @@ class Cursor:
 
     def execute(self, *p, **kw):
         """Execute a single query."""
-        return self._execute_wrapper(self._execute, *p, **kw)
+        return self._run(self._execute, *p, **kw)
 
     def executemany(self, *p, **kw):
         """
@@ -158,17 +162,26 @@ class Cursor:
         Call with keyword arguments mapping to ordered lists.
         i.e. cursor.executemany(id=[1, 2], name=["Bill", "Mary"])
         """
-        self._execute_wrapper(self._executemany, *p, **kw)
+        self._run(self._executemany, *p, **kw)
 
     def execute_values(self, sql, argslist, template=None, page_size=1000, fetch=True):
         """
         Execute a query with a potentially-long VALUEs list. This method will split the query up in page_size
         chunks. Use a %s placeholder where the VALUE list goes.
         """
-        return self._execute_wrapper(
+        return self._run(
             self._execute_values, sql, argslist, template, page_size, fetch
         )
 
+    def _run(self, function, *p, **kw):
+        """Run function through _execute_wrapper, recording its statistics
+        when they are enabled."""
+        if sql_stats.collector is None:
+            return self._execute_wrapper(function, *p, **kw)
+        return sql_stats.collector.measure(
+            self, self._execute_wrapper, function, *p, **kw
+        )
+
     def _execute_wrapper(self, function, *p, **kw):
         """
         Database specific execute wrapper. Mostly used just to catch DB
@@ -211,7 +224,8 @@ class Cursor:
         Return a dictionary for the row returned mapping column name to
         it's value.
         """
-        ret = ociDict(self.description, self._real_cursor.fetchone())
+        row = self._real_cursor.fetchone()
+        ret = ociDict(self.description, row)
 
         if len(ret) == 0:
             return None
@@ -233,6 +247,29 @@ class Cursor:
             return None
         return ret
 
+    def fetchiter(self, size=None):
+        """
+        Iterate over the rows of the result set, fetching size (by default
+        itersize) rows at a time.
+
+        On streaming cursors the rows are read from the database server as
+        the iteration goes instead of being loaded by execute().
+        """
+        size = size or self.itersize
+        while 1:
+            rows = self._real_cursor.fetchmany(size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+
+    def fetchiter_dict(self, size=None):
+        """
+        Iterate over the rows of the result set as dictionaries.
+        """
+        for row in self.fetchiter(size):
+            yield ociDict(self.description, row)
+
     def _is_sequence_type(self, val):
         if type(val) in (usix.ListType, usix.TupleType):
             return 1
@@ -285,7 +322,7 @@ class Database:
         # query:
         raise NotImplementedError()
 
-    def prepare(self, sql, force=0):
+    def prepare(self, sql, force=0, blob_map=None, streaming=False, itersize=None):
         """Prepare an SQL statement."""
         raise NotImplementedError()
 
@@ -345,6 +382,10 @@ class Database:
         "Reads a lob's contents"
         return None
 
+    def statement_cache_stats(self):
+        "Returns the counters of the statement cache, if any"
+        return None
+
     def is_connected_to(
         self, backend, host, port, username, password, database, sslmode
     ):
@@ -0,0 +1,225 @@
+#  pylint: disable=missing-module-docstring
+#
+# Copyright (c) 2025 SUSE LLC
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Optional statistics about the executed SQL statements: number of calls,
+# latency percentiles and rows, per statement and calling code. Statements
+# executed many times in a single transaction are flagged as likely N+1
+# query patterns.
+#
+# The statistics are collected only once enable() has been called (see the
+# db_stats_file option), otherwise the cursors only check the collector is
+# None.
+#
+
+import atexit
+import json
+import os
+import random
+import re
+import signal
+import sys
+import threading
+import time
+
+from spacewalk.common.rhnLog import log_debug, log_error
+
+# The active Collector, None when the statistics are disabled
+collector = None
+
+# Latencies kept per statement to compute the percentiles
+SAMPLE_SIZE = 1000
+
+_RHNSQL_DIR = os.path.dirname(os.path.abspath(__file__))
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """Collapse the white space of a statement."""
+    return _WHITESPACE_RE.sub(" ", sql or "").strip()
+
+
+def call_site():
+    """Return the first caller outside of rhnSQL as file:line (function)."""
+    # pylint: disable-next=protected-access
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if os.path.dirname(os.path.abspath(filename)) != _RHNSQL_DIR:
+            # pylint: disable-next=consider-using-f-string
+            return "%s:%s (%s)" % (filename, frame.f_lineno, frame.f_code.co_name)
+        frame = frame.f_back
+    return None
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+class StatementStats:
+
+    """Counters of a statement executed from a call site."""
+
+    def __init__(self, sql, site):
+        self.sql = sql
+        self.call_site = site
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.rows = 0
+        self.samples = []
+        # Number of transactions flagged as N+1
+        self.n_plus_one = 0
+
+    def add(self, elapsed, rows):
+        self.calls += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        if rows is not None and rows > 0:
+            self.rows += rows
+        # Reservoir sampling keeps a uniform sample of the latencies
+        if len(self.samples) < SAMPLE_SIZE:
+            self.samples.append(elapsed)
+        else:
+            i = random.randint(0, self.calls - 1)
+            if i < SAMPLE_SIZE:
+                self.samples[i] = elapsed
+
+    def to_dict(self):
+        return {
+            "sql": self.sql,
+            "call_site": self.call_site,
+            "calls": self.calls,
+            "rows": self.rows,
+            "total_time": self.total_time,
+            "mean_time": self.calls and self.total_time / self.calls,
+            "p50": _percentile(self.samples, 50),
+            "p95": _percentile(self.samples, 95),
+            "p99": _percentile(self.samples, 99),
+            "max_time": self.max_time,
+            "n_plus_one": self.n_plus_one,
+        }
+
+
+class Collector:
+
+    """
+    Aggregates the statement statistics of the process.
+
+    A statement executed more than n_plus_one_threshold times from the same
+    call site between two commits or rollbacks is counted as a likely N+1
+    query pattern.
+    """
+
+    def __init__(self, n_plus_one_threshold=50):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.statements = {}
+        # Executions of the current transaction, per thread
+        self._batch = threading.local()
+        # Reentrant, a dump on signal can interrupt record()
+        self._lock = threading.RLock()
+
+    def measure(self, cursor, function, *p, **kw):
+        """Run function (executing the statement of cursor) and record it."""
+        site = call_site()
+        start = time.time()
+        try:
+            return function(*p, **kw)
+        finally:
+            elapsed = time.time() - start
+            # pylint: disable-next=protected-access
+            rows = getattr(cursor._real_cursor, "rowcount", None)
+            self.record(cursor.sql, site, elapsed, rows)
+
+    def record(self, sql, site, elapsed, rows=None):
+        sql = normalize_sql(sql)
+        key = (sql, site)
+        with self._lock:
+            stats = self.statements.get(key)
+            if stats is None:
+                stats = self.statements[key] = StatementStats(sql, site)
+            stats.add(elapsed, rows)
+
+        counts = getattr(self._batch, "counts", None)
+        if counts is None:
+            counts = self._batch.counts = {}
+        counts[key] = counts.get(key, 0) + 1
+        if counts[key] == self.n_plus_one_threshold + 1:
+            with self._lock:
+                stats.n_plus_one += 1
+            log_debug(
+                2,
+                # pylint: disable-next=consider-using-f-string
+                "Statement executed more than %s times in a transaction"
+                % self.n_plus_one_threshold,
+                site,
+                sql,
+            )
+
+    def end_batch(self):
+        """Called at the end of a transaction (or request)."""
+        self._batch.counts = {}
+
+    def report(self):
+        """Return the statistics, most time consuming statements first."""
+        with self._lock:
+            statements = [stats.to_dict() for stats in self.statements.values()]
+        statements.sort(key=lambda stats: stats["total_time"], reverse=True)
+        return {
+            "pid": os.getpid(),
+            "time": time.time(),
+            "n_plus_one_threshold": self.n_plus_one_threshold,
+            "statements": statements,
+        }
+
+    def dump(self, filename):
+        """Write the statistics as JSON to filename."""
+        tmp_filename = filename + ".tmp"
+        try:
+            with open(tmp_filename, "w", encoding="utf-8") as f:
+                json.dump(self.report(), f, indent=1)
+            os.rename(tmp_filename, filename)
+        except (IOError, OSError):
+            e = sys.exc_info()[1]
+            log_error("Unable to write the SQL statistics", filename, str(e))
+
+
+def enable(filename, n_plus_one_threshold=50, dump_signal=signal.SIGUSR2):
+    """
+    Start collecting statistics. They are written as JSON to
+    filename.<pid> when the process exits and when it receives dump_signal.
+    """
+    # pylint: disable-next=global-statement
+    global collector
+    if collector is not None:
+        return collector
+    stats_collector = collector = Collector(n_plus_one_threshold)
+    # pylint: disable-next=consider-using-f-string
+    path = "%s.%d" % (filename, os.getpid())
+    atexit.register(stats_collector.dump, path)
+    if dump_signal is not None:
+        try:
+            signal.signal(
+                dump_signal, lambda _signum, _frame: stats_collector.dump(path)
+            )
+        except ValueError:
+            # Not in the main thread, only dump at exit
+            pass
+    return collector
+
+
+def disable():
+    # pylint: disable-next=global-statement
+    global collector
+    collector = None
@@ -245,16 +245,25 @@ class GenericDevice:
         if not devid:
             return -1
         t = rhnSQL.Table(self.table, "id")
-        self.data = t[devid]
-        # clean up fields we don't want
-        if self.data:
-            for k in ["created", "modified"]:
-                if self.data.has_key(k):
-                    del self.data[k]
+        row = t[devid]
+        if row:
+            return self.load(row)
+        self.data = row
         self.id = devid
         self.status = 0
         return 0
 
+    def load(self, row):
+        """load from a row of the device table"""
+        self.data = UserDictCase(row)
+        # clean up fields we don't want
+        for k in ["created", "modified"]:
+            if self.data.has_key(k):
+                del self.data[k]
+        self.id = self.data["id"]
+        self.status = 0
+        return 0
+
     def _null_columns(self, params, names=()):
         """Method searches for empty string in params dict with names
         defined in names list and replaces them with None value which
@@ -899,6 +908,129 @@ def _dml(statement, params):
     statement.executemany(**params)
 
 
+def _device_columns(data):
+    """Return the columns of a device compared to find unchanged devices"""
+    columns = [k.lower() for k in list(data.keys())]
+    return tuple(sorted(k for k in columns if k not in ("id", "server_id")))
+
+
+def _device_values(data, columns):
+    """Return the values of columns in data as a hashable key"""
+    values = []
+    for k in columns:
+        v = None
+        if k in data:
+            v = data[k]
+        # the loaded values may be numbers, the new ones strings
+        if v is not None:
+            v = str(v)
+        values.append(v)
+    return tuple(values)
+
+
+def _save_devices(dev_class, sysid, devices):
+    """Save a list of devices of the same class with one statement per
+    table and kind of change.
+
+    Loaded devices deleted and then added back with the same values (a
+    hardware refresh deletes all the devices and adds the current ones)
+    are kept in the database as they are. Only the columns the new device
+    sets are compared, the other ones are kept too.
+
+    Returns the list of saved devices.
+    """
+    log_debug(4, dev_class.table, len(devices))
+    deleted = [dev for dev in devices if dev.status == 2 and dev.id]
+    # deleted devices by their values, for each set of compared columns
+    deleted_values = {}
+
+    saved = []
+    inserts = []
+    updates = []
+    for dev in devices:
+        if dev.status == 2:
+            continue
+        if not dev.must_save():
+            saved.append(dev)
+            continue
+        # set description to null if empty
+        # pylint: disable-next=protected-access
+        dev._null_columns([dev.data], dev._autonull)
+        if not dev.id:
+            columns = _device_columns(dev.data)
+            if columns not in deleted_values:
+                by_values = deleted_values[columns] = {}
+                for old in deleted:
+                    values = _device_values(old.data, columns)
+                    by_values.setdefault(values, []).append(old)
+            same = deleted_values[columns].get(_device_values(dev.data, columns))
+            # skip the devices already matched with other columns
+            while same and same[-1].status != 2:
+                same.pop()
+            if same:
+                # unchanged device
+                dev = same.pop()
+                dev.status = 0
+                saved.append(dev)
+                continue
+            inserts.append(dev)
+        else:
+            updates.append(dev)
+        saved.append(dev)
+
+    deletes = [dev.id for dev in deleted if dev.status == 2]
+    if deletes:
+        h = rhnSQL.prepare(
+            # pylint: disable-next=consider-using-f-string
+            "delete from %s where id = :id"
+            % dev_class.table
+        )
+        h.executemany(id=deletes)
+
+    if inserts:
+        ids = rhnSQL.Sequence(inserts[0].sequence).next_many(len(inserts))
+        for dev, devid in zip(inserts, ids):
+            dev.id = int(devid)
+
+    # group the rows by the columns they set
+    for changes, statement in ((inserts, "insert"), (updates, "update")):
+        groups = {}
+        for dev in changes:
+            for k in list(dev.data.keys()):
+                if dev.data[k] is None:
+                    del dev.data[k]
+            dev.data["server_id"] = sysid
+            dev.data["id"] = dev.id
+            columns = tuple(sorted(k.lower() for k in list(dev.data.keys())))
+            groups.setdefault(columns, []).append(dev)
+            dev.status = 0  # now it is saved
+        for columns, devs in list(groups.items()):
+            if statement == "insert":
+                _insert_devices(dev_class.table, columns, devs)
+            else:
+                _update_devices(dev_class.table, columns, devs)
+    return saved
+
+
+def _insert_devices(table, columns, devices):
+    # pylint: disable-next=consider-using-f-string
+    sql = "insert into %s (%s) values %%s" % (table, ", ".join(columns))
+    h = rhnSQL.prepare(sql)
+    h.execute_values(
+        sql,
+        [tuple(dev.data[k] for k in columns) for dev in devices],
+        fetch=False,
+    )
+
+
+def _update_devices(table, columns, devices):
+    # pylint: disable-next=consider-using-f-string
+    updates = ", ".join(["%s = :%s" % (k, k) for k in columns if k != "id"])
+    # pylint: disable-next=consider-using-f-string
+    h = rhnSQL.prepare("update %s set %s where id = :id" % (table, updates))
+    _dml(h, [dict((k, dev.data[k]) for k in columns) for dev in devices])
+
+
 def _transpose(hasharr):
     """Transpose the array of hashes into a hash of arrays"""
     if not hasharr:
@@ -1328,8 +1460,11 @@ class Hardware:
             return 0
         if not self.__changed:
             return 0
-        # pylint: disable-next=unused-variable
         for device_type, hw_list in list(hardware.items()):
+            # pylint: disable-next=comparison-with-callable
+            if device_type.save == GenericDevice.save:
+                hardware[device_type] = _save_devices(device_type, sysid, hw_list)
+                continue
             for hw in hw_list:
                 hw.save(sysid)
         self.__changed = 0
@@ -1343,16 +1478,15 @@ class Hardware:
 
         h = rhnSQL.prepare(
             # pylint: disable-next=consider-using-f-string
-            "select id from %s where server_id = :sysid"
+            "select * from %s where server_id = :sysid"
             % DevClass.table
         )
         h.execute(sysid=sysid)
         rows = h.fetchall_dict() or []
 
         for device in rows:
-            dev_id = device["id"]
             dev = DevClass()
-            dev.reload(dev_id)
+            dev.load(device)
             self.__hardware[DevClass].append(dev)
 
     def reload_hardware_byid(self, sysid):
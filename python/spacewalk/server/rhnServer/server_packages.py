@@ -33,6 +33,77 @@ DELETED = 2
 UPDATED = 3
 
 
+class PackageArches:
+    """
+    Process-wide table of the package arches, mapping their ids to their
+    labels and their labels to their package type (rpm, deb, ...).
+
+    The table is loaded on first use and shared by all the requests served
+    by the process. Package arches only change with schema upgrades, so it
+    is reloaded when an unknown arch is looked up, at most once every
+    RELOAD_INTERVAL seconds, or after reset().
+    """
+
+    RELOAD_INTERVAL = 300
+
+    _query_get_package_arches = rhnSQL.Statement(
+        """
+        select pa.id, pa.label, at.label type
+          from rhnPackageArch pa
+          join rhnArchType at on pa.arch_type_id = at.id
+    """
+    )
+
+    _labels = None
+    _types = None
+    _loaded = 0
+
+    @classmethod
+    def reset(cls):
+        """Drop the table, the next lookup loads it again."""
+        cls._labels = None
+        cls._types = None
+        cls._loaded = 0
+
+    @classmethod
+    def load(cls):
+        h = rhnSQL.prepare(cls._query_get_package_arches)
+        h.execute()
+        labels = {}
+        types = {}
+        for row in h.fetchall_dict() or []:
+            labels[row["id"]] = row["label"]
+            types[row["label"]] = row["type"]
+        # Replace both at once, other threads may be reading them
+        cls._labels, cls._types = labels, types
+        cls._loaded = time.time()
+
+    @classmethod
+    def _lookup(cls, table_name, key):
+        if cls._loaded == 0:
+            cls.load()
+        table = getattr(cls, table_name)
+        if key not in table and time.time() - cls._loaded > cls.RELOAD_INTERVAL:
+            log_debug(4, "Unknown package arch, reloading the arches", key)
+            cls.load()
+            table = getattr(cls, table_name)
+        return table.get(key)
+
+    @classmethod
+    def get_label(cls, package_arch_id):
+        """Return the label of the package arch with id package_arch_id."""
+        if package_arch_id is None:
+            return None
+        return cls._lookup("_labels", package_arch_id)
+
+    @classmethod
+    def get_type(cls, arch):
+        """Return the package type of the arch labelled arch, or None."""
+        if not arch:
+            return None
+        return cls._lookup("_types", arch)
+
+
 # pylint: disable-next=invalid-name
 class dbPackage:
     """A small class that helps us represent things about a
@@ -119,22 +190,9 @@ class dbPackage:
 
     __repr__ = __str__
 
-    _query_get_package_type_by_arch = rhnSQL.Statement(
-        """
-        select at.label
-          from rhnArchType at
-          join rhnPackageArch pa ON pa.arch_type_id = at.id
-         where pa.id = lookup_package_arch(:arch)
-    """
-    )
-
-    def get_package_type_by_arch(self, arch):
-        h = rhnSQL.prepare(self._query_get_package_type_by_arch)
-        h.execute(arch=arch)
-        row = h.fetchone_dict()
-        if not row:
-            return None
-        return row["label"]
+    @staticmethod
+    def get_package_type_by_arch(arch):
+        return PackageArches.get_type(arch)
 
 
 # pylint: disable-next=missing-class-docstring
@@ -230,23 +288,21 @@ class Packages:
         ]
         if dlist:
             log_debug(4, sysid, len(dlist), "deleted packages")
-            h = rhnSQL.prepare(
-                """
-            delete from rhnServerPackage
-            where server_id = :sysid
-            and name_id = :name_id
-            and evr_id = :evr_id
-            and ((:package_arch_id is null and package_arch_id is null)
-                or package_arch_id = :package_arch_id)
+            sql = """
+            delete from rhnServerPackage sp
+             using (values %s) as d (server_id, name_id, evr_id, package_arch_id)
+             where sp.server_id = d.server_id
+               and sp.name_id = d.name_id
+               and sp.evr_id = d.evr_id
+               and sp.package_arch_id is not distinct from d.package_arch_id
             """
-            )
-            h.executemany(
-                **{
-                    "sysid": [sysid] * len(dlist),
-                    "name_id": [a.name_id for a in dlist],
-                    "evr_id": [a.evr_id for a in dlist],
-                    "package_arch_id": [a.package_arch_id for a in dlist],
-                }
+            h = rhnSQL.prepare(sql)
+            h.execute_values(
+                sql,
+                [(sysid, a.name_id, a.evr_id, a.package_arch_id) for a in dlist],
+                template="(%s::numeric, %s::numeric, %s::numeric, %s::numeric)",
+                page_size=len(dlist),
+                fetch=False,
             )
             commits = commits + len(dlist)
             del dlist
@@ -255,35 +311,37 @@ class Packages:
         alist = [a for a in list(self.__p.values()) if a.status in (ADDED, UPDATED)]
         if alist:
             log_debug(4, sysid, len(alist), "added packages")
-            h = rhnSQL.prepare(
-                """
+            sql = """
             insert into rhnServerPackage
             (server_id, name_id, evr_id, package_arch_id, installtime)
-            values (:sysid, LOOKUP_PACKAGE_NAME(:n), LOOKUP_EVR(:e, :v, :r, :t),
-                LOOKUP_PACKAGE_ARCH(:a), TO_TIMESTAMP(:instime, 'YYYY-MM-DD HH24:MI:SS')
-            )
+            select server_id, LOOKUP_PACKAGE_NAME(n), LOOKUP_EVR(e, v, r, t),
+                LOOKUP_PACKAGE_ARCH(a), TO_TIMESTAMP(instime, 'YYYY-MM-DD HH24:MI:SS')
+              from (values %s) as p (server_id, n, e, v, r, t, a, instime)
             """
-            )
+            h = rhnSQL.prepare(sql)
             # some fields are not allowed to contain empty string (varchar)
-
-            def lambdaae(a):
-                if a.e == "":
-                    return None
-                else:
-                    return a.e
-
-            package_data = {
-                "sysid": [sysid] * len(alist),
-                "n": [a.n for a in alist],
-                "v": [a.v for a in alist],
-                "r": [a.r for a in alist],
-                "e": list(map(lambdaae, alist)),
-                "a": [a.a for a in alist],
-                "t": [a.t for a in alist],
-                "instime": [self.__expand_installtime(a.installtime) for a in alist],
-            }
+            package_data = [
+                (
+                    sysid,
+                    a.n,
+                    a.e or None,
+                    a.v,
+                    a.r,
+                    a.t,
+                    a.a,
+                    self.__expand_installtime(a.installtime),
+                )
+                for a in alist
+            ]
             try:
-                h.executemany(**package_data)
+                h.execute_values(
+                    sql,
+                    package_data,
+                    template="(%s::numeric, %s::varchar, %s::varchar, %s::varchar,"
+                    " %s::varchar, %s::varchar, %s::varchar, %s::varchar)",
+                    page_size=len(package_data),
+                    fetch=False,
+                )
                 rhnSQL.commit()
             except rhnSQL.SQLSchemaError:
                 e = sys.exc_info()[1]
@@ -311,33 +369,12 @@ class Packages:
         self.__changed = 0
         return 0
 
-    _query_get_package_arches = rhnSQL.Statement(
-        """
-        select id, label
-          from rhnPackageArch
-    """
-    )
-
-    def get_package_arches(self):
-        # None gets automatically converted to empty string
-        package_arches_hash = {None: ""}
-        h = rhnSQL.prepare(self._query_get_package_arches)
-        h.execute()
-        while 1:
-            row = h.fetchone_dict()
-            if not row:
-                break
-            package_arches_hash[row["id"]] = row["label"]
-        return package_arches_hash
-
     def reload_packages_byid(self, sysid):
         """reload the packages list from the database"""
         log_debug(3, sysid)
-        # First, get the package arches
-        package_arches_hash = self.get_package_arches()
+        # The package arch labels come from the process-wide PackageArches
         # XXX we could achieve the same thing with an outer join but that's
         # more expensive
-        # Now load packages
         h = rhnSQL.prepare(
             """
         select
@@ -365,7 +402,8 @@ class Packages:
             t = h.fetchone_dict()
             if not t:
                 break
-            t["arch"] = package_arches_hash[t["package_arch_id"]]
+            # None gets automatically converted to empty string
+            t["arch"] = PackageArches.get_label(t["package_arch_id"]) or ""
             if "installtime" in t and t["installtime"] is not None:
                 t["installtime"] = time.mktime(
                     time.strptime(t["installtime"], "%Y-%m-%d %H:%M:%S")
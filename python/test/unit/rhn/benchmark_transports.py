@@ -0,0 +1,72 @@
+#  pylint: disable=missing-module-docstring
+"""
+Measure the XML-RPC calls per second of rhnlib against a local test server,
+with and without reusing the connections:
+
+    PYTHONPATH=../../.. python3 benchmark_transports.py --calls 1000
+
+With --certfile and --keyfile the server uses HTTPS, the certificate has to
+be issued for 127.0.0.1 by the CA given with --ca.
+"""
+import argparse
+import ssl
+import time
+
+from rhn import rpclib
+
+# pylint: disable-next=import-error
+from test_transports import XMLRPCServer
+
+
+def run(server, args, keep_alive, buffer_size):
+    url = server.url
+    if args.certfile:
+        url = url.replace("http://", "https://")
+    client = rpclib.Server(url)
+    if args.ca:
+        client.add_trusted_cert(args.ca)
+    client.set_buffer_size(buffer_size)
+    # pylint: disable-next=protected-access
+    client._transport.set_keep_alive(keep_alive)
+    payload = "x" * args.payload
+
+    connections = server.connections
+    start = time.monotonic()
+    for i in range(args.calls):
+        client.add(payload, str(i))
+    elapsed = time.monotonic() - start
+    client.close()
+    return elapsed, server.connections - connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--payload", type=int, default=1024, help="bytes per call")
+    parser.add_argument("--buffer-size", type=int, action="append", dest="buffer_sizes")
+    parser.add_argument("--certfile")
+    parser.add_argument("--keyfile")
+    parser.add_argument("--ca")
+    args = parser.parse_args()
+
+    server = XMLRPCServer()
+    if args.certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(args.certfile, args.keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+
+    try:
+        for buffer_size in args.buffer_sizes or [1024, 16384]:
+            for keep_alive in (0, 1):
+                elapsed, connections = run(server, args, keep_alive, buffer_size)
+                print(
+                    f"keep-alive {keep_alive} buffer {buffer_size:6d}:"
+                    f" {args.calls} calls, {connections} connections"
+                    f" in {elapsed:7.3f}s, {args.calls / elapsed:8.1f} calls/s"
+                )
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
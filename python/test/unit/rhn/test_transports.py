@@ -0,0 +1,90 @@
+#  pylint: disable=missing-module-docstring,invalid-name
+import threading
+from socketserver import ThreadingMixIn
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
+import pytest
+
+from rhn import rpclib
+
+
+class RequestHandler(SimpleXMLRPCRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # the headers and the body are sent separately
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        SimpleXMLRPCRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def handle(self):
+        if not self.server.keep_alive:
+            # close the connection after the response without telling the
+            # client, like a server dropping its idle connections
+            self.handle_one_request()
+            return
+        SimpleXMLRPCRequestHandler.handle(self)
+
+
+class XMLRPCServer(ThreadingMixIn, SimpleXMLRPCServer):
+    """HTTP/1.1 XML-RPC server counting the connections of its clients; the
+    connections are handled in threads, so that an idle kept alive connection
+    does not block the others"""
+
+    daemon_threads = True
+
+    def __init__(self, keep_alive=True):
+        SimpleXMLRPCServer.__init__(
+            self, ("127.0.0.1", 0), requestHandler=RequestHandler, logRequests=False
+        )
+        self.keep_alive = keep_alive
+        self.connections = 0
+        self.register_function(lambda a, b: a + b, "add")
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        # pylint: disable-next=consider-using-f-string
+        return "http://%s:%d/RPC2" % self.server_address
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+@pytest.fixture(name="server")
+def fixture_server():
+    server = XMLRPCServer()
+    yield server
+    server.stop()
+
+
+def test_connection_reused(server):
+    client = rpclib.Server(server.url)
+    for i in range(10):
+        assert client.add(i, 1) == i + 1
+    client.close()
+
+    assert server.connections == 1
+
+
+def test_keep_alive_disabled(server):
+    client = rpclib.Server(server.url)
+    # pylint: disable-next=protected-access
+    client._transport.set_keep_alive(0)
+    for i in range(3):
+        assert client.add(i, 1) == i + 1
+    client.close()
+
+    assert server.connections == 3
+
+
+def test_reconnect_when_closed_by_server(server):
+    server.keep_alive = False
+    client = rpclib.Server(server.url)
+    for i in range(3):
+        assert client.add(i, 1) == i + 1
+    client.close()
+
+    assert server.connections == 3
@@ -0,0 +1,72 @@
+#  pylint: disable=missing-module-docstring
+"""
+Measure the cost of reading a configuration option with cfg_component()
+and with cfg_snapshot(), as done for every package of a channel by
+reposync, with the default configuration files of the backend:
+
+    PYTHONPATH=../../../.. python3 benchmark_cfg_snapshot.py --lookups 100000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+
+def setup_config(tmp_dir):
+    """Point rhnConfig to the default configuration files, as test/conftest.py"""
+    # pylint: disable-next=import-outside-toplevel
+    import spacewalk
+
+    defaults_path = os.path.join(tmp_dir, "defaults")
+    os.mkdir(defaults_path)
+    for conf_file in ["rhn.conf", "rhn_server.conf", "rhn_server_satellite.conf"]:
+        shutil.copy(
+            os.path.join(os.path.dirname(spacewalk.__file__), "rhn-conf", conf_file),
+            defaults_path,
+        )
+    with open(os.path.join(tmp_dir, "rhn.conf"), "w", encoding="utf-8") as f:
+        f.write("server.satellite.mount_point = /var/spacewalk\n")
+    os.environ["RHN_CONFIG_PATH"] = tmp_dir
+    os.environ["RHN_CONFIG_DEFAULTS_PATH"] = defaults_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="benchmark-cfg-snapshot-")
+    try:
+        setup_config(tmp_dir)
+        # pylint: disable-next=import-outside-toplevel
+        from spacewalk.common.rhnConfig import cfg_component, cfg_snapshot
+
+        def with_component():
+            with cfg_component("server.satellite") as CFG:
+                return CFG.MOUNT_POINT
+
+        def with_snapshot():
+            return cfg_snapshot("server.satellite").MOUNT_POINT
+
+        assert with_component() == with_snapshot() == "/var/spacewalk"
+        for name, lookup in (
+            ("cfg_component", with_component),
+            ("cfg_snapshot", with_snapshot),
+        ):
+            elapsed = min(
+                timeit.repeat(lookup, number=args.lookups, repeat=args.repeat)
+            )
+            print(
+                f"{name:14s}: {args.lookups} lookups in {elapsed:7.3f}s,"
+                f" {elapsed / args.lookups * 1000000:8.2f} us/lookup"
+            )
+    finally:
+        shutil.rmtree(tmp_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,6 +16,7 @@
 #
 #
 
+import os
 import sys
 import unittest
 from spacewalk.common import rhnCache
@@ -99,6 +100,34 @@ class Tests(unittest.TestCase):
 
         self._cleanup(self.key)
 
+    def test_evicting_cache(self):
+        "Tests evicting the least recently used entries"
+        rhnCache.CACHEDIR = "/tmp/rhn"
+        prefix = "unit-test-evicting"
+        cache = rhnCache.EvictingCache(rhnCache.Cache(), prefix, 3 * 1024)
+        cache.evict()
+        for key in ("a", "b", "c"):
+            self._cleanup(prefix + "/" + key)
+
+        # "a" is the oldest entry, but it is used after "b" was added
+        cache.set(prefix + "/a", "x" * 1024)
+        cache.set(prefix + "/b", "x" * 1024)
+        fname = os.path.join(rhnCache.CACHEDIR, prefix, "b")
+        atime = os.stat(fname).st_atime
+        os.utime(fname, (atime - 10, atime - 10))
+        cache.get(prefix + "/a")
+        cache.set(prefix + "/c", "x" * 1024)
+        self.assertTrue(rhnCache.has_key(prefix + "/b"))
+
+        # over the limit, "b" is the least recently used one
+        cache.set(prefix + "/a", "x" * 1025)
+        self.assertFalse(rhnCache.has_key(prefix + "/b"))
+        self.assertTrue(rhnCache.has_key(prefix + "/a"))
+        self.assertTrue(rhnCache.has_key(prefix + "/c"))
+
+        for key in ("a", "c"):
+            self._cleanup(prefix + "/" + key)
+
     def _cleanup(self, key):
         if rhnCache.has_key(key):
             rhnCache.delete(key)
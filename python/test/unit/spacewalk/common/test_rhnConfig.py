@@ -0,0 +1,85 @@
+#  pylint: disable=missing-module-docstring,invalid-name
+import os
+from unittest.mock import patch
+
+import pytest
+
+from spacewalk.common import rhnConfig
+
+
+@pytest.fixture(name="cfg")
+def fixture_cfg(tmp_path):
+    defaults = tmp_path / "defaults"
+    defaults.mkdir()
+    (defaults / "rhn.conf").write_text("debug = 1\n")
+    (defaults / "rhn_server.conf").write_text("mount_point = /var/spacewalk\n")
+    (defaults / "rhn_server_satellite.conf").write_text("urlgrabber_logspec =\n")
+    conf = tmp_path / "rhn.conf"
+    conf.write_text("server.satellite.urlgrabber_logspec = /var/log/urlgrabber\n")
+
+    cfg = rhnConfig.RHNOptions()
+    rhnConfig.invalidate_cfg_snapshots()
+    with patch.object(rhnConfig, "CFG", cfg), patch.object(
+        rhnConfig, "_CONFIG_DEFAULTS_ROOT", str(defaults)
+    ), patch.object(rhnConfig, "_CONFIG_ROOT", str(tmp_path)), patch.object(
+        rhnConfig, "_CONFIG_FILE", str(conf)
+    ):
+        # the first parse of the file clears the cached configuration
+        for _i in range(2):
+            with rhnConfig.cfg_component("server.satellite"):
+                pass
+        yield cfg
+    rhnConfig.invalidate_cfg_snapshots()
+
+
+def test_snapshot_values(cfg):
+    snapshot = rhnConfig.cfg_snapshot("server.satellite")
+
+    with rhnConfig.cfg_component("server.satellite") as CFG:
+        assert sorted(snapshot.items()) == sorted(
+            (k.lower(), v) for k, v in CFG.items()
+        )
+    assert snapshot.URLGRABBER_LOGSPEC == "/var/log/urlgrabber"
+    assert snapshot["mount_point"] == "/var/spacewalk"
+    assert snapshot.get("DEBUG") == 1
+    assert snapshot.get("unknown", "default") == "default"
+    assert not snapshot.has_key("unknown")
+    with pytest.raises(AttributeError):
+        # pylint: disable-next=pointless-statement
+        snapshot.unknown
+    with pytest.raises(AttributeError):
+        snapshot.debug = 5
+
+    # the component of CFG is not changed by taking a snapshot
+    assert cfg.getComponent() == ()
+    assert rhnConfig.cfg_snapshot("server.satellite") is snapshot
+
+
+def test_snapshot_invalidation(cfg):
+    snapshot = rhnConfig.cfg_snapshot("server")
+    with rhnConfig.cfg_component("server") as CFG:
+        CFG.set("mount_point", "/srv/spacewalk")
+
+    assert snapshot.MOUNT_POINT == "/var/spacewalk"
+    assert rhnConfig.cfg_snapshot("server").MOUNT_POINT == "/srv/spacewalk"
+
+    snapshot = rhnConfig.cfg_snapshot("server")
+    assert rhnConfig.cfg_snapshot("server", max_age=-1) is not snapshot
+
+
+def test_snapshot_hit_does_not_read_configuration(cfg):
+    snapshot = rhnConfig.cfg_snapshot("server.satellite")
+
+    with patch.object(
+        rhnConfig, "initCFG", wraps=rhnConfig.initCFG
+    ) as init_cfg, patch.object(rhnConfig.os, "stat", wraps=os.stat) as stat:
+        for _i in range(100):
+            assert rhnConfig.cfg_snapshot("server.satellite") is snapshot
+        assert not init_cfg.called
+        assert not stat.called
+
+        # unlike cfg_component(), which checks the file on every use
+        with rhnConfig.cfg_component("server.satellite") as CFG:
+            assert CFG.urlgrabber_logspec == snapshot.urlgrabber_logspec
+        assert init_cfg.called
+        assert stat.called
@@ -0,0 +1,260 @@
+#  pylint: disable=missing-module-docstring
+"""
+Measure how long reposync takes to classify the packages of a channel
+against the database, with one rhnPackage.get_info_for_package query per
+package like before and in bulk with RepoSync.classify_packages, on a
+synthetic channel of 100k packages:
+
+    PYTHONPATH=../../../.. python3 benchmark_classify.py --packages 100000 \\
+        --host localhost --dbname test --user postgres
+
+The tables read by the lookups are created with the fixture packages in
+their own schema of the given PostgreSQL database, which is dropped at the
+end. The channel mixes packages already in the channel, packages in the
+database but not in the channel, checksum conflicts and new packages.
+"""
+import argparse
+import collections
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from benchmark_reposync import setup_config
+
+SCHEMA = "benchmark_classify"
+CHANNEL_ID = 1
+
+TABLES = """
+CREATE TABLE rhnPackageName (
+    id NUMERIC PRIMARY KEY,
+    name VARCHAR(256) NOT NULL UNIQUE
+);
+CREATE TABLE rhnPackageEVR (
+    id NUMERIC PRIMARY KEY,
+    epoch VARCHAR(16),
+    version VARCHAR(512) NOT NULL,
+    release VARCHAR(512) NOT NULL
+);
+CREATE UNIQUE INDEX rhn_pe_v_r_e_uq ON rhnPackageEVR (version, release, epoch);
+CREATE TABLE rhnPackageArch (
+    id NUMERIC PRIMARY KEY,
+    label VARCHAR(64) NOT NULL UNIQUE
+);
+CREATE TABLE rhnChecksumView (
+    id NUMERIC PRIMARY KEY,
+    checksum_type VARCHAR(32) NOT NULL,
+    checksum VARCHAR(128) NOT NULL
+);
+CREATE TABLE rhnPackage (
+    id NUMERIC PRIMARY KEY,
+    org_id NUMERIC,
+    name_id NUMERIC NOT NULL,
+    evr_id NUMERIC NOT NULL,
+    package_arch_id NUMERIC NOT NULL,
+    checksum_id NUMERIC NOT NULL,
+    path VARCHAR(1000)
+);
+CREATE INDEX rhn_package_nid_id_idx ON rhnPackage (name_id, id);
+CREATE TABLE rhnChannelPackage (
+    channel_id NUMERIC NOT NULL,
+    package_id NUMERIC NOT NULL
+);
+CREATE UNIQUE INDEX rhn_cp_cp_uq ON rhnChannelPackage (channel_id, package_id);
+CREATE INDEX rhn_cp_pid_idx ON rhnChannelPackage (package_id);
+"""
+
+IN_CHANNEL, UNLINKED, CONFLICT, NEW = range(4)
+# 4 in 10 packages are in the channel, 2 unlinked, 1 with a checksum conflict
+# and 3 new
+KINDS = (IN_CHANNEL,) * 4 + (UNLINKED,) * 2 + (CONFLICT,) + (NEW,) * 3
+
+
+def repo_packages(count):
+    return [
+        SimpleNamespace(
+            name=f"package{i}",
+            version=f"{i % 10}.{i % 7}",
+            release="1",
+            epoch="1" if i % 5 == 0 else "0",
+            arch="noarch" if i % 3 == 0 else "x86_64",
+            checksum=hashlib.sha256(f"package{i}".encode()).hexdigest(),
+            kind=KINDS[i % len(KINDS)],
+        )
+        for i in range(count)
+    ]
+
+
+def create_fixture(cursor, packages):
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"SET search_path TO {SCHEMA}")
+    cursor.execute(TABLES)
+    cursor.execute(
+        "INSERT INTO rhnPackageArch VALUES (1, 'x86_64'), (2, 'noarch'), (3, 'i686')"
+    )
+    evrs = {}
+    names = []
+    rows = []
+    checksums = []
+    channel = []
+    for i, pack in enumerate(packages):
+        names.append((i + 1, pack.name))
+        epoch = None if pack.epoch == "0" else pack.epoch
+        arch_id = 2 if pack.arch == "noarch" else 1
+        # every package has an older release in the database, in the channel
+        versions = [("0", epoch, pack.checksum[::-1], True)]
+        if pack.kind == CONFLICT:
+            versions.append(("1", epoch, pack.checksum[::-1], False))
+        elif pack.kind != NEW:
+            versions.append(("1", epoch, pack.checksum, pack.kind == IN_CHANNEL))
+        for release, epoch, checksum, linked in versions:
+            evr = (pack.version, release, epoch)
+            evr_id = evrs.setdefault(evr, len(evrs) + 1)
+            package_id = len(rows) + 1
+            checksums.append((package_id, "sha256", checksum))
+            rows.append(
+                (
+                    package_id,
+                    i + 1,
+                    evr_id,
+                    arch_id,
+                    package_id,
+                    f"packages/1/{checksum[:3]}/{pack.name}/{pack.arch}.rpm",
+                )
+            )
+            if linked:
+                channel.append((CHANNEL_ID, package_id))
+    execute_values(cursor, "INSERT INTO rhnPackageName VALUES %s", names)
+    execute_values(
+        cursor,
+        "INSERT INTO rhnPackageEVR (id, version, release, epoch) VALUES %s",
+        [(evr_id,) + evr for evr, evr_id in evrs.items()],
+    )
+    execute_values(cursor, "INSERT INTO rhnChecksumView VALUES %s", checksums)
+    execute_values(
+        cursor,
+        "INSERT INTO rhnPackage (id, name_id, evr_id, package_arch_id, checksum_id, path)"
+        " VALUES %s",
+        rows,
+    )
+    execute_values(cursor, "INSERT INTO rhnChannelPackage VALUES %s", channel)
+    cursor.execute("ANALYZE")
+    return len(rows)
+
+
+def classify_per_package(packages):
+    """The former lookup of RepoSync.import_packages"""
+    # pylint: disable-next=import-outside-toplevel
+    from spacewalk.satellite_tools import reposync
+
+    # pylint: disable-next=import-outside-toplevel
+    from spacewalk.server import rhnPackage
+
+    result = []
+    for pack in packages:
+        packs = rhnPackage.get_info_for_package(
+            [pack.name, pack.version, pack.release, pack.epoch, pack.arch],
+            CHANNEL_ID,
+            None,
+        )
+        db_pack = None
+        for p in packs:
+            if p["checksum"] == pack.checksum:
+                db_pack = p
+                break
+        if db_pack is None:
+            status = reposync.PKG_CHECKSUM_CONFLICT if packs else reposync.PKG_NEW
+        elif db_pack["channel_id"] == CHANNEL_ID:
+            status = reposync.PKG_IN_CHANNEL
+        else:
+            status = reposync.PKG_UNLINKED
+        result.append(status)
+    return result
+
+
+def classify_in_bulk(packages):
+    # pylint: disable-next=import-outside-toplevel
+    from spacewalk.satellite_tools import reposync
+
+    repo_sync = SimpleNamespace(chunks=reposync.RepoSync.chunks, org_id=None)
+    return [
+        status
+        for status, _db_pack in reposync.RepoSync.classify_packages(
+            repo_sync, packages, CHANNEL_ID
+        )
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--packages", type=int, default=100000)
+    parser.add_argument("--dbname", default="test")
+    parser.add_argument("--user", default="postgres")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5432)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="benchmark-classify-")
+    # the lookups of rhnSQL read the fixture tables
+    os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"
+    connection = psycopg2.connect(
+        dbname=args.dbname,
+        user=args.user,
+        password=args.password,
+        host=args.host,
+        port=args.port,
+    )
+    try:
+        setup_config(tmp_dir, 1)
+        # pylint: disable-next=import-outside-toplevel
+        from spacewalk.server import rhnSQL
+
+        packages = repo_packages(args.packages)
+        with connection:
+            rows = create_fixture(connection.cursor(), packages)
+        print(f"fixture channel: {len(packages)} packages, {rows} in the database")
+
+        rhnSQL.initDB(
+            backend="postgresql",
+            host=args.host,
+            port=args.port,
+            username=args.user,
+            password=args.password,
+            database=args.dbname,
+        )
+        results = {}
+        for name, classify in (
+            ("per package", classify_per_package),
+            ("bulk", classify_in_bulk),
+        ):
+            start = time.monotonic()
+            results[name] = classify(packages)
+            elapsed = time.monotonic() - start
+            print(
+                f"{name:11s}: {len(packages)} packages in {elapsed:7.3f}s,"
+                f" {len(packages) / elapsed:9.1f} packages/s"
+            )
+        rhnSQL.closeDB()
+        print(
+            "same classification:",
+            results["per package"] == results["bulk"],
+            dict(collections.Counter(results["bulk"])),
+        )
+    finally:
+        with connection:
+            connection.cursor().execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        connection.close()
+        shutil.rmtree(tmp_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
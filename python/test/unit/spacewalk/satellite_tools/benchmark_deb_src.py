@@ -0,0 +1,115 @@
+#  pylint: disable=missing-module-docstring
+"""
+Measure the time and memory needed to parse the Packages index of a Debian
+repository with a synthetic xz compressed index of 100k stanzas:
+
+    PYTHONPATH=../../../.. python3 benchmark_deb_src.py --stanzas 100000
+
+Each parse runs in its own process to report its peak memory usage.
+"""
+import argparse
+import lzma
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from spacewalk.satellite_tools.repo_plugins.deb_src import DebRepo
+
+STANZA = """\
+Package: package{i}
+Architecture: amd64
+Version: 1:{i}.0-1ubuntu1
+Priority: optional
+Section: universe/libs
+Source: source{i}
+Origin: Ubuntu
+Maintainer: Ubuntu Developers <ubuntu-devel-discuss@lists.ubuntu.com>
+Installed-Size: 1234
+Depends: libc6 (>= 2.34), libgcc-s1 (>= 3.0), libstdc++6 (>= 12)
+Filename: pool/universe/p/package{i}/package{i}_{i}.0-1ubuntu1_amd64.deb
+Size: 123456
+MD5sum: {md5}
+SHA1: {sha1}
+SHA256: {sha256}
+SHA512: {sha512}
+Homepage: https://example.com/package{i}
+Description: synthetic package {i}
+ This is the long description of the synthetic package {i}, spread over
+ several lines like in the real Ubuntu archive indexes.
+ .
+ It has several paragraphs as well.
+Task: ubuntu-desktop
+Description-md5: {md5}
+
+"""
+
+
+def create_index(index_dir, stanzas):
+    os.makedirs(index_dir)
+    with lzma.open(os.path.join(index_dir, "Packages.xz"), "wt") as f:
+        for i in range(stanzas):
+            digest = f"{i:08x}" * 16
+            f.write(
+                STANZA.format(
+                    i=i,
+                    md5=digest[:32],
+                    sha1=digest[:40],
+                    sha256=digest[:64],
+                    sha512=digest,
+                )
+            )
+
+
+def parse(url, cache_dir, iterate, conn):
+    repo = DebRepo(url, cache_dir, cache_dir)
+    start = time.monotonic()
+    if iterate:
+        packages = sum(1 for _ in repo.iter_packages())
+    else:
+        packages = len(repo.get_package_list())
+    elapsed = time.monotonic() - start
+    conn.send((packages, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--stanzas", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="benchmark-deb-src-")
+    try:
+        index_dir = os.path.join(tmp_dir, "dists", "stable", "main", "binary-amd64")
+        create_index(index_dir, args.stanzas)
+        cache_dir = os.path.join(tmp_dir, "cache")
+        os.mkdir(cache_dir)
+        url = f"file://{index_dir}/"
+
+        iterations = [("get_package_list", False)]
+        if hasattr(DebRepo, "iter_packages"):
+            iterations.append(("iter_packages", True))
+        for name, iterate in iterations:
+            for _ in range(args.repeat):
+                conn, child_conn = multiprocessing.Pipe(False)
+                process = multiprocessing.Process(
+                    target=parse, args=(url, cache_dir, iterate, child_conn)
+                )
+                process.start()
+                packages, elapsed, maxrss = conn.recv()
+                process.join()
+                print(
+                    f"{name:16s}: {packages} packages in {elapsed:6.3f}s,"
+                    f" {packages / elapsed:9.1f} packages/s,"
+                    f" peak RSS {maxrss / 1024:6.1f} MB"
+                )
+    finally:
+        shutil.rmtree(tmp_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+#  pylint: disable=missing-module-docstring
+"""
+Measure the download throughput of the ThreadedDownloader of reposync
+against a local HTTPS server which answers each request with a delay, with
+the packages spread over several SSL sets like in a sync of channels with
+different repository certificates:
+
+    PYTHONPATH=../../../.. python3 benchmark_download.py \\
+        --ssl-sets 1 --ssl-sets 4 --ssl-sets 16
+
+The SSL sets use copies of the same CA certificate, generated with openssl.
+"""
+import argparse
+import functools
+import hashlib
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+from benchmark_reposync import SlowRequestHandler, setup_config
+
+
+def create_certificate(tmp_dir):
+    cert = os.path.join(tmp_dir, "server.crt")
+    key = os.path.join(tmp_dir, "server.key")
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "rsa:2048",
+            "-nodes",
+            "-days",
+            "1",
+            "-subj",
+            "/CN=localhost",
+            "-addext",
+            "subjectAltName=IP:127.0.0.1",
+            "-keyout",
+            key,
+            "-out",
+            cert,
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return cert, key
+
+
+def create_packages(repo_dir, packages, size):
+    os.makedirs(repo_dir)
+    checksums = {}
+    for package in range(packages):
+        data = os.urandom(size)
+        name = f"package{package}-1.0-1.noarch.rpm"
+        with open(os.path.join(repo_dir, name), "wb") as f:
+            f.write(data)
+        checksums[name] = hashlib.sha256(data).hexdigest()
+    return checksums
+
+
+def download(url, checksums, ca_certs, target_dir):
+    # pylint: disable-next=import-outside-toplevel
+    from spacewalk.satellite_tools.download import ThreadedDownloader
+
+    downloader = ThreadedDownloader()
+    for index, (name, checksum) in enumerate(sorted(checksums.items())):
+        target_file = os.path.join(target_dir, name)
+        downloader.add(
+            {
+                "urls": [url],
+                "relative_path": name,
+                "authtoken": None,
+                "target_file": target_file,
+                "ssl_ca_cert": ca_certs[index * len(ca_certs) // len(checksums)],
+                "ssl_client_cert": None,
+                "ssl_client_key": None,
+                "checksum_type": "sha256",
+                "checksum": checksum,
+                "bytes_range": None,
+                "http_headers": (),
+                "proxies": None,
+                "urlgrabber_logspec": None,
+            }
+        )
+    downloader.run()
+    return len(checksums) - len(downloader.failed_pkgs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--packages", type=int, default=200)
+    parser.add_argument("--size", type=int, default=1024 * 1024)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--threads", type=int, default=5)
+    parser.add_argument("--ssl-sets", type=int, action="append", dest="ssl_sets")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="benchmark-download-")
+    try:
+        setup_config(tmp_dir, args.threads)
+        cert, key = create_certificate(tmp_dir)
+        repo_dir = os.path.join(tmp_dir, "repo")
+        checksums = create_packages(repo_dir, args.packages, args.size)
+
+        server = ThreadingHTTPServer(
+            ("127.0.0.1", 0),
+            functools.partial(
+                SlowRequestHandler, directory=repo_dir, latency=args.latency
+            ),
+        )
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = "https://%s:%d/" % server.server_address
+
+        for ssl_sets in args.ssl_sets or [1, 8]:
+            ca_certs = []
+            for index in range(ssl_sets):
+                ca_cert = os.path.join(tmp_dir, f"ca{index}.crt")
+                shutil.copy(cert, ca_cert)
+                ca_certs.append(ca_cert)
+            target_dir = tempfile.mkdtemp(dir=tmp_dir)
+            start = time.monotonic()
+            downloaded = download(url, checksums, ca_certs, target_dir)
+            elapsed = time.monotonic() - start
+            print(
+                f"SSL sets {ssl_sets:3d}: {downloaded}/{args.packages} packages"
+                f" in {elapsed:7.3f}s, {args.packages / elapsed:7.1f} packages/s,"
+                f" {args.packages * args.size / elapsed / 1024 / 1024:7.1f} MB/s"
+            )
+            shutil.rmtree(target_dir)
+        server.shutdown()
+    finally:
+        shutil.rmtree(tmp_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+#  pylint: disable=missing-module-docstring
+"""
+Measure how long syncing several channels takes with spacewalk-repo-sync
+--parallel, using fixture repositories served by a local HTTP server which
+answers each request with a delay, like a distant mirror:
+
+    PYTHONPATH=../../../.. python3 benchmark_reposync.py --channels 8 \\
+        --parallel 1 --parallel 4 --parallel 8
+
+Each channel downloads the packages of its repository with the
+ThreadedDownloader of reposync, the database import is not part of the
+benchmark.
+"""
+import argparse
+import functools
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SlowRequestHandler(SimpleHTTPRequestHandler):
+    def __init__(self, *args, latency=0, **kwargs):
+        self.latency = latency
+        SimpleHTTPRequestHandler.__init__(self, *args, **kwargs)
+
+    def send_head(self):
+        time.sleep(self.latency)
+        return SimpleHTTPRequestHandler.send_head(self)
+
+    # pylint: disable-next=redefined-builtin
+    def log_message(self, format, *args):
+        pass
+
+
+def setup_config(tmp_dir, download_threads):
+    """Point rhnConfig to the default configuration files, as test/conftest.py"""
+    # pylint: disable-next=import-outside-toplevel
+    import spacewalk
+
+    defaults_path = os.path.join(tmp_dir, "defaults")
+    os.mkdir(defaults_path)
+    for conf_file in ["rhn.conf", "rhn_server.conf", "rhn_server_satellite.conf"]:
+        shutil.copy(
+            os.path.join(os.path.dirname(spacewalk.__file__), "rhn-conf", conf_file),
+            defaults_path,
+        )
+    with open(os.path.join(tmp_dir, "rhn.conf"), "w", encoding="utf-8") as f:
+        f.write(f"reposync_download_threads = {download_threads}\n")
+        # every run downloads all the packages
+        f.write("reposync_download_cache =\n")
+    os.environ["RHN_CONFIG_PATH"] = tmp_dir
+    os.environ["RHN_CONFIG_DEFAULTS_PATH"] = defaults_path
+
+
+def create_repos(repos_dir, channels, packages, size):
+    """Create one directory of random packages per channel, returns the
+    checksums of the packages"""
+    checksums = {}
+    for channel in range(channels):
+        repo_dir = os.path.join(repos_dir, f"repo{channel}")
+        os.makedirs(repo_dir)
+        for package in range(packages):
+            data = os.urandom(size)
+            name = f"package{package}-1.0-1.noarch.rpm"
+            with open(os.path.join(repo_dir, name), "wb") as f:
+                f.write(data)
+            checksums[(f"repo{channel}", name)] = hashlib.sha256(data).hexdigest()
+    return checksums
+
+
+def sync_channel(label, urls, checksums, target_dir):
+    """Download the packages of a channel like RepoSync.import_packages"""
+    # pylint: disable-next=import-outside-toplevel
+    from spacewalk.satellite_tools.download import ThreadedDownloader
+
+    downloader = ThreadedDownloader()
+    for (repo, name), checksum in checksums.items():
+        if repo != label:
+            continue
+        target_file = os.path.join(target_dir, label, checksum, name)
+        os.makedirs(os.path.dirname(target_file))
+        downloader.add(
+            {
+                "urls": urls,
+                "relative_path": name,
+                "authtoken": None,
+                "target_file": target_file,
+                "ssl_ca_cert": None,
+                "ssl_client_cert": None,
+                "ssl_client_key": None,
+                # verified by check_downloads once all channels are synced
+                "checksum_type": None,
+                "checksum": None,
+                "bytes_range": None,
+                "http_headers": (),
+                "proxies": None,
+                "urlgrabber_logspec": None,
+            }
+        )
+    downloader.run()
+    return len(downloader.failed_pkgs)
+
+
+def check_downloads(target_dir, checksums):
+    """Returns the number of downloaded packages with the expected checksum"""
+    valid = 0
+    for (repo, name), checksum in checksums.items():
+        path = os.path.join(target_dir, repo, checksum, name)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                valid += hashlib.sha256(f.read()).hexdigest() == checksum
+    return valid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--channels", type=int, default=8)
+    parser.add_argument("--packages", type=int, default=50)
+    parser.add_argument("--size", type=int, default=64 * 1024)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--threads", type=int, default=5, help="threads per channel")
+    parser.add_argument("--download-threads", type=int, help="global limit")
+    parser.add_argument("--parallel", type=int, action="append", dest="parallels")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="benchmark-reposync-")
+    try:
+        setup_config(tmp_dir, args.threads)
+        # pylint: disable-next=import-outside-toplevel
+        from spacewalk.satellite_tools import reposync
+
+        repos_dir = os.path.join(tmp_dir, "repos")
+        checksums = create_repos(repos_dir, args.channels, args.packages, args.size)
+        server = ThreadingHTTPServer(
+            ("127.0.0.1", 0),
+            functools.partial(
+                SlowRequestHandler, directory=repos_dir, latency=args.latency
+            ),
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = "http://%s:%d" % server.server_address
+        channels = {
+            f"repo{channel}": [f"{base_url}/repo{channel}/"]
+            for channel in range(args.channels)
+        }
+
+        for parallel in args.parallels or [1, args.channels]:
+            target_dir = os.path.join(tmp_dir, f"target{parallel}")
+            start = time.monotonic()
+            ret_codes = reposync.sync_channels(
+                channels,
+                {},
+                lambda label, urls, target_dir=target_dir: sync_channel(
+                    label, urls, checksums, target_dir
+                ),
+                parallel,
+                download_threads=args.download_threads,
+            )
+            elapsed = time.monotonic() - start
+            print(
+                f"parallel {parallel:3d}: {args.channels} channels,"
+                f" {len(checksums)} packages in {elapsed:7.3f}s,"
+                f" {len(checksums) / elapsed:8.1f} packages/s,"
+                f" {args.channels * 60 / elapsed:8.1f} channels/min,"
+                f" failed channels: {sum(1 for c in ret_codes.values() if c)},"
+                f" valid packages: {check_downloads(target_dir, checksums)}"
+            )
+        server.shutdown()
+    finally:
+        shutil.rmtree(tmp_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
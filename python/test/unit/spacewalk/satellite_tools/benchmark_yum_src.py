@@ -0,0 +1,119 @@
+#  pylint: disable=missing-module-docstring
+"""
+Measure how long the yum plugin of reposync takes to resolve the
+dependencies of a filtered sync and to select the latest packages, with a
+synthetic libsolv repository of several versions of 5k packages:
+
+    PYTHONPATH=../../../.. python3 benchmark_yum_src.py --packages 5000 \\
+        --include 'package1?' --include 'package2?'
+
+The repository is built in memory with the solv bindings, no solv file of
+zypper nor metadata download is needed.
+"""
+import argparse
+import hashlib
+import sys
+import time
+from unittest.mock import Mock
+
+import solv
+
+from spacewalk.satellite_tools.repo_plugins.yum_src import ContentSource
+
+
+def create_pool(packages, versions, libraries):
+    """The packages form a binary tree where every package requires a
+    capability of any version of its two children, and one library"""
+    pool = solv.Pool()
+    pool.setarch("x86_64")
+    repo = pool.add_repo("benchmark")
+    data = repo.add_repodata()
+    for i in range(packages + libraries):
+        name = f"package{i}" if i < packages else f"lib{i - packages}"
+        for version in range(versions):
+            s = repo.add_solvable()
+            s.name = name
+            s.evr = f"{version % 3}.{version}.{'10' if version % 2 else '9'}-1"
+            s.arch = "x86_64"
+            s.add_provides(pool.Dep(name))
+            s.add_provides(pool.Dep(f"{name}-capability"))
+            if i < packages:
+                s.add_requires(pool.Dep(f"lib{i % libraries}"))
+                for child in (2 * i + 1, 2 * i + 2):
+                    if child < packages:
+                        s.add_requires(pool.Dep(f"package{child}-capability"))
+            else:
+                s.add_requires(pool.Dep("lib0"))
+            data.set_checksum(
+                s.id,
+                solv.SOLVABLE_CHECKSUM,
+                solv.Chksum(
+                    solv.REPOKEY_TYPE_SHA256,
+                    hashlib.sha256(f"{name}{version}".encode()).hexdigest(),
+                ),
+            )
+    data.internalize()
+    pool.createwhatprovides()
+    return pool, repo
+
+
+def content_source(pool, repo):
+    """A ContentSource listing the solvables of the pool, without setting up
+    a repository"""
+    cs = ContentSource.__new__(ContentSource)
+    cs.repo = Mock(is_configured=True, includepkgs=[], exclude=[])
+    cs.nevra_filter = False
+    cs.num_packages = 0
+    cs.num_excluded = 0
+    cs.solv_pool = pool
+    # pylint: disable-next=protected-access
+    cs._get_solvable_packages = lambda: list(repo.solvables)
+    return cs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--packages", type=int, default=5000)
+    parser.add_argument("--versions", type=int, default=3)
+    parser.add_argument("--libraries", type=int, default=100)
+    parser.add_argument("--include", action="append", dest="includes")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    pool, repo = create_pool(args.packages, args.versions, args.libraries)
+    print(
+        f"fixture repository: {repo.nsolvables} solvables in {time.monotonic() - start:.3f}s"
+    )
+    filters = [
+        ("+", [include]) for include in args.includes or ["package1?", "package2?"]
+    ]
+
+    for _ in range(args.repeat):
+        cs = content_source(pool, repo)
+        # pylint: disable-next=protected-access
+        selected = cs._filter_packages(list(repo.solvables), filters)
+        start = time.monotonic()
+        # pylint: disable-next=protected-access
+        packages = cs._get_solvable_dependencies(selected)
+        elapsed = time.monotonic() - start
+        print(
+            f"dependencies      : {len(packages)} packages from {len(selected)} selected"
+            f" in {elapsed:7.3f}s"
+        )
+
+    for latest in (False, True):
+        for _ in range(args.repeat):
+            cs = content_source(pool, repo)
+            start = time.monotonic()
+            packages = cs.list_packages(list(filters), latest)
+            elapsed = time.monotonic() - start
+            print(
+                f"list latest={str(latest):5s}: {len(packages)} of {cs.num_packages}"
+                f" packages in {elapsed:7.3f}s"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+#  pylint: disable=missing-module-docstring
+import gzip
+import io
+
+from spacewalk.satellite_tools.repo_plugins import deb_src
+
+PACKAGES = """\
+Package: libfoo1
+Architecture: amd64
+Version: 1:2.3.4-1ubuntu0.1
+Filename: pool/main/f/foo/libfoo1_2.3.4-1ubuntu0.1_amd64.deb
+Description: foo library
+ Package: not-a-package
+ .
+ Version: 0.0
+MD5sum: 0123456789abcdef0123456789abcdef
+SHA256: 0123456789abcdef0123456789abcdef0123456789abcdef0123456789abcdef
+
+Package: nofilename
+Architecture: all
+Version: 1.0
+SHA256: fedcba9876543210fedcba9876543210fedcba9876543210fedcba9876543210
+
+Package: bar
+Architecture: all
+Version: 0.9-beta-2
+Filename: pool/main/b/bar/bar_0.9-beta-2_all.deb
+SHA1: 0123456789abcdef0123456789abcdef01234567
+MD5sum: 0123456789abcdef0123456789abcdef"""
+
+
+def test_parse_packages():
+    packages = list(deb_src.parse_packages(io.StringIO(PACKAGES)))
+
+    assert [p.nevra() for p in packages] == [
+        "libfoo1_1:2.3.4-1ubuntu0.1_amd64-deb",
+        "bar_0.9-beta-2_all-deb",
+    ]
+    assert packages[0].checksum_type == "sha256"
+    assert packages[0].relativepath.endswith("_amd64.deb")
+    assert (packages[1].epoch, packages[1].version, packages[1].release) == (
+        "",
+        "0.9-beta",
+        "2",
+    )
+    assert packages[1].checksum_type == "sha1"
+
+
+def test_iter_packages_from_compressed_index(tmp_path):
+    index = tmp_path / "repo" / "dists" / "stable" / "main" / "binary-amd64"
+    index.mkdir(parents=True)
+    with gzip.open(str(index / "Packages.gz"), "wt", encoding="utf8") as f:
+        f.write(PACKAGES + "\n")
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    repo = deb_src.DebRepo(f"file://{index}/", str(cache_dir), str(tmp_path))
+
+    packages = repo.iter_packages()
+    assert next(packages).name == "libfoo1"
+    assert [p.name for p in packages] == ["bar"]
+    assert [p.name for p in repo.get_package_list()] == ["libfoo1", "bar"]
@@ -10,10 +10,18 @@
 # along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import hashlib
+import os
+import threading
+import time
+
 from mock import Mock, patch
 from queue import Queue
 
+from spacewalk.satellite_tools import download
 from spacewalk.satellite_tools.download import (
+    ChecksumCache,
+    DownloadCache,
     DownloadThread,
     ThreadedDownloader,
     PyCurlFileObjectThread,
@@ -43,6 +51,7 @@ def test_reposync_timeout_minrate_are_passed_to_curl():
     CFG.REPOSYNC_TIMEOUT = 42
     CFG.REPOSYNC_MINRATE = 42
     CFG.REPOSYNC_DOWNLOAD_THREADS = 42  # Throws ValueError if not defined
+    CFG.REPOSYNC_DOWNLOAD_CACHE = ""
 
     curl_spy = Mock()
 
@@ -78,6 +87,7 @@ def test_reposync_threaded_downloader_sets_failed_pkgs():
     CFG.REPOSYNC_TIMEOUT = 1
     CFG.REPOSYNC_MINRATE = 1
     CFG.REPOSYNC_DOWNLOAD_THREADS = 1
+    CFG.REPOSYNC_DOWNLOAD_CACHE = ""
 
     curl_spy = Mock()
 
@@ -184,3 +194,255 @@ def test_reposync_download_thread_sets_failed_pkg():
         thread = DownloadThread(parent_mock, queue)
         thread.run()
         assert failed_pkg_name in thread.failed_pkgs
+
+
+@patch("spacewalk.common.rhnConfig.initCFG", Mock())
+def test_reposync_threaded_downloader_staging_limit(tmp_path):
+    downloaded = tmp_path / "package.rpm"
+    downloaded.write_bytes(b"x" * 10)
+
+    # pylint: disable-next=invalid-name
+    CFG = Mock()
+    CFG.REPOSYNC_TIMEOUT = 1
+    CFG.REPOSYNC_MINRATE = 1
+    CFG.REPOSYNC_DOWNLOAD_THREADS = 1
+    CFG.REPOSYNC_DOWNLOAD_CACHE = ""
+
+    done = []
+    with patch("spacewalk.common.rhnConfig.CFG", CFG):
+        td = ThreadedDownloader()
+    td.set_staging_limit(10)
+    td.set_done_callback(lambda success, params: done.append(success))
+
+    assert not td.staging_full()
+    td.file_done(True, {"target_file": str(downloaded)})
+    assert done == [True]
+    assert td.staging_full()
+
+    td.release_staged([str(downloaded)])
+    assert not td.staging_full()
+    assert td.wait_for_staging_space()
+
+
+def _package(path, data):
+    path.write_bytes(data)
+    return hashlib.sha256(data).hexdigest()
+
+
+@patch("spacewalk.satellite_tools.download.log", Mock())
+def test_download_cache_links_cached_packages(tmp_path):
+    cache = DownloadCache(str(tmp_path / "cache"))
+    downloaded = tmp_path / "channel1" / "package.rpm"
+    downloaded.parent.mkdir()
+    checksum = _package(downloaded, b"package data")
+
+    cache.store("sha256", checksum, str(downloaded))
+    cached = cache.path("sha256", checksum)
+    assert os.path.samefile(cached, str(downloaded))
+
+    target = tmp_path / "channel2" / "package.rpm"
+    target.parent.mkdir()
+    assert cache.fetch("sha256", checksum, str(target))
+    assert target.read_bytes() == b"package data"
+    assert not cache.fetch("sha256", "0" * 64, str(tmp_path / "other.rpm"))
+    assert (cache.hits, cache.misses, cache.bytes_saved) == (1, 1, 12)
+
+    # a file corrupted in the cache is removed, not linked
+    os.unlink(cached)
+    (tmp_path / "cache" / "sha256" / checksum[:2] / checksum).write_bytes(b"junk")
+    target.unlink()
+    assert not cache.fetch("sha256", checksum, str(target))
+    assert not os.path.exists(cached)
+    assert not target.exists()
+
+
+def test_checksum_cache_does_not_recompute_checksums(tmp_path):
+    package = tmp_path / "package.rpm"
+    checksum = _package(package, b"package data")
+    checksums = ChecksumCache(str(tmp_path / "checksums.json"))
+
+    with patch.object(
+        download, "getFileChecksum", Mock(wraps=download.getFileChecksum)
+    ) as get_checksum:
+        assert checksums.checksum(str(package), "sha256") == checksum
+        assert checksums.checksum(str(package), "sha256") == checksum
+        assert get_checksum.call_count == 1
+
+        checksums.save()
+        assert ChecksumCache(checksums.filename).get(str(package), "sha256") == checksum
+
+        # a modified file is checksummed again
+        checksum = _package(package, b"new package data")
+        st = os.stat(str(package))
+        os.utime(str(package), ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+        assert checksums.checksum(str(package), "sha256") == checksum
+        assert get_checksum.call_count == 2
+
+
+@patch("spacewalk.satellite_tools.download.log", Mock())
+@patch("spacewalk.satellite_tools.download.log2", Mock())
+@patch(
+    "spacewalk.satellite_tools.download.PyCurlFileObjectThread", Mock(return_value=None)
+)  # fail download
+def test_reposync_download_thread_uses_download_cache(tmp_path):
+    cache = DownloadCache(str(tmp_path / "cache"))
+    cached = tmp_path / "cached.rpm"
+    checksum = _package(cached, b"package data")
+    cache.store("sha256", checksum, str(cached))
+    target = tmp_path / "package.rpm"
+    queue = Queue()
+    for target_file, target_checksum in ((target, checksum), ("failed.rpm", "0" * 64)):
+        queue.put(
+            NoKeyErrorsDict(
+                {
+                    "http_headers": {},
+                    "urls": ["http://example.com"],
+                    "relative_path": os.path.basename(str(target_file)),
+                    "target_file": str(target_file),
+                    "checksum_type": "sha256",
+                    "checksum": target_checksum,
+                }
+            )
+        )
+    parent = Mock()
+    parent.retries = 0
+    parent.force = False
+    parent.cache = cache
+    parent.checksums = cache.checksums
+
+    thread = DownloadThread(parent, queue)
+    thread.run()
+
+    assert thread.failed_pkgs == {"failed.rpm"}
+    assert target.read_bytes() == b"package data"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_download_cache_prune(tmp_path):
+    cache = DownloadCache(str(tmp_path / "cache"), max_size=12)
+    for i, data in enumerate((b"old package", b"new package")):
+        package = tmp_path / f"package{i}.rpm"
+        checksum = _package(package, data)
+        cache.store("sha256", checksum, str(package))
+        os.utime(cache.path("sha256", checksum), (1000 + i, 1000 + i))
+        if i == 0:
+            old = cache.path("sha256", checksum)
+        else:
+            new = cache.path("sha256", checksum)
+    cache.checksums.save()
+
+    # the cached files are still linked to the packages
+    cache.prune()
+    assert os.path.exists(old) and os.path.exists(new)
+
+    os.unlink(str(tmp_path / "package0.rpm"))
+    os.unlink(str(tmp_path / "package1.rpm"))
+    cache.prune()
+    assert not os.path.exists(old)
+    assert os.path.exists(new)
+    assert os.path.exists(cache.checksums.filename)
+
+
+@patch("spacewalk.common.rhnConfig.initCFG", Mock())
+@patch("spacewalk.satellite_tools.download.log", Mock())
+@patch("spacewalk.satellite_tools.download.log2", Mock())
+@patch(
+    "spacewalk.satellite_tools.download.PyCurlFileObjectThread", Mock(return_value=None)
+)  # fail download
+def test_reposync_threaded_downloader_failed_pkgs_of_all_ssl_sets(tmp_path):
+    # pylint: disable-next=invalid-name
+    CFG = Mock()
+    CFG.REPOSYNC_TIMEOUT = 1
+    CFG.REPOSYNC_MINRATE = 1
+    CFG.REPOSYNC_DOWNLOAD_THREADS = 2
+    CFG.REPOSYNC_DOWNLOAD_CACHE = ""
+
+    with patch("spacewalk.common.rhnConfig.CFG", CFG):
+        td = ThreadedDownloader(retries=0, force=True)
+    for name in ("ca1.pem", "ca2.pem", "ca3.pem"):
+        (tmp_path / name).write_text("certificate")
+        td.add(
+            NoKeyErrorsDict(
+                {
+                    "http_headers": {},
+                    "urls": ["http://example.com"],
+                    "target_file": name + ".rpm",
+                    "ssl_ca_cert": str(tmp_path / name),
+                }
+            )
+        )
+    td.run()
+
+    assert len(td.ssl_sets) == 3
+    assert td.failed_pkgs == {"ca1.pem.rpm", "ca2.pem.rpm", "ca3.pem.rpm"}
+
+
+def test_reposync_first_downloads_of_all_ssl_sets_run_alone():
+    running = []
+    overlapping = []
+    lock = threading.Lock()
+
+    def do_perform(_self):
+        with lock:
+            running.append(1)
+            overlapping.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+
+    parent = Mock(first_in_queue_done=set(), first_in_queue_lock=threading.Lock())
+    downloads = []
+    for name in ("ca1.pem", "ca2.pem", "ca3.pem"):
+        fo = PyCurlFileObjectThread.__new__(PyCurlFileObjectThread)
+        fo.parent = parent
+        fo.opts = Mock(ssl_ca_cert=name, ssl_cert=None, ssl_key=None)
+        downloads.append(fo)
+
+    with patch("urlgrabber.grabber.PyCurlFileObject._do_perform", do_perform):
+        # pylint: disable-next=protected-access
+        threads = [threading.Thread(target=fo._do_perform) for fo in downloads]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert overlapping == [1, 1, 1]
+    assert parent.first_in_queue_done == {
+        ("ca1.pem", None, None),
+        ("ca2.pem", None, None),
+        ("ca3.pem", None, None),
+    }
+
+
+def test_reposync_checksum_computed_while_downloading(tmp_path):
+    def do_grab(self):
+        self.fo = open(self.filename, "ab" if self.append else "wb")
+        self._retrieve(b"package ")
+        self._retrieve(b"data")
+        self.fo.close()
+
+    target = tmp_path / "package.rpm"
+    with patch("urlgrabber.grabber.PyCurlFileObject._do_grab", do_grab), patch(
+        "spacewalk.satellite_tools.download.getFileChecksum"
+    ) as get_checksum:
+        fo = PyCurlFileObjectThread(
+            "http://example.com/package.rpm",
+            str(target),
+            URLGrabberOptions(),
+            Mock(),
+            None,
+            checksum_type="sha256",
+        )
+        assert fo.downloaded_checksum() == hashlib.sha256(b"package data").hexdigest()
+
+        # resumed downloads are checksummed from the file
+        fo = PyCurlFileObjectThread(
+            "http://example.com/package.rpm",
+            str(target),
+            URLGrabberOptions(reget="simple"),
+            Mock(),
+            None,
+            checksum_type="sha256",
+        )
+        assert fo.downloaded_checksum() is None
+        get_checksum.assert_not_called()
@@ -34,6 +34,8 @@ from datetime import datetime, timedelta
 from mock import MagicMock, Mock, patch, call
 
 import spacewalk.satellite_tools.reposync
+from spacewalk.common import rhnConfig
+from spacewalk.satellite_tools import syncLib
 from spacewalk.satellite_tools.repo_plugins import ContentPackage
 from spacewalk.satellite_tools.repo_plugins import yum_src
 from spacewalk.server.importlib import importLib
@@ -61,6 +63,9 @@ class RepoSyncTest(unittest.TestCase):
         self.stderr = StringIO()
         sys.stderr = self.stderr
 
+        # configuration snapshots are shared by the whole process
+        rhnConfig.invalidate_cfg_snapshots()
+
         self.reposync.os = Mock()
         self.reposync.rhnSQL.initDB = Mock()
         self.reposync.rhnSQL.commit = Mock()
@@ -103,6 +108,7 @@ class RepoSyncTest(unittest.TestCase):
 
         imp.reload(spacewalk.satellite_tools.reposync)
         imp.reload(spacewalk.satellite_tools.appstreams)
+        rhnConfig.invalidate_cfg_snapshots()
 
     def test_init_succeeds_with_correct_attributes(self):
         rs = _init_reposync(self.reposync, "Label", RTYPE)
@@ -286,6 +292,7 @@ class RepoSyncTest(unittest.TestCase):
         CFG.MOUNT_POINT = "/tmp"
         CFG.PREPENDED_DIR = ""
         CFG.AUTO_GENERATE_BOOTSTRAP_REPO = 1
+        CFG.REPOSYNC_STAGING_MAX_SIZE = 0
         return CFG
 
     def _mock_repo_plugin(self, pkg_list) -> Mock:
@@ -312,6 +319,10 @@ class RepoSyncTest(unittest.TestCase):
     @patch("spacewalk.satellite_tools.reposync.log", Mock())
     @patch("spacewalk.satellite_tools.reposync.ThreadedDownloader")
     @patch("spacewalk.satellite_tools.reposync.multiprocessing.Pool")
+    @patch(
+        "spacewalk.satellite_tools.reposync.rhnPackage.get_info_for_packages",
+        Mock(side_effect=lambda pkgs, *args: [[] for _pkg in pkgs]),
+    )
     def test_import_packages_excludes_failed_pkgs(self, pool, downloader):
         """
         When downloader fails to download a subset of packages
@@ -321,12 +332,21 @@ class RepoSyncTest(unittest.TestCase):
         _mock_rhnsql(self.reposync, [None, []])
 
         fail_pkg_name = "failed.rpm"
-        downloader.return_value.failed_pkgs = [fail_pkg_name]
-
         packs = self._mock_packages_list([fail_pkg_name])
         plugin = self._mock_repo_plugin(packs)
 
-        with patch("spacewalk.common.rhnConfig.CFG", self._mock_cfg()):
+        # the downloader reports the failure through the done callback
+        def start():
+            callback = downloader.return_value.set_done_callback.call_args[0][0]
+            callback(False, {"target_file": packs[0].path})
+
+        downloader.return_value.start.side_effect = start
+        downloader.return_value.is_alive.return_value = False
+
+        cfg = self._mock_cfg()
+        with patch("spacewalk.common.rhnConfig.CFG", cfg), patch(
+            "spacewalk.satellite_tools.reposync.cfg_snapshot", Mock(return_value=cfg)
+        ):
             rs.import_packages(plugin, None, "unused-url-string", None)
 
         # repository plugin returned 1 package that failed to download
@@ -334,6 +354,43 @@ class RepoSyncTest(unittest.TestCase):
         apply_async_mock = pool.return_value.__enter__.return_value.apply_async
         self.assertFalse(apply_async_mock.called)
 
+    @patch("spacewalk.satellite_tools.reposync.log2disk", Mock())
+    def test_classify_packages(self):
+        """
+        Packages are classified against the DB content with one lookup per batch
+        """
+        rs = _init_reposync(self.reposync)
+        packs = self._mock_packages_list(
+            ["in-channel.rpm", "unlinked.rpm", "conflict.rpm", "new.rpm"]
+        )
+        for pack, checksum in zip(packs, ["c1", "c2", "c3", "c4"]):
+            pack.checksum = checksum
+        db_rows = [
+            [{"checksum": "c1", "channel_id": 1}],
+            [{"checksum": "c2", "channel_id": None}],
+            [{"checksum": "other", "channel_id": 1}],
+            [],
+        ]
+
+        with patch(
+            "spacewalk.satellite_tools.reposync.rhnPackage.get_info_for_packages",
+            Mock(return_value=db_rows),
+        ) as get_info:
+            classified = rs.classify_packages(packs, 1)
+
+        self.assertEqual(get_info.call_count, 1)
+        self.assertEqual(
+            [status for status, db_pack in classified],
+            [
+                self.reposync.PKG_IN_CHANNEL,
+                self.reposync.PKG_UNLINKED,
+                self.reposync.PKG_CHECKSUM_CONFLICT,
+                self.reposync.PKG_NEW,
+            ],
+        )
+        self.assertEqual(classified[0][1], db_rows[0][0])
+        self.assertIsNone(classified[3][1])
+
     @patch("spacewalk.common.rhnConfig.initCFG", Mock())
     def test_sync_raises_channel_timeout(self):
         rs = self._create_mocked_reposync()
@@ -1139,6 +1196,9 @@ class RunScriptTest(unittest.TestCase):
                             channel_label=[],
                             parent_label=None,
                             batch_size=None,
+                            parallel=1,
+                            download_threads=None,
+                            import_workers=None,
                         ),
                         [],
                     ]
@@ -1180,6 +1240,25 @@ class RunScriptTest(unittest.TestCase):
         self.repo_sync.main()
         self.assertEqual(self.repo_sync.reposync.RepoSync.call_count, 2)
 
+    def test_parallel_channels(self):
+        self.repo_sync.CFG = Mock()
+        self.repo_sync.CFG.DEBUG = 3
+        options = self.repo_sync.OptionParser.return_value.parse_args.return_value[0]
+        options.parallel = 2
+        options.download_threads = 10
+        self.repo_sync.reposync.getParentsChilds.return_value = {"chann_1": ["chann_2"]}
+        self.repo_sync.reposync.sync_channels.return_value = {
+            "chann_1": 0,
+            "chann_2": 2,
+        }
+        self.assertEqual(self.repo_sync.main(), 2)
+        self.repo_sync.reposync.RepoSync.assert_not_called()
+        args, kwargs = self.repo_sync.reposync.sync_channels.call_args
+        self.assertEqual(list(args[0]), ["chann_1", "chann_2"])
+        self.assertEqual(args[1], {"chann_2": "chann_1"})
+        self.assertEqual(args[3], 2)
+        self.assertEqual(kwargs["download_threads"], 10)
+
 
 @patch("spacewalk.common.rhnConfig.initCFG", Mock())
 def test_channel_exceptions():
@@ -1392,3 +1471,71 @@ def test_ksdirhtmlparser():
     parser = spacewalk.satellite_tools.reposync.KSDirHtmlParser(plugin, "foobar")
 
     assert all([a == b for a, b in zip(parser.dir_content, EXPECTATIONS)])
+
+
+def _record_sync(tmp_path, label, ret_code):
+    # runs in the forked channel process
+    (tmp_path / (label + ".start")).write_text(str(time.time()))
+    time.sleep(0.3)
+    (tmp_path / (label + ".end")).write_text(str(time.time()))
+    if ret_code is SystemExit:
+        sys.exit(4)
+    return ret_code
+
+
+def _log_sync(label):
+    # runs in the forked channel process
+    syncLib.appendEMAIL_LOG(f"{label} synced\n")
+    return 0
+
+
+@patch("spacewalk.satellite_tools.reposync.log", Mock())
+def test_sync_channels_email_log():
+    syncLib.initEMAIL_LOG(reinit=1)
+    try:
+        syncLib.appendEMAIL_LOG("parent-header\n")
+        spacewalk.satellite_tools.reposync.sync_channels(
+            {"a": [], "b": [], "c": []},
+            {},
+            lambda label, urls: _log_sync(label),
+            3,
+        )
+        lines = syncLib.dumpEMAIL_LOG().splitlines()
+    finally:
+        syncLib.EMAIL_LOG = None
+
+    # every line is logged once, whatever the order of completion
+    assert lines[0] == "parent-header"
+    assert sorted(lines[1:]) == ["a synced", "b synced", "c synced"]
+
+
+@patch("spacewalk.satellite_tools.reposync.log", Mock())
+def test_sync_channels(tmp_path):
+    ret_codes = {"parent": 0, "child": 0, "other": 3, "exit": SystemExit}
+    channels = {label: [] for label in ret_codes}
+
+    result = spacewalk.satellite_tools.reposync.sync_channels(
+        channels,
+        {"child": "parent"},
+        lambda label, urls: _record_sync(tmp_path, label, ret_codes[label]),
+        2,
+        download_threads=4,
+        import_workers=2,
+    )
+
+    assert result == {"parent": 0, "child": 0, "other": 3, "exit": 4}
+    times = {
+        label: (
+            float((tmp_path / (label + ".start")).read_text()),
+            float((tmp_path / (label + ".end")).read_text()),
+        )
+        for label in channels
+    }
+    # the child channel waits for its parent
+    assert times["child"][0] >= times["parent"][1]
+    # never more than 2 channels at the same time
+    for label, (start, _end) in times.items():
+        running = [s for s, e in times.values() if s <= start < e]
+        assert len(running) <= 2, label
+    # the limits are reset for the next sync
+    assert spacewalk.satellite_tools.reposync.import_slots is None
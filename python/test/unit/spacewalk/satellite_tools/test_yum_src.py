@@ -209,6 +209,92 @@ class YumSrcTest(unittest.TestCase):
             1,
         )
 
+    def test_get_solvable_dependencies(self):
+        cs = self._make_dummy_cs()
+
+        Dep = namedtuple("Dep", ["id"])
+
+        class SolvableMock:
+            def __init__(self, name, requires):
+                self.name = name
+                self.requires = [Dep(req) for req in requires]
+
+            # pylint: disable-next=unused-argument
+            def lookup_deparray(self, keyname):
+                return self.requires
+
+        solvables = {
+            "app": SolvableMock("app", ["lib1", "lib2"]),
+            "lib1": SolvableMock("lib1", ["libc"]),
+            "lib2": SolvableMock("lib2", ["libc", "lib1"]),
+            "libc": SolvableMock("libc", ["libc"]),
+            "unrelated": SolvableMock("unrelated", ["libc"]),
+        }
+        cs.solv_pool = Mock()
+        cs.solv_pool.whatprovides = Mock(side_effect=lambda dep: [solvables[dep.id]])
+
+        selected = [solvables["app"]]
+        # pylint: disable-next=protected-access
+        pkglist = cs._get_solvable_dependencies(selected)
+
+        self.assertEqual(
+            sorted(p.name for p in pkglist), ["app", "lib1", "lib2", "libc"]
+        )
+        # the providers of every requirement are looked up only once
+        self.assertEqual(cs.solv_pool.whatprovides.call_count, 3)
+        self.assertEqual(selected, [solvables["app"]])
+
+    def test_list_packages_latest(self):
+        cs = self._make_dummy_cs()
+
+        # newest last, in rpm order
+        evrs = ["1.0~rc1-1", "1.0-1", "1.0-2", "1.0-10", "1.0a-1", "1:0.9-1"]
+
+        class SolvableMock:
+            def __init__(self, name, evr, arch):
+                self.name = name
+                self.evr = evr
+                self.arch = arch
+
+            def evrcmp(self, other):
+                return evrs.index(self.evr) - evrs.index(other.evr)
+
+            # pylint: disable-next=unused-argument
+            def lookup_checksum(self, x):
+                return Mock()
+
+            def lookup_num(self, x):
+                pass
+
+            def lookup_location(self):
+                return ["foobar"]
+
+            def __str__(self):
+                return f"{self.name}-{self.evr}.{self.arch}"
+
+        # pylint: disable-next=protected-access
+        cs._get_solvable_packages = MagicMock(
+            side_effect=lambda: [
+                SolvableMock("pkg1", evr, arch)
+                for evr in ("1.0-2", "1.0-10", "1.0~rc1-1", "1.0-1")
+                for arch in ("x86_64", "noarch")
+            ]
+            + [SolvableMock("pkg2", evr, "x86_64") for evr in ("1:0.9-1", "1.0a-1")]
+        )
+
+        listed_packages = cs.list_packages(filters=None, latest=True)
+
+        self.assertEqual(
+            sorted(
+                (p.name, p.arch, p.epoch, p.version, p.release) for p in listed_packages
+            ),
+            [
+                ("pkg1", "noarch", "", "1.0", "10"),
+                ("pkg1", "x86_64", "", "1.0", "10"),
+                ("pkg2", "x86_64", "1", "0.9", "1"),
+            ],
+        )
+
     @unittest.skip
     def test_list_packages_with_pack(self):
 
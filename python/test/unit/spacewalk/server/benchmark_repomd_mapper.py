@@ -0,0 +1,294 @@
+#  pylint: disable=missing-module-docstring
+"""
+Measure how long the repomd generation takes to load the packages of a
+channel with SqlPackageMapper, which runs several queries per package, and
+with SqlBulkPackageMapper, which loads pages of packages at once, on a
+fixture channel of 10k packages:
+
+    PYTHONPATH=../../../.. python3 benchmark_repomd_mapper.py \\
+        --packages 10000 --host localhost --dbname test --user postgres
+
+The tables read by the mappers are created with the fixture packages in
+their own schema of the given PostgreSQL database, which is dropped at the
+end.
+"""
+import argparse
+import datetime
+import hashlib
+import os
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+SCHEMA = "benchmark_repomd_mapper"
+
+PRCO_TABLES = (
+    "rhnPackageProvides",
+    "rhnPackageRequires",
+    "rhnPackageRecommends",
+    "rhnPackageSupplements",
+    "rhnPackageEnhances",
+    "rhnPackageSuggests",
+    "rhnPackageConflicts",
+    "rhnPackageObsoletes",
+    "rhnPackageBreaks",
+    "rhnPackagePredepends",
+)
+
+# the text columns read through mapper.string_to_unicode() are BYTEA, returned
+# as bytes like in the unit tests of the mappers
+BYTEA = psycopg2.extensions.new_type(
+    psycopg2.BINARY.values,
+    "BYTEA",
+    lambda value, cursor: (
+        None if value is None else psycopg2.BINARY(value, cursor).tobytes()
+    ),
+)
+
+TABLES = """
+CREATE TABLE rhnPackageName (id NUMERIC PRIMARY KEY, name VARCHAR(256));
+CREATE TABLE rhnPackageEVR (
+    id NUMERIC PRIMARY KEY,
+    epoch VARCHAR(16),
+    version VARCHAR(512),
+    release VARCHAR(512)
+);
+CREATE TABLE rhnPackageArch (id NUMERIC PRIMARY KEY, label VARCHAR(64));
+CREATE TABLE rhnPackageGroup (id NUMERIC PRIMARY KEY, name VARCHAR(100));
+CREATE TABLE rhnSourceRPM (id NUMERIC PRIMARY KEY, name VARCHAR(128));
+CREATE TABLE rhnChecksumView (
+    id NUMERIC PRIMARY KEY,
+    checksum_type VARCHAR(32),
+    checksum VARCHAR(128)
+);
+CREATE TABLE rhnPackage (
+    id NUMERIC PRIMARY KEY,
+    name_id NUMERIC,
+    evr_id NUMERIC,
+    package_arch_id NUMERIC,
+    package_group NUMERIC,
+    source_rpm_id NUMERIC,
+    checksum_id NUMERIC,
+    summary BYTEA,
+    description BYTEA,
+    vendor BYTEA,
+    build_time TIMESTAMPTZ,
+    package_size NUMERIC,
+    payload_size NUMERIC,
+    installed_size NUMERIC,
+    header_start NUMERIC,
+    header_end NUMERIC,
+    build_host VARCHAR(256),
+    copyright BYTEA,
+    path VARCHAR(1000),
+    last_modified TIMESTAMPTZ
+);
+CREATE TABLE rhnPackageCapability (
+    id NUMERIC PRIMARY KEY,
+    name BYTEA,
+    version VARCHAR(64)
+);
+CREATE TABLE rhnPackageFile (package_id NUMERIC, capability_id NUMERIC);
+CREATE INDEX rhn_package_file_pid_idx ON rhnPackageFile (package_id);
+CREATE TABLE rhnPackageChangelog (
+    package_id NUMERIC,
+    name BYTEA,
+    text BYTEA,
+    time TIMESTAMPTZ
+);
+CREATE INDEX rhn_pkg_cl_pid_idx ON rhnPackageChangelog (package_id);
+""" + "".join(
+    f"""
+CREATE TABLE {table} (package_id NUMERIC, capability_id NUMERIC, sense NUMERIC);
+CREATE INDEX {table}_pid_idx ON {table} (package_id);
+"""
+    for table in PRCO_TABLES
+)
+
+BUILD_TIME = datetime.datetime(2024, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc)
+
+
+def create_fixture(cursor, packages, files, requires, changelogs, libraries):
+    """Every package provides itself and a library, requires libraries of
+    the other packages and has files and changelog entries"""
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"SET search_path TO {SCHEMA}")
+    cursor.execute(TABLES)
+    cursor.execute("INSERT INTO rhnPackageArch VALUES (1, 'x86_64'), (2, 'noarch')")
+    cursor.execute("INSERT INTO rhnPackageEVR VALUES (1, NULL, '1.0', '1')")
+    cursor.execute(
+        "INSERT INTO rhnPackageGroup VALUES (1, 'System/Libraries'), (2, 'Tools')"
+    )
+    capabilities = [
+        (i + 1, f"lib{i}.so.1()(64bit)".encode(), None) for i in range(libraries)
+    ]
+    rows = {
+        "rhnPackageName": [],
+        "rhnSourceRPM": [],
+        "rhnChecksumView": [],
+        "rhnPackage": [],
+        "rhnPackageFile": [],
+        "rhnPackageChangelog": [],
+        "rhnPackageProvides": [],
+        "rhnPackageRequires": [],
+    }
+    for package_id in range(1, packages + 1):
+        name = f"package{package_id}"
+        checksum = hashlib.sha256(name.encode()).hexdigest()
+        rows["rhnPackageName"].append((package_id, name))
+        rows["rhnSourceRPM"].append((package_id, f"{name}-1.0-1.src.rpm"))
+        rows["rhnChecksumView"].append((package_id, "sha256", checksum))
+        rows["rhnPackage"].append(
+            (
+                package_id,
+                package_id,
+                1,
+                package_id % 2 + 1,
+                package_id % 2 + 1,
+                package_id,
+                package_id,
+                f"{name} summary".encode(),
+                f"The {name} package.\n".encode() * 5,
+                b"openSUSE",
+                BUILD_TIME,
+                123456,
+                234567,
+                345678,
+                1384,
+                12345,
+                "build.example.com",
+                b"GPL-2.0-or-later",
+                f"packages/1/{checksum[:3]}/{name}/1.0-1/x86_64/{checksum}/{name}.rpm",
+                BUILD_TIME,
+            )
+        )
+        capabilities.append((len(capabilities) + 1, name.encode(), "1.0-1"))
+        rows["rhnPackageProvides"].append((package_id, len(capabilities), 8))
+        rows["rhnPackageProvides"].append((package_id, package_id % libraries + 1, 0))
+        for i in range(requires):
+            rows["rhnPackageRequires"].append(
+                (package_id, (package_id * 7 + i) % libraries + 1, 0)
+            )
+        for i in range(files):
+            capabilities.append(
+                (len(capabilities) + 1, f"/usr/share/{name}/{i}".encode(), None)
+            )
+            rows["rhnPackageFile"].append((package_id, len(capabilities)))
+        for i in range(changelogs):
+            rows["rhnPackageChangelog"].append(
+                (
+                    package_id,
+                    b"Packager <packager@example.com>",
+                    f"- update to version 1.{i}".encode(),
+                    BUILD_TIME - datetime.timedelta(days=i),
+                )
+            )
+    execute_values(cursor, "INSERT INTO rhnPackageCapability VALUES %s", capabilities)
+    for table, values in rows.items():
+        if table == "rhnPackage":
+            query = (
+                "INSERT INTO rhnPackage (id, name_id, evr_id, package_arch_id,"
+                " package_group, source_rpm_id, checksum_id, summary, description,"
+                " vendor, build_time, package_size, payload_size, installed_size,"
+                " header_start, header_end, build_host, copyright, path,"
+                " last_modified) VALUES %s"
+            )
+        else:
+            query = f"INSERT INTO {table} VALUES %s"
+        execute_values(cursor, query, values)
+    cursor.execute("ANALYZE")
+
+
+def describe(package):
+    """The attributes of a domain.Package, independent of the order of the
+    rows returned by the database"""
+    return {
+        key: sorted(map(repr, value)) if isinstance(value, list) else value
+        for key, value in vars(package).items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--packages", type=int, default=10000)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--requires", type=int, default=8)
+    parser.add_argument("--changelogs", type=int, default=5)
+    parser.add_argument("--libraries", type=int, default=500)
+    parser.add_argument("--dbname", default="test")
+    parser.add_argument("--user", default="postgres")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5432)
+    args = parser.parse_args()
+
+    # the queries of the mappers read the fixture tables
+    os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"
+    psycopg2.extensions.register_type(BYTEA)
+    connection = psycopg2.connect(
+        dbname=args.dbname,
+        user=args.user,
+        password=args.password,
+        host=args.host,
+        port=args.port,
+    )
+    try:
+        with connection:
+            create_fixture(
+                connection.cursor(),
+                args.packages,
+                args.files,
+                args.requires,
+                args.changelogs,
+                args.libraries,
+            )
+        # pylint: disable-next=import-outside-toplevel
+        from spacewalk.server import rhnSQL
+
+        # pylint: disable-next=import-outside-toplevel
+        from spacewalk.server.repomd import mapper
+
+        rhnSQL.initDB(
+            backend="postgresql",
+            host=args.host,
+            port=args.port,
+            username=args.user,
+            password=args.password,
+            database=args.dbname,
+        )
+        package_ids = list(range(1, args.packages + 1))
+        results = {}
+        for name, load in (
+            (
+                "SqlPackageMapper",
+                lambda m: [m.get_package(package_id) for package_id in package_ids],
+            ),
+            ("SqlBulkPackageMapper", lambda m: list(m.get_packages(package_ids))),
+        ):
+            pkg_mapper = getattr(mapper, name)()
+            start = time.monotonic()
+            packages = load(pkg_mapper)
+            elapsed = time.monotonic() - start
+            results[name] = [describe(package) for package in packages]
+            print(
+                f"{name:20s}: {len(packages)} packages in {elapsed:7.3f}s,"
+                f" {len(packages) / elapsed:8.1f} packages/s"
+            )
+        print(
+            "same packages:",
+            results["SqlPackageMapper"] == results["SqlBulkPackageMapper"],
+        )
+    finally:
+        if "rhnSQL" in locals():
+            rhnSQL.closeDB()
+        with connection:
+            connection.cursor().execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        connection.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+#  pylint: disable=missing-module-docstring,invalid-name
+from unittest.mock import MagicMock
+
+import pytest
+
+from spacewalk.server.importlib.backend import Backend
+
+
+PAGE_SIZE = 1000
+
+
+class _Database:
+    """Tables of the lookups, answering the set-based queries of the backend
+    one VALUES page at a time like psycopg2.extras.execute_values."""
+
+    def __init__(self):
+        self.evrs = {}
+        self.checksum_types = {"md5": 1, "sha1": 2, "sha256": 3}
+        self.nevras = {}
+        self.packages = {}
+        self.inserted = []
+        self.queries = []
+        self.next_id = 100
+
+    def _insert(self, table, key):
+        if key not in table:
+            table[key] = self.next_id
+            self.next_id += 1
+            self.inserted.append(key)
+
+    def _run(self, query, page):
+        if "INSERT INTO rhnPackageEVR" in query:
+            for _ordering, *key in page:
+                self._insert(self.evrs, tuple(key))
+            return []
+        if "JOIN rhnPackageEVR" in query:
+            return [
+                (row[0], self.evrs[tuple(row[1:])])
+                for row in page
+                if tuple(row[1:]) in self.evrs
+            ]
+        if "rhnChecksumType" in query:
+            return [
+                (label, self.checksum_types[label])
+                for (label,) in page
+                if label in self.checksum_types
+            ]
+        if "INSERT INTO rhnPackageNEVRA" in query:
+            for _ordering, *key in page:
+                self._insert(self.nevras, tuple(key))
+            return []
+        if "rhnPackageNEVRA.id" in query:
+            return [
+                (row[0], self.nevras[tuple(row[1:])])
+                for row in page
+                if tuple(row[1:]) in self.nevras
+            ]
+        if "rhnPackage.id" in query:
+            return [
+                (row[0], min(self.packages[tuple(row[1:])]))
+                for row in page
+                if tuple(row[1:]) in self.packages
+            ]
+        raise AssertionError(query)
+
+    # pylint: disable-next=unused-argument
+    def execute_values(
+        self, query, argslist, template=None, page_size=PAGE_SIZE, fetch=True
+    ):
+        result = []
+        for i in range(0, len(argslist), page_size):
+            page = argslist[i : i + page_size]
+            self.queries.append((query, len(page)))
+            result.extend(self._run(query, page))
+        return result if fetch else None
+
+
+@pytest.fixture(name="database")
+def fixture_database():
+    return _Database()
+
+
+@pytest.fixture(name="backend")
+def fixture_backend(database):
+    db_mock = MagicMock()
+    db_mock.execute_values = MagicMock(side_effect=database.execute_values)
+    dbmodule = MagicMock()
+    dbmodule.prepare = MagicMock(return_value=db_mock)
+    return Backend(dbmodule)
+
+
+def test_lookup_evrs(backend, database):
+    database.evrs[(None, "1.0", "1", "rpm")] = 1
+    database.evrs[("2", "1.0", "1", "rpm")] = 2
+    evrHash = {
+        ("", "1.0", "1"): None,
+        (None, "1.0", "1"): None,
+        ("2", "1.0", "1"): None,
+        (None, "1.1", "1"): None,
+        ("", "1.1", "1"): None,
+        (1, "1.0", "1"): None,
+    }
+
+    backend.lookupEVRs(evrHash, "rpm")
+
+    # empty and NULL epochs are the same EVR
+    assert evrHash[("", "1.0", "1")] == evrHash[(None, "1.0", "1")] == 1
+    assert evrHash[("2", "1.0", "1")] == 2
+    assert evrHash[(None, "1.1", "1")] == evrHash[("", "1.1", "1")]
+    assert evrHash[(1, "1.0", "1")] == database.evrs[("1", "1.0", "1", "rpm")]
+    # only the missing EVRs are inserted, once
+    assert database.inserted == [(None, "1.1", "1", "rpm"), ("1", "1.0", "1", "rpm")]
+    assert len(set(evrHash.values())) == 4
+
+
+def test_lookup_evrs_by_type(backend, database):
+    database.evrs[(None, "1.0", "1", "rpm")] = 1
+    evrHash = {(None, "1.0", "1"): None}
+
+    backend.lookupEVRs(evrHash, "deb")
+
+    assert evrHash[(None, "1.0", "1")] != 1
+    assert database.inserted == [(None, "1.0", "1", "deb")]
+
+
+def test_lookup_checksum_types(backend):
+    checksumTypeHash = {"sha256": None, "md5": None, "unknown": None}
+
+    backend.lookupChecksumTypes(checksumTypeHash)
+
+    assert checksumTypeHash == {"sha256": 3, "md5": 1, "unknown": None}
+
+
+def test_lookup_package_nevras(backend, database):
+    database.nevras[(1, 10, 100)] = 1000
+    database.nevras[(2, 10, None)] = 1001
+    nevraHash = {
+        (1, 10, 100): None,
+        (2, 10, ""): None,
+        (3, 10, 100): None,
+        (3, 11, ""): None,
+    }
+
+    backend.lookupPackageNEVRAs(nevraHash)
+
+    assert nevraHash[(1, 10, 100)] == 1000
+    # an empty arch is a NULL package_arch_id
+    assert nevraHash[(2, 10, "")] == 1001
+    assert nevraHash[(3, 10, 100)] == database.nevras[(3, 10, 100)]
+    assert nevraHash[(3, 11, "")] == database.nevras[(3, 11, None)]
+    assert database.inserted == [(3, 10, 100), (3, 11, None)]
+
+
+def test_lookup_packages_by_nevra(backend, database):
+    database.packages[(1, 10, 100)] = [5, 3]
+    database.packages[(2, 10, 100)] = [7]
+    nevraHash = {(1, 10, 100): None, (2, 10, 100): None, (3, 10, 100): None}
+
+    backend.lookupPackagesByNEVRA(nevraHash)
+
+    # the lowest id of the packages with the NEVRA, nothing for unknown ones
+    assert nevraHash == {(1, 10, 100): 3, (2, 10, 100): 7, (3, 10, 100): None}
+    assert not database.inserted
+
+
+def test_lookup_empty(backend, database):
+    backend.lookupEVRs({}, "rpm")
+    backend.lookupChecksumTypes({})
+    backend.lookupPackageNEVRAs({})
+    backend.lookupPackagesByNEVRA({})
+
+    assert not database.queries
+
+
+def test_lookups_query_per_page(backend, database):
+    count = PAGE_SIZE + 1
+    evrHash = {(None, "1.0", str(i)): None for i in range(count)}
+    nevraHash = {(i, 10, 100): None for i in range(count)}
+
+    backend.lookupEVRs(evrHash, "rpm")
+    backend.lookupPackageNEVRAs(nevraHash)
+    backend.lookupPackagesByNEVRA(dict.fromkeys(nevraHash))
+    backend.lookupChecksumTypes({"sha256": None})
+
+    # an INSERT and a SELECT per page of EVRs and NEVRAs, a SELECT per page of
+    # packages and checksum types, no query per row
+    assert [size for _query, size in database.queries] == [
+        PAGE_SIZE,
+        1,
+        PAGE_SIZE,
+        1,
+        PAGE_SIZE,
+        1,
+        PAGE_SIZE,
+        1,
+        PAGE_SIZE,
+        1,
+        1,
+    ]
+    assert not backend.dbmodule.prepare.return_value.execute.called
+    assert None not in evrHash.values()
+    assert None not in nevraHash.values()
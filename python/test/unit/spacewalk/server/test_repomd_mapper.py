@@ -0,0 +1,126 @@
+#  pylint: disable=missing-module-docstring,invalid-name
+import datetime
+from unittest.mock import MagicMock, patch
+
+from spacewalk.server.repomd import mapper
+
+
+BUILD_TIME = datetime.datetime(2024, 1, 2, 3, 4, 5)
+
+
+def _details_row(package_id):
+    name = "pkg%d" % package_id
+    return (
+        package_id,
+        name,
+        "1.0",
+        "1",
+        None,
+        "x86_64",
+        "abc%d" % package_id,
+        b"summary",
+        b"description",
+        b"vendor",
+        BUILD_TIME,
+        100,
+        200,
+        300,
+        1,
+        2,
+        "group",
+        "buildhost",
+        b"GPL",
+        "packages/%s-1.0-1.x86_64.rpm" % name,
+        "%s-1.0-1.src.rpm" % name,
+        BUILD_TIME,
+        "sha256",
+    )
+
+
+def _mock_db(package_ids):
+    """Mocked rhnSQL cursor answering the bulk queries for package_ids."""
+    queries = []
+
+    def execute_values(query, argslist, **_kwargs):
+        queries.append(query)
+        wanted = [row[0] for row in argslist if row[0] in package_ids]
+        if "rhnPackageChangelog" in query:
+            return [(pid, b"author", b"text", BUILD_TIME) for pid in wanted]
+        if "rhnPackageFile" in query:
+            return [(pid, b"/usr/bin/pkg%d" % pid) for pid in wanted]
+        if "rhnPackageProvides" in query:
+            return [(pid, "provides", 8, b"pkg%d" % pid, "1.0-1") for pid in wanted]
+        if "rhnPackageGroup" in query:
+            return [_details_row(pid) for pid in reversed(wanted)]
+        return [(pid, "20240102030405") for pid in wanted]
+
+    db_mock = MagicMock()
+    db_mock.execute_values = MagicMock(side_effect=execute_values)
+    return db_mock, queries
+
+
+def test_bulk_mapper_get_packages():
+    db_mock, queries = _mock_db([1, 2, 4])
+    with patch(
+        "spacewalk.server.repomd.mapper.rhnSQL.prepare",
+        MagicMock(return_value=db_mock),
+    ):
+        pkg_mapper = mapper.SqlBulkPackageMapper()
+        packages = list(pkg_mapper.get_packages([4, 3, 2, 1]))
+
+    # package 3 does not exist anymore and is skipped, order is preserved
+    assert [package.id for package in packages] == [4, 2, 1]
+    # one query for details, dependencies, files and changelogs
+    assert len(queries) == 4
+
+    package = packages[0]
+    assert package.name == "pkg4"
+    assert package.filename == "pkg4-1.0-1.x86_64.rpm"
+    assert package.files == [b"/usr/bin/pkg4"]
+    assert package.provides == [
+        {"name": b"pkg4", "flag": "EQ", "version": "1.0", "release": "1", "epoch": 0}
+    ]
+    assert package.changelog[0]["author"] == b"author"
+
+
+def test_bulk_mapper_pages():
+    package_ids = list(range(mapper.BULK_PAGE_SIZE + 1))
+    db_mock, queries = _mock_db(set(package_ids))
+    with patch(
+        "spacewalk.server.repomd.mapper.rhnSQL.prepare",
+        MagicMock(return_value=db_mock),
+    ):
+        pkg_mapper = mapper.SqlBulkPackageMapper()
+        packages = list(pkg_mapper.get_packages(package_ids))
+        last_modified = pkg_mapper.last_modified_many(package_ids)
+
+    assert [package.id for package in packages] == package_ids
+    assert len(last_modified) == len(package_ids)
+    # four queries per page for the packages, one per page for last_modified
+    assert len(queries) == 10
+
+
+def test_cached_mapper_get_packages():
+    cached = MagicMock()
+    cached.id = 2
+    cache = MagicMock()
+    cache.has_key = MagicMock(side_effect=lambda key, _timestamp: key.endswith("/2"))
+    cache.get = MagicMock(return_value=cached)
+
+    db_mock, _queries = _mock_db([1, 2, 3])
+    with patch(
+        "spacewalk.server.repomd.mapper.rhnSQL.prepare",
+        MagicMock(return_value=db_mock),
+    ), patch(
+        "spacewalk.server.repomd.mapper.get_cache_max_size", MagicMock(return_value=0)
+    ):
+        pkg_mapper = mapper.CachedPackageMapper(mapper.SqlBulkPackageMapper())
+        pkg_mapper.cache = cache
+        packages = list(pkg_mapper.get_packages([3, 2, 1]))
+
+    assert [package.id for package in packages] == [3, 2, 1]
+    assert packages[1] is cached
+    assert cache.set.call_count == 2
+    cache.set.assert_any_call("repomd-packages/3", packages[0], "20240102030405")
+    # the timestamp is kept for the fragment cache of the repository
+    assert [package.last_modified for package in packages] == ["20240102030405"] * 3
@@ -0,0 +1,63 @@
+#  pylint: disable=missing-module-docstring,invalid-name
+import gzip
+import io
+import shutil
+import subprocess
+
+import pytest
+
+from spacewalk.server.repomd import repository
+from spacewalk.server.repomd import view
+
+
+CONTENT = b"<metadata>" + b"<package/>" * 300000 + b"</metadata>"
+
+
+def _read_all(fileobj, size):
+    chunks = []
+    chunk = fileobj.read(size)
+    while chunk:
+        chunks.append(chunk)
+        chunk = fileobj.read(size)
+    fileobj.close()
+    return b"".join(chunks)
+
+
+@pytest.mark.parametrize("size", [-1, 1, 4096, repository.CHUNK_SIZE * 2])
+def test_gzip_compressing_file(size):
+    compressed = _read_all(repository.GzipCompressingFile(io.BytesIO(CONTENT)), size)
+
+    assert gzip.decompress(compressed) == CONTENT
+    # no timestamp in the header, so the checksum only depends on the content
+    assert compressed[4:8] == b"\0\0\0\0"
+
+
+@pytest.mark.skipif(not shutil.which("zstd"), reason="zstd is not installed")
+def test_zstd_compressing_file(tmp_path):
+    path = tmp_path / "primary.xml"
+    path.write_bytes(CONTENT)
+
+    with open(path, "rb") as fileobj:
+        compressed = _read_all(repository.ZstdCompressingFile(fileobj), 4096)
+
+    assert (
+        subprocess.run(
+            ["zstd", "-d", "-c"], input=compressed, stdout=subprocess.PIPE, check=True
+        ).stdout
+        == CONTENT
+    )
+
+
+def test_repomd_locations():
+    data = {"gzip_checksum": "abc", "open_checksum": "def", "timestamp": 0}
+    for suffix in (".gz", ".zst"):
+        fileobj = io.StringIO()
+        repo_view = view.RepoView(
+            data, data, data, data, None, None, fileobj, "sha256", suffix
+        )
+        repo_view.write_repomd()
+
+        # pylint: disable-next=consider-using-f-string
+        assert '<location href="repodata/primary.xml%s"/>' % suffix in (
+            fileobj.getvalue()
+        )
@@ -0,0 +1,157 @@
+#  pylint: disable=missing-module-docstring,invalid-name
+import datetime
+import decimal
+from unittest.mock import MagicMock
+
+import psycopg2
+
+from spacewalk.server.rhnSQL import driver_postgresql
+
+
+SQL = "select id from rhnServer where id = :sid and org_id = :org_id or id = :sid"
+
+
+def _cursor(cache, sql=SQL):
+    dbh = MagicMock()
+    return driver_postgresql.Cursor(dbh=dbh, sql=sql, statement_cache=cache)
+
+
+def test_positional_query_params():
+    query, names = driver_postgresql.convert_positional_query_params(SQL)
+
+    assert query == "select id from rhnServer where id = $1 and org_id = $2 or id = $1"
+    assert names == ["sid", "org_id"]
+
+
+def test_converted_sql_cache():
+    cache = driver_postgresql.StatementCache(size=2)
+    for _i in range(3):
+        h = _cursor(cache)
+    assert h.sql == driver_postgresql.convert_named_query_params(SQL)
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+    # the least recently used statement is dropped
+    _cursor(cache, "select 1")
+    _cursor(cache, SQL)
+    _cursor(cache, "select 2")
+    _cursor(cache, "select 1")
+    assert cache.stats()["size"] == 2
+    assert cache.stats()["misses"] == 4
+
+
+def _prepared_cursor(cache, sql, parameter_types):
+    """Cursor whose PREPARE statements get parameter_types on the server"""
+    h = _cursor(cache, sql)
+    real_cursor = MagicMock()
+    real_cursor.fetchall = MagicMock(
+        return_value=[(parameter_type,) for parameter_type in parameter_types]
+    )
+    h._real_cursor = real_cursor  # pylint: disable=protected-access
+    return h, real_cursor
+
+
+def test_prepare_after_threshold():
+    cache = driver_postgresql.StatementCache(prepare_threshold=2)
+    h, real_cursor = _prepared_cursor(cache, SQL, ["numeric", "numeric"])
+
+    h.execute(sid=1, org_id=2)
+    assert real_cursor.execute.call_args[0][0] == h.sql
+
+    h.execute(sid=1, org_id=2)
+    executed = [c[0][0] for c in real_cursor.execute.call_args_list]
+    assert "PREPARE rhnsql_stmt_1 AS select id from rhnServer where id = $1" in (
+        executed[-4]
+    )
+    assert executed[-1] == "EXECUTE rhnsql_stmt_1 (%(sid)s, %(org_id)s)"
+    assert cache.stats()["prepared"] == 1
+    assert cache.stats()["prepared_executions"] == 1
+
+
+def test_prepared_parameter_types():
+    cache = driver_postgresql.StatementCache(prepare_threshold=1)
+    # $1 has no context to get its type from and becomes text, $2 gets the
+    # type of the column
+    h, real_cursor = _prepared_cursor(
+        cache,
+        "select :value from rhnServer where created > :created",
+        ["text", "timestamp with time zone"],
+    )
+    created = datetime.datetime(2024, 1, 2, 3, 4, 5)
+
+    for value in ["text", None, 1, 1.5, True, datetime.date(2024, 1, 2)]:
+        h.execute(value=value, created=created)
+    executed = [c[0][0] for c in real_cursor.execute.call_args_list]
+    prepared = "EXECUTE rhnsql_stmt_1 (%(value)s, %(created)s)"
+    # values other than strings would come back as text from the prepared
+    # statement
+    assert executed[-6:] == [prepared, prepared] + [h.sql] * 4
+
+    h.execute(value="text", created="2024-01-02")
+    h.execute(value="text", created=datetime.date(2024, 1, 2))
+    assert real_cursor.execute.call_args_list[-2][0][0] == prepared
+    assert real_cursor.execute.call_args_list[-1][0][0] == prepared
+    assert cache.stats()["prepared_executions"] == 4
+
+
+def test_prepared_numeric_parameter_types():
+    cache = driver_postgresql.StatementCache(prepare_threshold=1)
+    h, real_cursor = _prepared_cursor(
+        cache, "select id from rhnServer where id = :sid", ["integer"]
+    )
+
+    h.execute(sid=1)
+    assert real_cursor.execute.call_args[0][0] == "EXECUTE rhnsql_stmt_1 (%(sid)s)"
+    # an integer parameter would round the value
+    h.execute(sid=decimal.Decimal("1.5"))
+    assert real_cursor.execute.call_args[0][0] == h.sql
+    h.execute(sid=b"1")
+    assert real_cursor.execute.call_args[0][0] == h.sql
+
+
+def test_prepare_failure_keeps_transaction():
+    cache = driver_postgresql.StatementCache(prepare_threshold=1)
+    h = _cursor(cache, "select id from rhnServer where id = :sid")
+    real_cursor = MagicMock()
+
+    def execute(sql, *_args):
+        if sql.startswith("PREPARE"):
+            # e.g. the connection was used by another statement cache
+            raise psycopg2.ProgrammingError(
+                'prepared statement "rhnsql_stmt_1" already exists'
+            )
+
+    real_cursor.execute = MagicMock(side_effect=execute)
+    h._real_cursor = real_cursor  # pylint: disable=protected-access
+
+    h.execute(sid=1)
+    h.execute(sid=1)
+    executed = [c[0][0] for c in real_cursor.execute.call_args_list]
+    assert "ROLLBACK TO SAVEPOINT rhnsql_prepare" in executed
+    # the statement is not prepared again
+    assert executed[-2:] == [h.sql, h.sql]
+    assert cache.stats()["prepared"] == 0
+
+
+def test_parameter_types_failure_deallocates():
+    cache = driver_postgresql.StatementCache(prepare_threshold=1)
+    h = _cursor(cache, "select id from rhnServer where id = :sid")
+    real_cursor = MagicMock()
+
+    def execute(sql, *_args):
+        if "pg_prepared_statements" in sql:
+            raise psycopg2.OperationalError("canceling statement")
+
+    real_cursor.execute = MagicMock(side_effect=execute)
+    h._real_cursor = real_cursor  # pylint: disable=protected-access
+
+    h.execute(sid=1)
+    assert real_cursor.execute.call_args[0][0] == h.sql
+
+    # the statement prepared before the failure is deallocated with the next
+    # one
+    h2 = _cursor(cache, "select id from rhnServer where org_id = :org_id")
+    h2._real_cursor = real_cursor  # pylint: disable=protected-access
+    h2.execute(org_id=1)
+    executed = [c[0][0] for c in real_cursor.execute.call_args_list]
+    assert "DEALLOCATE rhnsql_stmt_1" in executed
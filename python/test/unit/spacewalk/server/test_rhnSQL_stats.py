@@ -0,0 +1,50 @@
+#  pylint: disable=missing-module-docstring,invalid-name
+import json
+from unittest.mock import MagicMock, patch
+
+from spacewalk.server.rhnSQL import driver_postgresql
+from spacewalk.server.rhnSQL import sql_stats
+
+
+def _cursor():
+    h = driver_postgresql.Cursor(
+        dbh=MagicMock(), sql="select id\n  from rhnServer\n where id = :id"
+    )
+    h._real_cursor = MagicMock()  # pylint: disable=protected-access
+    h._real_cursor.rowcount = 1  # pylint: disable=protected-access
+    return h
+
+
+def test_statistics_disabled():
+    h = _cursor()
+    with patch.object(sql_stats, "collector", None), patch.object(
+        sql_stats.Collector, "measure"
+    ) as measure:
+        h.execute(id=1)
+    assert measure.call_count == 0
+
+
+def test_statistics_and_n_plus_one(tmp_path):
+    collector = sql_stats.Collector(n_plus_one_threshold=2)
+    h = _cursor()
+    with patch.object(sql_stats, "collector", collector):
+        for i in range(6):
+            if i == 5:
+                collector.end_batch()
+            h.execute(id=i)
+
+    report = collector.report()
+    assert len(report["statements"]) == 1
+    stats = report["statements"][0]
+    assert stats["sql"] == "select id from rhnServer where id = %(id)s"
+    assert stats["call_site"].startswith(__file__)
+    assert stats["calls"] == 6
+    assert stats["rows"] == 6
+    assert stats["p50"] <= stats["p99"] <= stats["max_time"]
+    # flagged once in the first transaction, not in the second one
+    assert stats["n_plus_one"] == 1
+
+    filename = str(tmp_path / "sql-stats.json")
+    collector.dump(filename)
+    with open(filename, encoding="utf-8") as f:
+        assert json.load(f)["statements"][0]["calls"] == 6
@@ -0,0 +1,47 @@
+#  pylint: disable=missing-module-docstring,invalid-name
+from unittest.mock import MagicMock
+
+import pytest
+
+from spacewalk.common.rhnException import rhnException
+from spacewalk.server.rhnSQL import driver_postgresql
+
+
+def _named_cursor(*batches):
+    cursor = MagicMock()
+    cursor.closed = False
+    cursor.description = [("id",) + (None,) * 6, ("name",) + (None,) * 6]
+    cursor.fetchmany = MagicMock(side_effect=list(batches) + [[]])
+    return cursor
+
+
+def test_streaming_cursor_fetchiter():
+    dbh = MagicMock()
+    dbh.closed = False
+    first = _named_cursor([(1, "a"), (2, "b")], [(3, "c")])
+    second = _named_cursor([(4, "d")])
+    dbh.cursor = MagicMock(side_effect=[first, second])
+
+    h = driver_postgresql.Cursor(
+        dbh=dbh, sql="select id, name from t where x = :x", streaming=True, itersize=2
+    )
+    # nothing is declared on the server before the statement is executed
+    assert dbh.cursor.call_count == 0
+
+    h.execute(x=1)
+    assert "name" in dbh.cursor.call_args[1]
+    assert first.itersize == 2
+    assert list(h.fetchiter()) == [(1, "a"), (2, "b"), (3, "c")]
+    first.fetchmany.assert_called_with(2)
+
+    # each execute runs on a new server side cursor
+    h.execute(x=2)
+    first.close.assert_called_once_with()
+    assert list(h.fetchiter_dict()) == [{"id": 4, "name": "d"}]
+    assert dbh.cursor.call_args_list[0] != dbh.cursor.call_args_list[1]
+
+
+def test_streaming_cursor_only_executes_queries():
+    h = driver_postgresql.Cursor(dbh=MagicMock(), sql="delete from t", streaming=True)
+    with pytest.raises(rhnException):
+        h.executemany(id=[1, 2])
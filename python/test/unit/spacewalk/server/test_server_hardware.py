@@ -0,0 +1,117 @@
+#  pylint: disable=missing-module-docstring,invalid-name
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from spacewalk.server.rhnServer import server_hardware
+
+
+SYSID = 1000010000
+
+
+def _device(devid, description, bus="pci"):
+    return {
+        "id": devid,
+        "server_id": SYSID,
+        "class": "NETWORK",
+        "bus": bus,
+        "device": None,
+        "driver": "e1000",
+        "detached": 0,
+        "description": description,
+        "pcitype": 2,
+        "prop1": None,
+        "prop2": None,
+        "prop3": None,
+        "prop4": None,
+        "created": None,
+        "modified": None,
+    }
+
+
+ROWS = {
+    "rhnDevice": [_device(1, "eth0"), _device(2, "eth1"), _device(3, "eth2")],
+    "rhnCPU": [],
+    "rhnServerDMI": [],
+    "rhnRAM": [{"id": 4, "server_id": SYSID, "ram": 1024, "swap": 512}],
+    "rhnServerInstallInfo": [],
+    "rhnServerFQDN": [],
+}
+
+
+@pytest.fixture(name="statements")
+def fixture_statements():
+    statements = []
+
+    def prepare(sql, *_args, **_kwargs):
+        h = MagicMock()
+        h.sql = sql
+        h.fetchone_dict = MagicMock(return_value=None)
+        for table, rows in ROWS.items():
+            if sql == "select * from %s where server_id = :sysid" % table:
+                h.fetchall_dict = MagicMock(return_value=rows)
+        statements.append(h)
+        return h
+
+    sequence = MagicMock()
+    sequence.next_many = MagicMock(side_effect=lambda n: list(range(100, 100 + n)))
+    with patch.object(server_hardware.rhnSQL, "prepare", prepare), patch.object(
+        server_hardware.rhnSQL, "Sequence", MagicMock(return_value=sequence)
+    ), patch.object(server_hardware, "MachineInformation"):
+        yield statements
+
+
+def _loaded_hardware():
+    hardware = server_hardware.Hardware()
+    hardware.reload_hardware_byid(SYSID)
+    return hardware
+
+
+def test_load_one_query_per_table(statements):
+    hardware = _loaded_hardware()
+
+    # one query per device table, no lookup per device
+    selects = [h for h in statements if h.sql.startswith("select * from rhn")]
+    assert len(selects) == len(ROWS)
+    devices = hardware.hardware_by_class(server_hardware.HardwareDevice)
+    assert [dev.id for dev in devices] == [1, 2, 3]
+    assert devices[1].data["description"] == "eth1"
+    assert not devices[1].data.has_key("created")
+    memory = hardware.hardware_by_class(server_hardware.MemoryInformation)
+    assert memory[0].data["ram"] == 1024
+
+
+def test_refresh_saves_only_changes(statements):
+    hardware = _loaded_hardware()
+    hardware.delete_hardware(SYSID)
+    for description in ("eth0", "eth3", "eth4"):
+        new = _device(None, description)
+        for k in ("id", "server_id", "created", "modified"):
+            del new[k]
+        new["desc"] = new.pop("description")
+        new["pciType"] = new.pop("pcitype")
+        hardware.add_hardware(new)
+    hardware.add_hardware({"class": "MEMORY", "ram": "1024", "swap": "512"})
+    del statements[:]
+
+    hardware.save_hardware_byid(SYSID)
+
+    deletes = [h for h in statements if h.sql.startswith("delete from rhnDevice")]
+    assert len(deletes) == 1
+    assert deletes[0].executemany.call_args[1] == {"id": [2, 3]}
+    inserts = [h for h in statements if h.sql.startswith("insert into rhnDevice")]
+    assert len(inserts) == 1
+    sql, rows = inserts[0].execute_values.call_args[0][:2]
+    columns = sql[sql.index("(") + 1 : sql.index(")")].split(", ")
+    rows = [dict(zip(columns, row)) for row in rows]
+    assert sorted((row["id"], row["description"]) for row in rows) == [
+        (100, "eth3"),
+        (101, "eth4"),
+    ]
+    assert {row["server_id"] for row in rows} == {SYSID}
+    # the unchanged memory is neither deleted nor inserted again
+    assert "rhnRAM" not in " ".join(h.sql for h in statements)
+
+    devices = hardware.hardware_by_class(server_hardware.HardwareDevice)
+    assert sorted(dev.id for dev in devices) == [1, 100, 101]
+    assert {dev.status for dev in devices} == {0}
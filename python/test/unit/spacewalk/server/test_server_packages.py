@@ -0,0 +1,78 @@
+#  pylint: disable=missing-module-docstring,invalid-name
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from spacewalk.server.rhnServer import server_packages
+
+
+ARCHES = [
+    {"id": 100, "label": "x86_64", "type": "rpm"},
+    {"id": 101, "label": "noarch", "type": "rpm"},
+    {"id": 102, "label": "amd64-deb", "type": "deb"},
+]
+
+
+@pytest.fixture(name="db_mock")
+def fixture_db_mock():
+    server_packages.PackageArches.reset()
+    db_mock = MagicMock()
+    db_mock.fetchall_dict = MagicMock(return_value=ARCHES)
+    with patch(
+        "spacewalk.server.rhnServer.server_packages.rhnSQL.prepare",
+        MagicMock(return_value=db_mock),
+    ):
+        yield db_mock
+    server_packages.PackageArches.reset()
+
+
+def _package(name, arch):
+    return {"name": name, "version": "1.0", "release": "1", "epoch": "", "arch": arch}
+
+
+def test_package_type_from_arch_table(db_mock):
+    packages = [
+        server_packages.dbPackage(_package("pkg%d" % i, "x86_64")) for i in range(100)
+    ]
+    deb = server_packages.dbPackage(_package("debpkg", "amd64-deb"))
+
+    assert {p.t for p in packages} == {"rpm"}
+    assert deb.t == "deb"
+    # the arch table is loaded once for all the packages
+    assert db_mock.execute.call_count == 1
+
+
+def test_unknown_arch_reloads_table(db_mock):
+    assert server_packages.PackageArches.get_type("x86_64") == "rpm"
+    assert server_packages.PackageArches.get_type("unknown") is None
+    # loaded recently, not reloaded for each unknown arch
+    assert db_mock.execute.call_count == 1
+
+    with patch.object(server_packages.PackageArches, "RELOAD_INTERVAL", -1):
+        assert server_packages.PackageArches.get_type("unknown") is None
+    assert db_mock.execute.call_count == 2
+
+    assert server_packages.PackageArches.get_label(101) == "noarch"
+    assert server_packages.PackageArches.get_label(None) is None
+
+
+def test_save_packages_statements(db_mock):
+    packages = server_packages.Packages()
+    # pylint: disable-next=protected-access
+    packages._Packages__loaded = 1
+    for i in range(50):
+        packages.add_package(1000010000, _package("pkg%d" % i, "x86_64"))
+
+    with patch("spacewalk.server.rhnServer.server_packages.rhnSQL.commit"), patch(
+        "spacewalk.server.rhnServer.server_packages.update_errata_cache"
+    ), patch(
+        "spacewalk.server.rhnServer.server_packages.check_entitlement",
+        MagicMock(return_value={}),
+    ):
+        packages.save_packages_byid(1000010000)
+
+    # one statement for all the added packages
+    assert db_mock.execute_values.call_count == 1
+    args = db_mock.execute_values.call_args
+    assert len(args[0][1]) == 50
+    assert args[0][1][0][:2] == (1000010000, "pkg0")
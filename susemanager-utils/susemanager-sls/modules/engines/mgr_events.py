@@ -5,8 +5,8 @@ Manager's PostgreSQL database. Additionally, it sends notifications via the
 LISTEN/NOTIFY mechanism to alert SUSE Multi-Linux Manager of newly available events.
 
 mgr_events.py tries to keep the I/O low in high load scenarios. Therefore
-events are INSERTed once they come in, but not necessarily COMMITted
-immediately.
+events are buffered for up to batch_delay seconds or batch_size events and
+INSERTed together, but not necessarily COMMITted immediately.
 
 The algorithm is an implementation of token bucket:
  - a COMMIT costs one token
@@ -43,6 +43,8 @@ Full configuration example
       - mgr_events:
           commit_interval: 1
           commit_burst: 100
+          batch_size: 500
+          batch_delay: 0.1
           postgres_db:
               dbname: susemanger
               user: spacewalk
@@ -80,6 +82,8 @@ log = logging.getLogger(__name__)
 
 DEFAULT_COMMIT_INTERVAL = 1
 DEFAULT_COMMIT_BURST = 100
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_BATCH_DELAY = 0.1
 
 
 # pylint: disable-next=invalid-name
@@ -93,11 +97,16 @@ class Responder:
         self.config = config
         self.config.setdefault("commit_interval", DEFAULT_COMMIT_INTERVAL)
         self.config.setdefault("commit_burst", DEFAULT_COMMIT_BURST)
+        self.config.setdefault("batch_size", DEFAULT_BATCH_SIZE)
+        self.config.setdefault("batch_delay", DEFAULT_BATCH_DELAY)
         self.config.setdefault("postgres_db", {})
         self.config["postgres_db"].setdefault("host", "localhost")
         self.config["postgres_db"].setdefault("notify_channel", "suseSaltEvent")
         self.counters = [0 for i in range(config["events"]["thread_pool_size"] + 1)]
         self.tokens = config["commit_burst"]
+        # (minion_id, data, queue) of the events waiting to be INSERTed
+        self.events = []
+        self.flush_scheduled = False
         self.event_bus = event_bus
         self._connect_to_database()
         self.event_bus.io_loop.call_later(config["commit_interval"], self.add_token)
@@ -126,7 +135,6 @@ class Responder:
         self.cursor = self.connection.cursor()
 
     def _insert(self, tag, data):
-        self.db_keepalive()
         if (
             any(
                 [
@@ -152,30 +160,85 @@ class Responder:
                     int(hash_sum, 16) % self.config["events"]["thread_pool_size"] + 1
                 )
             log.debug("%s: Adding event to queue %d -> %s", __name__, queue, tag)
-            try:
-                self.cursor.execute(
-                    "INSERT INTO suseSaltEvent (minion_id, data, queue) VALUES (%s, %s, %s);",
-                    (data.get("id"), json.dumps({"tag": tag, "data": data}), queue),
+            self.events.append(
+                (data.get("id"), json.dumps({"tag": tag, "data": data}), queue)
+            )
+            if len(self.events) >= self.config["batch_size"]:
+                self.flush()
+            elif not self.flush_scheduled:
+                self.flush_scheduled = True
+                self.event_bus.io_loop.call_later(
+                    self.config["batch_delay"], self.scheduled_flush
                 )
-                self.counters[queue] += 1
-                self.attempt_commit()
-            # pylint: disable-next=broad-exception-caught
-            except Exception as err:
-                log.error("%s: %s", __name__, err)
-                try:
-                    self.connection.commit()
-                # pylint: disable-next=broad-exception-caught
-                except Exception as err2:
-                    log.error("%s: Error commiting: %s", __name__, err2)
-                    self.connection.close()
-            finally:
-                log.debug("%s: %s", __name__, self.cursor.query)
         else:
             log.debug("%s: Discarding event -> %s", __name__, tag)
 
+    def scheduled_flush(self):
+        self.flush_scheduled = False
+        self.flush()
+
+    def flush(self):
+        """
+        INSERT the buffered events with a single statement.
+
+        When the statement fails, it is retried once and then every event is
+        INSERTed on its own, so that only the faulty events are lost.
+        """
+        if not self.events:
+            return
+        events, self.events = self.events, []
+        if not self._insert_events(events) and not self._insert_events(events):
+            inserted = sum(self._insert_events([event]) for event in events)
+            log.error(
+                "%s: discarded %d of %d events",
+                __name__,
+                len(events) - inserted,
+                len(events),
+            )
+        try:
+            self.attempt_commit()
+        # pylint: disable-next=broad-exception-caught
+        except Exception as err:
+            log.error("%s: Error commiting: %s", __name__, err)
+            self.connection.close()
+        log.debug("%s: inserted %d events", __name__, len(events))
+
+    def _insert_events(self, events):
+        """
+        INSERT events within a savepoint, returns False after rolling back to
+        it if the INSERT fails. The events INSERTed before and not COMMITted
+        yet are kept.
+        """
+        self.db_keepalive()
+        try:
+            self.cursor.execute("SAVEPOINT flush;")
+            self.cursor.execute(
+                # pylint: disable-next=consider-using-f-string
+                "INSERT INTO suseSaltEvent (minion_id, data, queue) VALUES {};".format(
+                    ", ".join(["(%s, %s, %s)"] * len(events))
+                ),
+                [value for event in events for value in event],
+            )
+            self.cursor.execute("RELEASE SAVEPOINT flush;")
+        # pylint: disable-next=broad-exception-caught
+        except Exception as err:
+            log.error("%s: %s", __name__, err)
+            try:
+                self.cursor.execute("ROLLBACK TO SAVEPOINT flush;")
+            # pylint: disable-next=broad-exception-caught
+            except Exception as err2:
+                log.error("%s: Error rolling back: %s", __name__, err2)
+                # db_keepalive() reconnects before the next attempt
+                self.connection.close()
+            return False
+        for event in events:
+            self.counters[event[2]] += 1
+        return True
+
     def trace_log(self):
         log.trace("%s: queues sizes -> %s", __name__, self.counters)
         log.trace("%s: tokens -> %s", __name__, self.tokens)
+        log.trace("%s: buffered events -> %s", __name__, len(self.events))
 
     def _is_salt_mine_event(self, tag, data):
         return fnmatch.fnmatch(tag, "salt/job/*/ret/*") and self._is_salt_mine_update(
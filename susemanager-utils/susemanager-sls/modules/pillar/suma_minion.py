@@ -14,6 +14,7 @@ Retrieve SUSE Multi-Linux Manager pillar data for a minion_id.
 # Import python libs
 from __future__ import absolute_import
 from enum import Enum
+import copy
 import os
 import logging
 import yaml
@@ -46,6 +47,42 @@ def find_path(path_list):
 
 formulas_metadata_cache = dict()
 
+# Parsed form.yml files: {path: (mtime, layout)}
+formulas_layout_cache = dict()
+
+# Global, org and group pillars shared by the minions, kept for the lifetime
+# of the master process: {(scope, id): (version, data)}
+pillar_cache = dict()
+
+# Versions of the pillars shared by a minion. The version of a pillar changes
+# with any row of it being inserted, updated or deleted.
+PILLAR_VERSIONS_QUERY = """
+    SELECT 'global' AS scope, NULL AS target_id,
+           MD5(STRING_AGG(p.id::text || ':' || p.xmin::text, ',' ORDER BY p.id))
+    FROM susesaltpillar AS p
+    WHERE p.server_id IS NULL AND p.group_id IS NULL AND p.org_id IS NULL
+    UNION ALL
+    SELECT 'org', p.org_id,
+           MD5(STRING_AGG(p.id::text || ':' || p.xmin::text, ',' ORDER BY p.id))
+    FROM susesaltpillar AS p,
+         suseminioninfo AS m,
+         rhnServer AS s
+    WHERE m.minion_id = %(minion_id)s
+      AND s.id = m.server_id
+      AND p.org_id = s.org_id
+    GROUP BY p.org_id
+    UNION ALL
+    SELECT 'group', p.group_id,
+           MD5(STRING_AGG(p.id::text || ':' || p.xmin::text, ',' ORDER BY p.id))
+    FROM susesaltpillar AS p,
+         suseminioninfo AS m,
+         rhnServerGroupMembers AS g
+    WHERE m.minion_id = %(minion_id)s
+      AND g.server_id = m.server_id
+      AND p.group_id = g.server_group_id
+    GROUP BY p.group_id;
+"""
+
 
 # Fomula group subtypes
 class EditGroupSubtype(Enum):
@@ -176,9 +213,7 @@ def ext_pillar(minion_id, pillar, *args):
         nonlocal ret
         nonlocal group_formulas
         nonlocal system_formulas
-        ret = load_global_pillars(cursor, ret)
-        ret = load_org_pillars(minion_id, cursor, ret)
-        group_formulas, ret = load_group_pillars(minion_id, cursor, ret)
+        group_formulas, ret = load_shared_pillars(minion_id, cursor, ret)
         system_formulas, ret = load_system_pillars(minion_id, cursor, ret)
 
     _get_cursor(_load_db_pillar)
@@ -223,40 +258,33 @@ def load_global_pillars(cursor, pillar):
     return pillar
 
 
-def load_org_pillars(minion_id, cursor, pillar):
+def load_org_pillars(org_id, cursor, pillar):
     """
     Load the org pillar from the database
     """
     cursor.execute(
         """
             SELECT p.pillar
-            FROM susesaltpillar AS p,
-                 suseminioninfo AS m
-            WHERE m.minion_id = %s
-              AND p.org_id = (SELECT s.org_id FROM rhnServer AS s WHERE s.id = m.server_id);""",
-        (minion_id,),
+            FROM susesaltpillar AS p
+            WHERE p.org_id = %s;""",
+        (org_id,),
     )
     for row in cursor.fetchall():
         pillar = salt.utils.dictupdate.merge(pillar, row[0], strategy="recurse")
     return pillar
 
 
-def load_group_pillars(minion_id, cursor, pillar):
+def load_group_pillars(group_id, cursor, pillar):
     """
     Load the group pillars from the DB and extract the formulas from it
     """
-    groups_query = """
-        SELECT p.category, p.pillar
-        FROM susesaltpillar AS p,
-             suseminioninfo AS m
-        WHERE m.minion_id = %s
-          AND p.group_id IN (
-            SELECT g.server_group_id
-            FROM rhnServerGroupMembers AS g
-            WHERE g.server_id = m.server_id
-          );
-    """
-    cursor.execute(groups_query, (minion_id,))
+    cursor.execute(
+        """
+            SELECT p.category, p.pillar
+            FROM susesaltpillar AS p
+            WHERE p.group_id = %s;""",
+        (group_id,),
+    )
     group_formulas = {}
     for row in cursor.fetchall():
         if row[0].startswith(FORMULA_PREFIX):
@@ -268,6 +296,42 @@ def load_group_pillars(minion_id, cursor, pillar):
     return (group_formulas, pillar)
 
 
+def load_shared_pillars(minion_id, cursor, pillar):
+    """
+    Load the global, org and group pillars of the minion and extract the
+    group formulas. Only the pillars changed since they were cached are
+    loaded from the DB.
+    """
+    cursor.execute(PILLAR_VERSIONS_QUERY, {"minion_id": minion_id})
+    scopes = {"global": 0, "org": 1, "group": 2}
+    versions = sorted(cursor.fetchall(), key=lambda row: scopes[row[0]])
+
+    group_formulas = {}
+    for scope, target_id, version in versions:
+        key = (scope, target_id)
+        cached = pillar_cache.get(key)
+        if cached is None or cached[0] != version:
+            log.debug("Loading %s pillar %s from db", scope, target_id or "")
+            cached = (version, _load_shared_pillar(scope, target_id, cursor))
+            pillar_cache[key] = cached
+        # the cached data must not be shared with the returned pillar
+        data = copy.deepcopy(cached[1])
+        if scope == "group":
+            formulas, data = data
+            group_formulas.update(formulas)
+        pillar = salt.utils.dictupdate.merge(pillar, data, strategy="recurse")
+
+    return (group_formulas, pillar)
+
+
+def _load_shared_pillar(scope, target_id, cursor):
+    if scope == "global":
+        return load_global_pillars(cursor, {})
+    if scope == "org":
+        return load_org_pillars(target_id, cursor, {})
+    return load_group_pillars(target_id, cursor, {})
+
+
 def load_system_pillars(minion_id, cursor, pillar):
     """
     Load the system pillars from the DB and extract the formulas from it
@@ -364,8 +428,7 @@ def load_formula_pillar(system_data, group_data, formula_name, formula_metadata=
                 return {}
 
     try:
-        # pylint: disable-next=unspecified-encoding
-        layout = yaml.load(open(layout_filename).read(), Loader=yaml.FullLoader)
+        layout = load_formula_layout(layout_filename)
     # pylint: disable-next=broad-exception-caught
     except Exception as error:
         log.error(
@@ -382,6 +445,21 @@ def load_formula_pillar(system_data, group_data, formula_name, formula_metadata=
     return merged_data
 
 
+def load_formula_layout(layout_filename):
+    """
+    Return the parsed form.yml file, parsing it again only if it changed.
+    """
+    mtime = os.stat(layout_filename).st_mtime
+    cached = formulas_layout_cache.get(layout_filename)
+    if cached is None or cached[0] != mtime:
+        # pylint: disable-next=unspecified-encoding
+        with open(layout_filename) as layout_file:
+            layout = yaml.load(layout_file.read(), Loader=yaml.FullLoader)
+        cached = formulas_layout_cache[layout_filename] = (mtime, layout)
+    # the layout defaults end up in the pillar
+    return copy.deepcopy(cached[1])
+
+
 def merge_formula_data(layout, group_data, system_data, scope="system"):
     """
     Merge the group and system formula data, respecting the scope of a value.
@@ -45,6 +45,9 @@ SSH_PUSH_PORT_HTTPS = 1233
 SSH_PUSH_SUDO_USER = None
 SSH_USE_SALT_THIN = False
 SSL_PORT = 443
+# Seconds before the last sync from which the changes are fetched again, to
+# get the rows of transactions committed after the last sync
+SYNC_MARGIN = 300
 
 
 # pylint: disable-next=invalid-name
@@ -253,6 +256,139 @@ class UyuniRoster:
 
         return minion
 
+    def _fetch_minions(self, server_ids=None):
+        """
+        Return the roster entries of the ssh-push systems, or only of
+        server_ids, as {server_id: (minion_id, number of paths, minion)}
+        """
+        query = """
+            SELECT S.id AS server_id,
+                   SMI.minion_id AS minion_id,
+                   SMI.ssh_push_port AS ssh_push_port,
+                   SSCM.label='ssh-push-tunnel' AS tunnel,
+                   SP.hostname AS proxy_hostname,
+                   PI.ssh_port AS ssh_port
+            FROM rhnServer AS S
+            INNER JOIN suseServerContactMethod AS SSCM ON
+                  (SSCM.id=S.contact_method_id)
+            INNER JOIN suseMinionInfo AS SMI ON
+                  (SMI.server_id=S.id)
+            LEFT JOIN rhnServerPath AS SP ON
+                 (SP.server_id=S.id)
+            LEFT JOIN rhnProxyInfo as PI ON
+                 (SP.proxy_server_id = PI.server_id)
+            WHERE SSCM.label IN ('ssh-push', 'ssh-push-tunnel')
+            {}
+            ORDER BY S.id, SP.position DESC
+        """
+        if server_ids is None:
+            h = self._execute_query(query.format(""))
+        else:
+            h = self._execute_query(
+                query.format("AND S.id = ANY(%(server_ids)s)"),
+                {"server_ids": list(server_ids)},
+            )
+
+        ret = {}
+        prow = None
+        proxies = []
+        # rhnServerPath rows of the system
+        paths = 0
+
+        row = h.fetchone()
+        while True:
+            if prow is not None and (row is None or row.server_id != prow.server_id):
+                ret[str(prow.server_id)] = (
+                    prow.minion_id,
+                    paths,
+                    self._get_ssh_minion(
+                        minion_id=prow.minion_id,
+                        proxies=proxies,
+                        tunnel=prow.tunnel,
+                        ssh_push_port=int(prow.ssh_push_port or SSH_PUSH_PORT),
+                    ),
+                )
+                paths = 0
+            proxies = []
+            if row is None:
+                break
+            if row.proxy_hostname:
+                proxies.append(Proxy(row.proxy_hostname, row.ssh_port))
+                paths += 1
+            prow = row
+            row = h.fetchone()
+
+        return ret
+
+    def _update_minions(self, cache_data, db_state):
+        """
+        Apply the changes done since the last sync to the cached roster.
+
+        Only the systems modified since then (or with a proxy modified since
+        then) and the new ones are fetched, the systems which are not ssh-push
+        systems anymore are removed. Returns None if the updated roster does
+        not match the DB state, and it has to be rebuilt.
+        """
+        since = cache_data["synced"] - SYNC_MARGIN
+        query = """
+            SELECT S.id AS server_id,
+                   BOOL_OR(S.modified > TO_TIMESTAMP(%(since)s)
+                           OR SMI.modified > TO_TIMESTAMP(%(since)s)
+                           OR COALESCE(SP.modified > TO_TIMESTAMP(%(since)s), FALSE)
+                           OR COALESCE(PI.modified > TO_TIMESTAMP(%(since)s), FALSE)
+                   ) AS changed
+            FROM rhnServer AS S
+            INNER JOIN suseMinionInfo AS SMI ON
+                  (SMI.server_id=S.id)
+            LEFT JOIN rhnServerPath AS SP ON
+                 (SP.server_id=S.id)
+            LEFT JOIN rhnProxyInfo as PI ON
+                 (SP.proxy_server_id = PI.server_id)
+            WHERE S.contact_method_id IN (
+                      SELECT SSCM.id
+                      FROM suseServerContactMethod AS SSCM
+                      WHERE SSCM.label IN ('ssh-push', 'ssh-push-tunnel')
+                  )
+            GROUP BY S.id
+        """
+        h = self._execute_query(query, {"since": since})
+        if h is None:
+            return None
+
+        minions = dict(cache_data["minions"])
+        servers = dict(cache_data["servers"])
+        changed = set()
+        current = set()
+        for row in h.fetchall():
+            server_id = str(row.server_id)
+            current.add(server_id)
+            if row.changed or server_id not in servers:
+                changed.add(server_id)
+        removed = set(servers) - current
+        log.debug(
+            "Updating the roster: %d changed, %d removed systems",
+            len(changed),
+            len(removed),
+        )
+
+        for server_id in removed | changed:
+            if server_id in servers:
+                minions.pop(servers.pop(server_id)[0], None)
+        if changed:
+            entries = self._fetch_minions([int(server_id) for server_id in changed])
+            for server_id, entry in entries.items():
+                minion_id, paths, minion = entry
+                servers[server_id] = (minion_id, paths)
+                minions[minion_id] = minion
+
+        # Rows of the fingerprint query: one per system and proxy in its path
+        rows = sum(max(paths, 1) for _minion_id, paths in servers.values())
+        paths = sum(paths for _minion_id, paths in servers.values())
+        if rows != db_state.rows or paths != db_state.proxies:
+            log.debug("The updated roster doesn't match the DB")
+            return None
+        return minions, servers
+
     def targets(self):
         cache_data = self.cache.fetch("roster/uyuni", "minions")
         cache_fp = cache_data.get("fp", None)
@@ -265,7 +401,12 @@ class UyuniRoster:
                           EXTRACT(EPOCH FROM MAX(SMI.modified)),
                           COUNT(SMI.server_id),
                           EXTRACT(EPOCH FROM MAX(PI.modified))
-                   )::bytea), 'hex') AS fp
+                   )::bytea), 'hex') AS fp,
+                   COUNT(S.id) AS rows,
+                   COUNT(SP.proxy_server_id) AS proxies,
+                   EXTRACT(EPOCH FROM GREATEST(MAX(S.modified), MAX(SP.modified),
+                                               MAX(SMI.modified), MAX(PI.modified))
+                   ) AS synced
                    FROM rhnServer AS S
                    INNER JOIN suseMinionInfo AS SMI ON
                          (SMI.server_id=S.id)
@@ -279,6 +420,7 @@ class UyuniRoster:
                              WHERE SSCM.label IN ('ssh-push', 'ssh-push-tunnel')
                          )
         """
+        db_state = None
         h = self._execute_query(query)
         if h is not None:
             row = h.fetchone()
@@ -296,60 +438,45 @@ class UyuniRoster:
                 else:
                     log.debug("Invalidate cache")
                     cache_fp = new_fp
+                    db_state = row
         else:
             log.warning(
                 "Unable to reconnect to the Uyuni DB. Returning the cached data instead."
             )
             return cache_data["minions"]
 
-        ret = {}
-
-        query = """
-            SELECT S.id AS server_id,
-                   SMI.minion_id AS minion_id,
-                   SMI.ssh_push_port AS ssh_push_port,
-                   SSCM.label='ssh-push-tunnel' AS tunnel,
-                   SP.hostname AS proxy_hostname,
-                   PI.ssh_port AS ssh_port
-            FROM rhnServer AS S
-            INNER JOIN suseServerContactMethod AS SSCM ON
-                  (SSCM.id=S.contact_method_id)
-            INNER JOIN suseMinionInfo AS SMI ON
-                  (SMI.server_id=S.id)
-            LEFT JOIN rhnServerPath AS SP ON
-                 (SP.server_id=S.id)
-            LEFT JOIN rhnProxyInfo as PI ON
-                 (SP.proxy_server_id = PI.server_id)
-            WHERE SSCM.label IN ('ssh-push', 'ssh-push-tunnel')
-            ORDER BY S.id, SP.position DESC
-        """
-
-        h = self._execute_query(query)
-
-        prow = None
-        proxies = []
-
-        row = h.fetchone()
-        while True:
-            if prow is not None and (row is None or row.server_id != prow.server_id):
-                ret[prow.minion_id] = self._get_ssh_minion(
-                    minion_id=prow.minion_id,
-                    proxies=proxies,
-                    tunnel=prow.tunnel,
-                    ssh_push_port=int(prow.ssh_push_port or SSH_PUSH_PORT),
-                )
-            proxies = []
-            if row is None:
-                break
-            if row.proxy_hostname:
-                proxies.append(Proxy(row.proxy_hostname, row.ssh_port))
-            prow = row
-            row = h.fetchone()
+        updated = None
+        if (
+            db_state is not None
+            and cache_data.get("synced") is not None
+            and "servers" in cache_data
+        ):
+            updated = self._update_minions(cache_data, db_state)
+        if updated is not None:
+            ret, servers = updated
+        else:
+            log.debug("Rebuilding the roster")
+            ret = {}
+            servers = {}
+            for server_id, entry in self._fetch_minions().items():
+                minion_id, paths, minion = entry
+                servers[server_id] = (minion_id, paths)
+                ret[minion_id] = minion
 
         self.cache.store(
             "roster/uyuni",
             "minions",
-            {"fp": cache_fp, "minions": ret, "config_hash": self.config_hash},
+            {
+                "fp": cache_fp,
+                "minions": ret,
+                "config_hash": self.config_hash,
+                "servers": servers,
+                "synced": (
+                    float(db_state.synced)
+                    if db_state is not None and db_state.synced is not None
+                    else None
+                ),
+            },
         )
 
         if log.isEnabledFor(logging.TRACE):
@@ -0,0 +1,166 @@
+#  pylint: disable=missing-module-docstring
+"""
+Replay a recorded Salt event stream through the mgr_events engine against a
+local PostgreSQL database and report the insertion throughput.
+
+Record the events on a busy master with:
+
+    salt-run state.event pretty=False > events.txt
+
+and replay them with different batch sizes:
+
+    PYTHONPATH=../modules/engines python3 benchmark_engine.py \\
+        --events events.txt --batch-size 1 --batch-size 500
+
+Without --events, a stream of synthetic job returns is generated. The
+suseSaltEvent table of the benchmark database is emptied before each run.
+"""
+import argparse
+import heapq
+import itertools
+import json
+import time
+from unittest.mock import MagicMock
+
+import psycopg2
+
+from mgr_events import Responder
+
+
+class IOLoop:
+    """Minimal replacement for the tornado IOLoop: runs the callbacks
+    scheduled with call_later once they are due."""
+
+    def __init__(self):
+        self.timers = []
+        self.counter = itertools.count()
+
+    def call_later(self, delay, callback):
+        heapq.heappush(
+            self.timers, (time.monotonic() + delay, next(self.counter), callback)
+        )
+
+    def run_due(self):
+        now = time.monotonic()
+        while self.timers and self.timers[0][0] <= now:
+            callback = heapq.heappop(self.timers)[2]
+            callback()
+
+
+def read_events(filename):
+    """Read `salt-run state.event pretty=False` output or JSON lines with
+    tag and data keys."""
+    events = []
+    with open(filename, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                event = json.loads(line)
+                events.append((event["tag"], event["data"]))
+            else:
+                tag, data = line.split("\t", 1)
+                events.append((tag, json.loads(data)))
+    return events
+
+
+def generate_events(count, minions):
+    return [
+        (
+            f"salt/job/20250101000000{i // minions:06d}/ret/minion{i % minions}",
+            {
+                "id": f"minion{i % minions}",
+                "fun": "state.apply",
+                "jid": f"20250101000000{i // minions:06d}",
+                "return": {"pkg_|-installed_|-vim_|-installed": {"result": True}},
+                "retcode": 0,
+                "success": True,
+            },
+        )
+        for i in range(count)
+    ]
+
+
+def replay(events, args, batch_size):
+    io_loop = IOLoop()
+    event_bus = MagicMock()
+    event_bus.io_loop = io_loop
+    responder = Responder(
+        event_bus,
+        {
+            "commit_interval": args.commit_interval,
+            "commit_burst": args.commit_burst,
+            "batch_size": batch_size,
+            "batch_delay": args.batch_delay,
+            "postgres_db": {
+                "dbname": args.dbname,
+                "user": args.user,
+                "password": args.password,
+                "host": args.host,
+            },
+            "events": {"thread_pool_size": args.thread_pool_size},
+        },
+    )
+    responder.cursor.execute("DELETE FROM suseSaltEvent;")
+    responder.connection.commit()
+
+    start = time.monotonic()
+    for tag, data in events:
+        # pylint: disable-next=protected-access
+        responder._insert(tag, data)
+        io_loop.run_due()
+    responder.flush()
+    responder.connection.commit()
+    elapsed = time.monotonic() - start
+
+    responder.cursor.execute("SELECT count(*) FROM suseSaltEvent;")
+    rows = responder.cursor.fetchone()[0]
+    responder.connection.close()
+    return elapsed, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", help="recorded event stream")
+    parser.add_argument("--generate", type=int, default=10000)
+    parser.add_argument("--minions", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, action="append", dest="batch_sizes")
+    parser.add_argument("--batch-delay", type=float, default=0.1)
+    parser.add_argument("--commit-interval", type=float, default=1)
+    parser.add_argument("--commit-burst", type=int, default=100)
+    parser.add_argument("--thread-pool-size", type=int, default=8)
+    parser.add_argument("--dbname", default="test")
+    parser.add_argument("--user", default="postgres")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--host", default="localhost")
+    args = parser.parse_args()
+
+    if args.events:
+        events = read_events(args.events)
+    else:
+        events = generate_events(args.generate, args.minions)
+
+    with psycopg2.connect(
+        dbname=args.dbname, user=args.user, password=args.password, host=args.host
+    ) as connection:
+        connection.cursor().execute(
+            """CREATE TABLE IF NOT EXISTS suseSaltEvent (
+                id SERIAL PRIMARY KEY,
+                minion_id CHARACTER VARYING(256),
+                data TEXT NOT NULL,
+                queue NUMERIC NOT NULL
+            );"""
+        )
+    connection.close()
+
+    for batch_size in args.batch_sizes or [1, 100, 500]:
+        elapsed, rows = replay(events, args, batch_size)
+        print(
+            f"batch size {batch_size:5d}: {len(events):7d} events, {rows:7d} rows"
+            f" in {elapsed:7.3f}s, {len(events) / elapsed:9.1f} events/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ import pytest
 import psycopg2
 import shlex
 import subprocess
-from mgr_events import Responder, DEFAULT_COMMIT_BURST
+from mgr_events import Responder, DEFAULT_BATCH_DELAY, DEFAULT_COMMIT_BURST
 from unittest.mock import MagicMock, patch, call
 from sqlalchemy import create_engine
 from sqlalchemy_utils import database_exists, create_database, drop_database
@@ -101,11 +101,13 @@ def test_connection_recovery_on_insert(db_connection, responder):
     responder.connection = disposable_connection
     # pylint: disable-next=protected-access
     responder._insert("salt/minion/1/start", {"value": 1})
+    responder.flush()
     responder.connection.close()
     with patch("mgr_events.psycopg2") as mock_psycopg2:
         mock_psycopg2.connect.return_value = db_connection
         # pylint: disable-next=protected-access
         responder._insert("salt/minion/2/start", {"value": 2})
+        responder.flush()
     responder.connection.commit()
     responder.cursor.execute("SELECT * FROM suseSaltEvent")
     resp = responder.cursor.fetchall()
@@ -117,6 +119,7 @@ def test_connection_recovery_on_commit(db_connection, responder):
     responder.connection = new_connection()
     # pylint: disable-next=protected-access
     responder._insert("salt/minion/1/start", {"value": 1})
+    responder.flush()
     responder.connection.close()
     with patch("mgr_events.psycopg2") as mock_psycopg2:
         mock_psycopg2.connect.return_value = db_connection
@@ -131,6 +134,7 @@ def test_connection_recovery_on_commit(db_connection, responder):
 def test_insert_start_event(responder, db_connection):
     responder.event_bus.unpack.return_value = ("salt/minion/12345/start", {"value": 1})
     responder.add_event_to_queue("")
+    responder.flush()
     responder.cursor.execute("SELECT * FROM suseSaltEvent;")
     resp = responder.cursor.fetchall()
     assert resp
@@ -141,6 +145,7 @@ def test_insert_start_event(responder, db_connection):
 def test_insert_job_return_event(responder):
     responder.event_bus.unpack.return_value = ("salt/job/12345/ret/6789", {"value": 1})
     responder.add_event_to_queue("")
+    responder.flush()
     responder.cursor.execute("SELECT * FROM suseSaltEvent;")
     resp = responder.cursor.fetchall()
     assert resp
@@ -151,6 +156,7 @@ def test_insert_job_return_event(responder):
 def test_insert_batch_start_event(responder):
     responder.event_bus.unpack.return_value = ("salt/batch/12345/start", {"value": 1})
     responder.add_event_to_queue("")
+    responder.flush()
     responder.cursor.execute("SELECT * FROM suseSaltEvent;")
     resp = responder.cursor.fetchall()
     assert resp
@@ -176,6 +182,7 @@ def test_keep_presence_ping_event_without_batch(responder):
         {"value": 1, "fun": "test.ping", "id": "testminion"},
     )
     responder.add_event_to_queue("")
+    responder.flush()
     responder.cursor.execute("SELECT * FROM suseSaltEvent;")
     resp = responder.cursor.fetchall()
     assert len(resp) == 1
@@ -202,6 +209,7 @@ def test_postgres_notification(responder):
     with patch.object(responder, "cursor"):
         # pylint: disable-next=protected-access
         responder._insert("salt/minion/1/start", {"value": 1, "id": "testminion"})
+        responder.flush()
         assert responder.counters == [0, 0, 0, 0]
         assert responder.tokens == DEFAULT_COMMIT_BURST - 1
         assert responder.cursor.execute.mock_calls[-1:] == [
@@ -231,21 +239,135 @@ def test_commit_avoidance_without_tokens(responder):
             responder.tokens = 0
             # pylint: disable-next=protected-access
             responder._insert("salt/minion/1/start", {"id": "testminion", "value": 1})
+            responder.flush()
             assert responder.counters == [0, 0, 1, 0]
             assert responder.tokens == 0
             assert responder.connection.commit.call_count == 0
             assert responder.cursor.execute.mock_calls == [
+                call("SAVEPOINT flush;"),
                 call(
                     "INSERT INTO suseSaltEvent (minion_id, data, queue) VALUES (%s, %s, %s);",
-                    (
+                    [
                         "testminion",
                         '{"tag": "salt/minion/1/start", "data": {"id": "testminion", "value": 1}}',
                         2,
-                    ),
-                )
+                    ],
+                ),
+                call("RELEASE SAVEPOINT flush;"),
             ]
 
 
+# pylint: disable-next=redefined-outer-name
+def test_events_buffered_until_delay(responder):
+    with patch.object(responder, "cursor"):
+        # pylint: disable-next=protected-access
+        responder._insert("salt/minion/1/start", {"value": 1, "id": "minion1"})
+        # pylint: disable-next=protected-access
+        responder._insert("salt/minion/2/start", {"value": 2, "id": "minion2"})
+        assert responder.cursor.execute.call_count == 0
+        # one flush is scheduled for the buffered events
+        responder.event_bus.io_loop.call_later.assert_called_with(
+            DEFAULT_BATCH_DELAY, responder.scheduled_flush
+        )
+        assert responder.event_bus.io_loop.call_later.call_count == 2
+
+        responder.scheduled_flush()
+        insert = responder.cursor.execute.mock_calls[1]
+        assert insert[1][0] == (
+            "INSERT INTO suseSaltEvent (minion_id, data, queue) VALUES "
+            "(%s, %s, %s), (%s, %s, %s);"
+        )
+        assert insert[1][1][0::3] == ["minion1", "minion2"]
+        assert responder.events == []
+        assert responder.tokens == DEFAULT_COMMIT_BURST - 1
+
+
+# pylint: disable-next=redefined-outer-name
+def test_flush_on_batch_size(responder):
+    responder.config["batch_size"] = 2
+    with patch.object(responder, "cursor"):
+        # pylint: disable-next=protected-access
+        responder._insert("salt/minion/1/start", {"value": 1})
+        assert responder.cursor.execute.call_count == 0
+        # pylint: disable-next=protected-access
+        responder._insert("salt/minion/2/start", {"value": 2})
+        assert responder.cursor.execute.mock_calls[1:2] == [
+            call(
+                "INSERT INTO suseSaltEvent (minion_id, data, queue) VALUES "
+                "(%s, %s, %s), (%s, %s, %s);",
+                [
+                    None,
+                    '{"tag": "salt/minion/1/start", "data": {"value": 1}}',
+                    0,
+                    None,
+                    '{"tag": "salt/minion/2/start", "data": {"value": 2}}',
+                    0,
+                ],
+            )
+        ]
+        assert responder.counters == [0, 0, 0, 0]
+        assert responder.tokens == DEFAULT_COMMIT_BURST - 1
+
+
+# pylint: disable-next=redefined-outer-name
+def test_flush_only_loses_faulty_events(responder):
+    def execute(query, params=None):
+        if params and any("\\u0000" in str(value) for value in params):
+            raise psycopg2.DataError("unsupported Unicode escape sequence")
+
+    with patch.object(responder, "cursor") as mock_cursor:
+        mock_cursor.execute.side_effect = execute
+        # pylint: disable-next=protected-access
+        responder._insert("salt/minion/1/start", {"id": "minion1"})
+        # pylint: disable-next=protected-access
+        responder._insert("salt/minion/2/start", {"id": "minion2", "value": "\0"})
+        # pylint: disable-next=protected-access
+        responder._insert("salt/minion/3/start", {"id": "minion3"})
+        responder.flush()
+
+        inserts = [
+            c[1][1]
+            for c in mock_cursor.execute.mock_calls
+            if c[1][0].startswith("INSERT")
+        ]
+        # the batch is tried twice, then every event on its own
+        assert [len(params) // 3 for params in inserts] == [3, 3, 1, 1, 1]
+        assert (
+            mock_cursor.execute.mock_calls.count(call("ROLLBACK TO SAVEPOINT flush;"))
+            == 3
+        )
+        # the two other events are notified
+        notify = mock_cursor.execute.mock_calls[-1][1][0]
+        assert sum(int(c) for c in notify.split("'")[1].split(",")) == 2
+    assert responder.events == []
+
+
+# pylint: disable-next=redefined-outer-name
+def test_flush_retries_after_reconnecting(responder):
+    lost_connection = MagicMock(closed=False, encoding="utf-8")
+    lost_connection.cursor.return_value.execute.side_effect = psycopg2.OperationalError
+    lost_connection.close.side_effect = lambda: setattr(lost_connection, "closed", True)
+    responder.connection = lost_connection
+    responder.cursor = lost_connection.cursor.return_value
+    new_connection_mock = MagicMock(closed=False, encoding="utf-8")
+    with patch("mgr_events.psycopg2") as mock_psycopg2:
+        mock_psycopg2.connect.return_value = new_connection_mock
+        # pylint: disable-next=protected-access
+        responder._insert("salt/minion/1/start", {"id": "minion1"})
+        # pylint: disable-next=protected-access
+        responder._insert("salt/minion/2/start", {"id": "minion2"})
+        responder.flush()
+
+    assert lost_connection.close.called
+    assert responder.connection is new_connection_mock
+    new_execute = new_connection_mock.cursor.return_value.execute
+    assert new_execute.mock_calls[1][1][0] == (
+        "INSERT INTO suseSaltEvent (minion_id, data, queue) VALUES "
+        "(%s, %s, %s), (%s, %s, %s);"
+    )
+    assert new_connection_mock.commit.called
+
+
 # pylint: disable-next=redefined-outer-name
 def test_postgres_connect(db_connection, responder):
     disposable_connection = new_connection()
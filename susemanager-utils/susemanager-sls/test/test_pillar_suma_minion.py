@@ -77,7 +77,7 @@ def test_formula_pillars_db():
     pillar = suma_minion.load_global_pillars(cursor, pillar)
 
     cursor.fetchall.return_value = [("formula-locale", {}), ("formula-tftpd", {})]
-    group_formulas, pillar = suma_minion.load_group_pillars(minion_id, cursor, pillar)
+    group_formulas, pillar = suma_minion.load_group_pillars(9, cursor, pillar)
 
     cursor.fetchall.return_value = [("formula-branch-network", {})]
     system_formulas, pillar = suma_minion.load_system_pillars(minion_id, cursor, pillar)
@@ -229,3 +229,79 @@ def test_using_context_in__get_cursor():
             "dbname": "test_db",
             "port": 1234,
         }
+
+
+def test_shared_pillars_cache():
+    """
+    Test the global, org and group pillars are loaded only when they changed
+    """
+    minion_id = "suma-refhead-min-sles12sp4.mgr.suse.de"
+    versions = [
+        ("group", 9, "g1"),
+        ("global", None, "v1"),
+        ("org", 1, "o1"),
+    ]
+    rows = {
+        "SELECT p.pillar\n            FROM susesaltpillar AS p\n            WHERE p.org_id": [
+            ({"org": {"name": "org1", "level": "org"}},)
+        ],
+        "SELECT p.category, p.pillar\n            FROM susesaltpillar AS p\n            WHERE p.group_id": [
+            ("formula-locale", {"timezone": "UTC"}),
+            ("custom", {"org": {"level": "group"}}),
+        ],
+        "SELECT p.pillar\n            FROM susesaltpillar AS p\n            WHERE p.server_id is NULL": [
+            ({"formula_order": TEST_FORMULA_ORDER, "org": {"level": "global"}},)
+        ],
+    }
+    queries = []
+    cursor = MagicMock()
+
+    def execute(query, *_args):
+        queries.append(query.strip())
+
+    def fetchall():
+        if queries[-1] == suma_minion.PILLAR_VERSIONS_QUERY.strip():
+            return versions
+        for prefix, result in rows.items():
+            if queries[-1].startswith(prefix):
+                return result
+        raise AssertionError(queries[-1])
+
+    cursor.execute = execute
+    cursor.fetchall = fetchall
+
+    with patch.dict(suma_minion.pillar_cache, clear=True):
+        group_formulas, pillar = suma_minion.load_shared_pillars(minion_id, cursor, {})
+        assert group_formulas == {"locale": {"timezone": "UTC"}}
+        assert pillar["org"] == {"name": "org1", "level": "group"}
+        assert pillar["formula_order"] == TEST_FORMULA_ORDER
+        assert len(queries) == 4
+
+        # unchanged pillars are taken from the cache
+        del queries[:]
+        pillar["org"]["name"] = "modified"
+        group_formulas, pillar = suma_minion.load_shared_pillars(minion_id, cursor, {})
+        assert pillar["org"] == {"name": "org1", "level": "group"}
+        assert group_formulas == {"locale": {"timezone": "UTC"}}
+        assert len(queries) == 1
+
+        # only the changed group pillar is loaded again
+        del queries[:]
+        versions[0] = ("group", 9, "g2")
+        suma_minion.load_shared_pillars(minion_id, cursor, {})
+        assert len(queries) == 2
+        assert "p.group_id = %s" in queries[1]
+
+
+def test_formula_layout_cache():
+    """
+    Test the form.yml files are parsed only once
+    """
+    with patch.dict(suma_minion.formulas_layout_cache, clear=True), patch.object(
+        suma_minion.yaml, "load", wraps=suma_minion.yaml.load
+    ) as yaml_load:
+        first = suma_minion.load_formula_pillar({}, {}, "locale")
+        second = suma_minion.load_formula_pillar({}, {}, "locale")
+        assert first == second
+        assert first
+        assert yaml_load.call_count == 1
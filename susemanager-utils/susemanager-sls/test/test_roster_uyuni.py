@@ -0,0 +1,147 @@
+#  pylint: disable=missing-module-docstring,protected-access
+from collections import namedtuple
+from unittest.mock import MagicMock, patch
+
+import sys
+
+sys.path.append("../modules/roster")
+# pylint: disable-next=wrong-import-position
+import uyuni
+
+
+uyuni.__opts__ = {}
+
+State = namedtuple("State", ["fp", "rows", "proxies", "synced"])
+Changed = namedtuple("Changed", ["server_id", "changed"])
+Minion = namedtuple(
+    "Minion",
+    ["server_id", "minion_id", "ssh_push_port", "tunnel", "proxy_hostname", "ssh_port"],
+)
+
+
+class Cache:
+    def __init__(self):
+        self.data = {}
+
+    def fetch(self, bank, key):
+        return self.data.get((bank, key), {})
+
+    def store(self, bank, key, data):
+        self.data[(bank, key)] = data
+
+    def flush(self, bank):
+        self.data = {k: v for k, v in self.data.items() if k[0] != bank}
+
+
+def _roster(cache):
+    with patch("uyuni.salt.cache.Cache", MagicMock(return_value=cache)), patch(
+        "uyuni.psycopg2"
+    ):
+        return uyuni.UyuniRoster(
+            {"db": "susemanager", "user": "spacewalk", "host": "localhost", "pass": ""},
+            {},
+        )
+
+
+def _db(roster, state, changed, minions):
+    """Mock the queries run by the roster, returns the executed queries"""
+    queries = []
+
+    def execute_query(query, params=None):
+        queries.append((query, params))
+        h = MagicMock()
+        if "AS fp" in query:
+            h.fetchone = MagicMock(return_value=state)
+        elif "AS changed" in query:
+            h.fetchall = MagicMock(return_value=changed)
+        else:
+            rows = [
+                m
+                for m in minions
+                if params is None or m.server_id in params["server_ids"]
+            ]
+            h.fetchone = MagicMock(side_effect=rows + [None])
+        return h
+
+    roster._execute_query = execute_query
+    return queries
+
+
+def test_full_build():
+    cache = Cache()
+    roster = _roster(cache)
+    queries = _db(
+        roster,
+        State("fp1", 3, 2, 1000.0),
+        [],
+        [
+            Minion(1, "minion1", 22, False, None, None),
+            Minion(2, "minion2", 2222, True, "proxy2", 22),
+            Minion(2, "minion2", 2222, True, "proxy1", 22),
+        ],
+    )
+
+    ret = roster.targets()
+
+    assert sorted(ret) == ["minion1", "minion2"]
+    assert ret["minion2"]["port"] == 2222
+    assert len(queries) == 2
+    stored = cache.fetch("roster/uyuni", "minions")
+    assert stored["servers"] == {"1": ("minion1", 0), "2": ("minion2", 2)}
+    assert stored["synced"] == 1000.0
+
+    # nothing changed: no other query than the fingerprint
+    del queries[:]
+    assert roster.targets() == ret
+    assert len(queries) == 1
+
+
+def test_incremental_update():
+    cache = Cache()
+    roster = _roster(cache)
+    minions = [
+        Minion(1, "minion1", 22, False, None, None),
+        Minion(2, "minion2", 22, False, None, None),
+        Minion(3, "minion3", 22, False, None, None),
+    ]
+    _db(roster, State("fp1", 3, 0, 1000.0), [], minions)
+    roster.targets()
+
+    # minion1 was removed, minion2 changed and minion4 added
+    minions = [
+        Minion(2, "minion2", 2222, False, None, None),
+        Minion(3, "minion3", 22, False, None, None),
+        Minion(4, "minion4", 22, False, "proxy", 22),
+    ]
+    queries = _db(
+        roster,
+        State("fp2", 3, 1, 2000.0),
+        [Changed(2, True), Changed(3, False), Changed(4, False)],
+        minions,
+    )
+    ret = roster.targets()
+
+    assert sorted(ret) == ["minion2", "minion3", "minion4"]
+    assert ret["minion2"]["port"] == 2222
+    assert ret["minion4"]["ssh_options"]
+    assert queries[1][1] == {"since": 1000.0 - uyuni.SYNC_MARGIN}
+    # only the changed and the new systems are fetched
+    assert sorted(queries[2][1]["server_ids"]) == [2, 4]
+    assert len(queries) == 3
+    assert cache.fetch("roster/uyuni", "minions")["synced"] == 2000.0
+
+
+def test_rebuild_on_mismatch():
+    cache = Cache()
+    roster = _roster(cache)
+    minions = [Minion(1, "minion1", 22, False, "proxy", 22)]
+    _db(roster, State("fp1", 1, 1, 1000.0), [], minions)
+    roster.targets()
+
+    # the proxy path was removed without any modification date change
+    minions = [Minion(1, "minion1", 22, False, None, None)]
+    queries = _db(roster, State("fp2", 1, 0, 1000.0), [Changed(1, False)], minions)
+    ret = roster.targets()
+
+    assert "ssh_options" not in ret["minion1"]
+    assert queries[-1][1] is None